@@ -0,0 +1,120 @@
+"""
+
+合成データでパイプラインの各段階の時間を測り, 結果を JSON に書く
+最適化の効果を測ったり, 遅くなっていないかを確かめたりするのに使う
+
+  python bench/benchmark.py [--charts 1000 --charts 10000] [--rows 100000] [--repeat 3] [--out bench_results.json]
+
+"""
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import tempfile
+import argparse
+from typing import List, Dict, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main as app
+import synthetic
+
+# func を repeat 回呼んで (秒のリスト, 最後の戻り値) を返す
+def measure(func: Callable, repeat: int):
+	times = []
+	ret = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		ret = func()
+		times.append(time.perf_counter() - start)
+	return times, ret
+
+def summarize(times: List[float]) -> Dict[str, float]:
+	return {
+		"min": min(times),
+		"median": statistics.median(times),
+		"max": max(times),
+		"runs": times,
+	}
+
+# 1 つの規模 (譜面数, 行数) で各段階を測る
+def run_scale(data_dir: str, html_dir: str, num_charts: int, num_rows: int, duplicate_rate: float, seed: int, repeat: int) -> dict:
+	paths = synthetic.make_dataset(data_dir, num_charts, num_rows, duplicate_rate, seed)
+	csv_path, db_path = paths["csv"], paths["score_db"]
+	mode_slst = "sl"
+	stages: Dict[str, dict] = dict()
+
+	def record(name: str, func: Callable):
+		times, ret = measure(func, repeat)
+		stages[name] = summarize(times)
+		print(f"  {name:28s} {stages[name]['median'] * 1000:10.1f} ms (中央値)")
+		return ret
+
+	# 読み込み
+	score_list = record("get_score_list", lambda: app.get_score_list(db_path))
+	song_list = record("get_song_list", lambda: app.get_song_list(csv_path))
+	sha256_list = [song["sha256"] for song in song_list]
+	record("get_best_score_list", lambda: app.get_best_score_list(db_path, sha256_list))
+	# load_chart_table は 2 回目以降 .npy のキャッシュから読む
+	record("load_chart_table", lambda: app.load_chart_table(csv_path))
+
+	# 推定
+	result = record("max_likelihood_estimation", lambda: app.max_likelihood_estimation(score_list, song_list))
+	average_list = app.get_average_list(song_list, mode_slst)
+	frame = app.ChartFrame.from_lists(score_list, song_list)
+	record("get_sorted_pp_data", lambda: app.get_sorted_pp_data(average_list, frame, 100))
+
+	# HTML
+	filename_table = os.path.join(html_dir, "result_table.html")
+	filename_top100 = os.path.join(html_dir, "result_top100.html")
+	record("generate_html_table", lambda: app.generate_html_table(frame, mode_slst, average_list, result.x, filename_table, result.se))
+	record("generate_html_top100", lambda: app.generate_html_top100(frame, mode_slst, average_list, result.x, filename_top100))
+
+	return {
+		"charts": num_charts,
+		"rows": num_rows,
+		"duplicate_rate": duplicate_rate,
+		"seed": seed,
+		"score_rows": len(score_list),
+		"theta": result.x,
+		"table_bytes": os.path.getsize(filename_table),
+		"stages": stages,
+	}
+
+def main(argv: List[str]) -> int:
+	parser = argparse.ArgumentParser(description = "合成データでパイプラインの各段階の時間を測る")
+	parser.add_argument("--charts", type = int, action = "append", default = None, help = "譜面数 (複数指定可, 既定 1000 と 10000)")
+	parser.add_argument("--rows", type = int, default = None, help = "score.db の行数 (既定は譜面数の 2 倍)")
+	parser.add_argument("--duplicate-rate", type = float, default = 0.1, help = "同じ sha256 の別 mode の行の割合")
+	parser.add_argument("--seed", type = int, default = 0, help = "乱数の種")
+	parser.add_argument("--repeat", type = int, default = 3, help = "各段階を測る回数")
+	parser.add_argument("--data", default = os.path.join(ROOT, "bench_data"), help = "合成データの置き場所 (同じ条件なら使い回す)")
+	parser.add_argument("--out", default = "bench_results.json", help = "結果の JSON")
+	args = parser.parse_args(argv)
+	scales = args.charts if args.charts else [1000, 10000]
+
+	results = []
+	with tempfile.TemporaryDirectory() as html_dir:
+		for num_charts in scales:
+			num_rows = args.rows if args.rows is not None else num_charts * 2
+			print(f"{num_charts} 譜面 / {num_rows} 行:")
+			results.append(run_scale(args.data, html_dir, num_charts, num_rows, args.duplicate_rate, args.seed, args.repeat))
+
+	report = {
+		"python": platform.python_version(),
+		"numpy": app.np.__version__,
+		"platform": platform.platform(),
+		"repeat": args.repeat,
+		"results": results,
+	}
+	with open(args.out, "w", encoding="utf-8") as f:
+		json.dump(report, f, ensure_ascii=False, indent=2)
+	print(f"{args.out} に書き込みました")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
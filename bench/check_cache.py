@@ -0,0 +1,115 @@
+"""
+
+結果キャッシュ (build_reports + ResultCache) を一時的な score.db に対して動かし, 動作を確かめる
+  - 2 回目はキャッシュから同じページを書き出し, 1 回目より速いこと
+  - score.db にスコアが足されたらキャッシュを使わずに作り直すこと
+  - 大きさの上限を超えたら最後に使ったのが古いものから消えること
+おかしければ終了コード 1 を返す
+
+  python bench/check_cache.py
+
+"""
+import os
+import sys
+import time
+import sqlite3
+import filecmp
+import tempfile
+import argparse
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main as app
+import synthetic
+
+# 出力先の 2 つのフォルダのページが全部同じか
+def same_pages(left: str, right: str) -> bool:
+	names = sorted(os.listdir(left))
+	if names != sorted(os.listdir(right)):
+		return False
+	_, mismatch, errors = filecmp.cmpfiles(left, right, names, shallow = False)
+	return not mismatch and not errors
+
+# 最新の date より後のスコアを 1 行足す (Hard 未満の譜面を新しい mode で ExHard)
+def add_score(score_db: str):
+	con = sqlite3.connect(score_db)
+	try:
+		row = list(con.execute("SELECT * FROM score WHERE clear < 6 LIMIT 1").fetchone())
+		columns = [x[1] for x in con.execute("PRAGMA table_info(score)")]
+		row[columns.index("mode")] = con.execute("SELECT MAX(mode) FROM score").fetchone()[0] + 1000
+		row[columns.index("clear")] = 7
+		row[columns.index("date")] = con.execute("SELECT MAX(date) FROM score").fetchone()[0] + 86400
+		con.execute(f"INSERT INTO score VALUES ({','.join('?' * len(row))})", row)
+		con.commit()
+	finally:
+		con.close()
+
+def main(argv: List[str]) -> int:
+	parser = argparse.ArgumentParser(description = "結果キャッシュの動作を確かめる")
+	parser.add_argument("--charts", type = int, default = 2000, help = "合成する譜面数")
+	parser.add_argument("--rows", type = int, default = 3000, help = "合成する score.db の行数")
+	args = parser.parse_args(argv)
+
+	failed = []
+	def check(ok: bool, message: str):
+		print(f"{'OK' if ok else 'NG'} {message}")
+		if not ok:
+			failed.append(message)
+
+	with tempfile.TemporaryDirectory() as directory:
+		paths = synthetic.make_dataset(directory, args.charts, args.rows)
+		csv_dirs = [paths["csv"]]
+		cache = app.ResultCache(os.path.join(directory, "cache", "results.db"))
+
+		def build(name: str) -> app.ReportResult:
+			start = time.perf_counter()
+			report = app.build_reports(paths["score_db"], csv_dirs, os.path.join(directory, name), cache)
+			report.seconds = time.perf_counter() - start
+			return report
+
+		first = build("first")
+		second = build("second")
+		check(not first.cached and second.cached, "2 回目はキャッシュを使う")
+		check(same_pages(os.path.join(directory, "first"), os.path.join(directory, "second")), "キャッシュから書いたページが同じ")
+		check(second.summary == first.summary and second.results.keys() == first.results.keys(), "推定結果が同じ")
+		name = next(iter(first.results))
+		check(
+			second.columns.keys() == first.columns.keys()
+			and all(app.np.array_equal(second.columns[key], column, equal_nan = column.dtype.kind == "f") for key, column in first.columns.items()),
+			"譜面ごとの列が同じ"
+		)
+		print(f"   作り直し {first.seconds * 1000:.1f} ms / キャッシュ {second.seconds * 1000:.1f} ms")
+		check(second.seconds < first.seconds, "キャッシュの方が速い")
+
+		report = app.build_reports(paths["score_db"], csv_dirs, os.path.join(directory, "plain"))
+		check(not report.cached and same_pages(os.path.join(directory, "first"), os.path.join(directory, "plain")), "キャッシュなしでも同じページ")
+
+		add_score(paths["score_db"])
+		third = build("third")
+		check(not third.cached, "スコアが足されたら作り直す")
+		check(third.summary[name]["theta"] != first.summary[name]["theta"], "作り直した推定が変わる")
+
+		# 上限を 1 件分にすると古い方が消える
+		con = sqlite3.connect(cache.path)
+		try:
+			sizes = [size for size, in con.execute("SELECT size FROM result ORDER BY accessed")]
+		finally:
+			con.close()
+		check(len(sizes) == 2, "2 件入っている")
+		cache.max_bytes = max(sizes)
+		add_score(paths["score_db"])
+		build("fourth")
+		con = sqlite3.connect(cache.path)
+		try:
+			entries = con.execute("SELECT COUNT(*) FROM result").fetchone()[0]
+			pages = con.execute("SELECT COUNT(DISTINCT key) FROM page").fetchone()[0]
+		finally:
+			con.close()
+		check(entries == 1 and pages == 1, "上限を超えたら古いものから消える")
+	return 1 if failed else 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,95 @@
+"""
+
+合成データで譜面パラメータの較正 (calibrate_chart_parameters) を確かめる
+  - 本当の難易度表からプレイヤーごとの score.db を作り, ずらした表から較正して本当の値に近づくか
+  - 書き出した CSV を get_song_list で読めて, beta_easy < beta_hard が保たれているか
+  - ワーカー数によらず同じ結果になるか
+近づかなければ終了コード 1 を返す
+
+  python bench/check_calibration.py [--players 500 --charts 500 --rows 135]
+
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+import numpy as np
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main as app
+import synthetic
+
+def get_parameters(song_list: List[dict]) -> np.ndarray:
+	return np.array([[float(song[field]) for field in ("beta_easy", "beta_hard", "alpha")] for song in song_list])
+
+def main(argv: List[str]) -> int:
+	parser = argparse.ArgumentParser(description = "合成データで譜面パラメータの較正を確かめる")
+	parser.add_argument("--players", type = int, default = 500, help = "プレイヤー数")
+	parser.add_argument("--charts", type = int, default = 500, help = "譜面数")
+	parser.add_argument("--rows", type = int, default = 135, help = "1 人あたりの score.db の行数")
+	parser.add_argument("--noise", type = float, default = 0.5, help = "元にする表の beta のずれの標準偏差")
+	parser.add_argument("--seed", type = int, default = 0, help = "乱数の種")
+	args = parser.parse_args(argv)
+
+	rng = np.random.default_rng(args.seed)
+	truth = synthetic.make_song_list(args.charts, seed = args.seed)
+	# 元にする表は本当の値から beta と alpha をずらしたもの
+	base = [dict(song) for song in truth]
+	for song in base:
+		beta_easy = float(song["beta_easy"]) + rng.normal(0.0, args.noise)
+		gap = (float(song["beta_hard"]) - float(song["beta_easy"])) * np.exp(rng.normal(0.0, 0.3))
+		song["beta_easy"] = f"{beta_easy:.3f}"
+		song["beta_hard"] = f"{beta_easy + max(gap, 0.01):.3f}"
+		song["alpha"] = f"{float(song['alpha']) * np.exp(rng.normal(0.0, 0.3)):.3f}"
+
+	failed = False
+	with tempfile.TemporaryDirectory() as tmp:
+		csv_path = os.path.join(tmp, "sl_base.csv")
+		synthetic.write_mocha_csv(csv_path, base)
+		players_dir = os.path.join(tmp, "players")
+		os.makedirs(players_dir)
+		start = time.perf_counter()
+		thetas = rng.normal(0.0, 1.5, size = args.players)
+		for i, theta in enumerate(thetas):
+			player_dir = os.path.join(players_dir, f"player{i:04d}")
+			os.makedirs(player_dir)
+			synthetic.make_score_db(os.path.join(player_dir, "score.db"), truth, args.rows, theta = theta, duplicate_rate = 0.1, seed = args.seed + i + 1)
+		print(f"{args.players} 人分の score.db を作りました ({time.perf_counter() - start:.1f} 秒)")
+
+		outputs = dict()
+		for workers in (1, 2):
+			output_dir = os.path.join(tmp, f"out{workers}")
+			start = time.perf_counter()
+			app.run_calibration(players_dir, [csv_path], output_dir, app.CalibrationOptions(workers = workers), workers)
+			print(f"workers={workers}: {time.perf_counter() - start:.1f} 秒")
+			with open(os.path.join(output_dir, "sl_base.csv"), "rb") as f:
+				outputs[workers] = f.read()
+		if outputs[1] != outputs[2]:
+			print("NG: ワーカー数で結果が変わりました")
+			failed = True
+
+		calibrated = app.get_song_list(os.path.join(tmp, "out1", "sl_base.csv"))
+		if [song["sha256"] for song in calibrated] != [song["sha256"] for song in truth]:
+			print("NG: 譜面の並びが変わりました")
+			failed = True
+		expected = get_parameters(truth)
+		before = get_parameters(base)
+		after = get_parameters(calibrated)
+		if not np.all(after[:, 1] - after[:, 0] >= 0.01 - 1e-9):
+			print("NG: beta_easy < beta_hard が保たれていません")
+			failed = True
+		for column, name in enumerate(("beta_easy", "beta_hard", "alpha")):
+			error_before = float(np.sqrt(np.mean((before[:, column] - expected[:, column]) ** 2)))
+			error_after = float(np.sqrt(np.mean((after[:, column] - expected[:, column]) ** 2)))
+			ok = error_after < error_before
+			print(f"{'OK' if ok else 'NG'} {name}: 本当の値との RMSE {error_before:.3f} -> {error_after:.3f}")
+			failed |= not ok
+	return 1 if failed else 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
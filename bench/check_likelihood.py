@@ -0,0 +1,65 @@
+"""
+
+LikelihoodModel (配列で計算する尤度) が従来の negative_log_likelihood と一致するかを確かめる
+何人分かをまとめて解く estimate_theta_matrix が 1 人ずつ解いた値と一致するかも確かめる
+一致しなければ終了コード 1 を返す
+
+  python bench/check_likelihood.py [--score data/score.db] [--csv data/sl_mocha.csv]
+
+"""
+import os
+import sys
+import argparse
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main as app
+
+def main(argv: List[str]) -> int:
+	parser = argparse.ArgumentParser(description = "LikelihoodModel と従来の尤度計算の一致を確かめる")
+	parser.add_argument("--score", default = os.path.join(ROOT, "data", "score.db"), help = "score.db のパス")
+	parser.add_argument("--csv", action = "append", default = None, help = "難易度表の CSV のパス (複数指定可)")
+	parser.add_argument("--tolerance", type = float, default = 1e-6, help = "許す相対誤差")
+	args = parser.parse_args(argv)
+	csv_dirs = args.csv if args.csv else [os.path.join(ROOT, "data", "sl_mocha.csv")]
+
+	failed = False
+	for csv_dir in csv_dirs:
+		song_list = app.load_chart_table(csv_dir).to_song_list()
+		score_list = app.get_best_score_list(args.score, [song["sha256"] for song in song_list])
+		name = os.path.basename(csv_dir)
+		try:
+			error = app.check_likelihood_model(score_list, song_list, tolerance = args.tolerance)
+			print(f"OK {name}: 尤度の最大相対誤差 {error:.3e}")
+		except AssertionError as e:
+			print(f"NG {name}: {e}")
+			failed = True
+			continue
+
+		# Newton 法と従来の Brent 法の解も比べる
+		newton = app.max_likelihood_estimation(score_list, song_list)
+		bounded = app.max_likelihood_estimation(score_list, song_list, method = "bounded")
+		print(f"   theta: newton {newton.x:.6f} ({newton.nfev} 回) / bounded {bounded.x:.6f} ({bounded.nfev} 回)")
+		if abs(newton.x - bounded.x) > 1e-4:
+			print(f"NG {name}: 推定値が一致しません")
+			failed = True
+
+		# スコアを間引いた何人分かを OutcomeMatrix にまとめて全行同時に解き, 1 人ずつ解いたものと比べる
+		score_lists = [score_list[start::step] for step in (1, 2, 3, 5) for start in range(step)]
+		matrix = app.OutcomeMatrix.from_score_lists(score_lists, song_list)
+		batched = app.estimate_theta_matrix(matrix, song_list)
+		error = 0.0
+		for i, rows in enumerate(score_lists):
+			single = app.max_likelihood_estimation(rows, song_list)
+			if single.success and batched.success[i]:
+				error = max(error, abs(single.x - batched.x[i]))
+		print(f"   theta: {len(score_lists)} 人をまとめて解いたときの最大誤差 {error:.2e}")
+		if error > 1e-6:
+			print(f"NG {name}: まとめて解いた推定値が一致しません")
+			failed = True
+	return 1 if failed else 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
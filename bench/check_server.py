@@ -0,0 +1,107 @@
+"""
+
+レポートサーバー (python main.py serve) を一時的な score.db に対して動かし, 応答を確かめる
+  - ページと JSON が返ること, gzip と ETag (304) が効くこと
+  - score.db の更新時刻だけが変わっても作り直さず, 新しい date のスコアが入ったら作り直すこと
+おかしければ終了コード 1 を返す
+
+  python bench/check_server.py
+
+"""
+import os
+import sys
+import json
+import gzip
+import sqlite3
+import tempfile
+import threading
+import argparse
+import urllib.request
+import urllib.error
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main as app
+import synthetic
+
+# (ステータス, ヘッダ, 本体) を返す
+def fetch(url: str, headers: dict = None):
+	request = urllib.request.Request(url, headers = headers or dict())
+	try:
+		with urllib.request.urlopen(request) as response:
+			return response.status, response.headers, response.read()
+	except urllib.error.HTTPError as e:
+		return e.code, e.headers, e.read()
+
+def main(argv: List[str]) -> int:
+	parser = argparse.ArgumentParser(description = "レポートサーバーの応答を確かめる")
+	parser.add_argument("--charts", type = int, default = 2000, help = "合成する譜面数")
+	parser.add_argument("--rows", type = int, default = 3000, help = "合成する score.db の行数")
+	args = parser.parse_args(argv)
+
+	failed = []
+	def check(ok: bool, message: str):
+		print(f"{'OK' if ok else 'NG'} {message}")
+		if not ok:
+			failed.append(message)
+
+	with tempfile.TemporaryDirectory() as directory:
+		paths = synthetic.make_dataset(directory, args.charts, args.rows)
+		server = app.make_report_server(paths["score_db"], [paths["csv"]], port = 0)
+		thread = threading.Thread(target = server.serve_forever, daemon = True)
+		thread.start()
+		base = f"http://127.0.0.1:{server.server_address[1]}"
+		try:
+			status, headers, body = fetch(base + "/")
+			check(status == 200 and b"<html" in body.lower(), "/ で難易度表ページが返る")
+			status, headers, top100 = fetch(base + "/result_top100.html")
+			check(status == 200, "TOP100 ページが返る")
+			status, headers, _ = fetch(base + "/no_such_page.html")
+			check(status == 404, "ないページは 404")
+
+			status, headers, compressed = fetch(base + "/", {"Accept-Encoding": "gzip"})
+			check(headers.get("Content-Encoding") == "gzip" and gzip.decompress(compressed) == body, "gzip で同じ本体が返る")
+			etag = headers.get("ETag")
+			status, headers, _ = fetch(base + "/", {"If-None-Match": etag})
+			check(status == 304, "ETag が一致すれば 304")
+
+			status, headers, summary = fetch(base + "/api/summary.json")
+			summary = json.loads(summary)
+			check(status == 200 and summary["generation"] == 1, "summary.json が返る")
+			name = next(iter(summary["tables"]))
+			status, headers, data = fetch(base + f"/api/{name}/top100.json")
+			check(status == 200 and len(json.loads(data)) > 0, "top100.json が返る")
+
+			# 更新時刻だけ変える
+			stat = os.stat(paths["score_db"])
+			os.utime(paths["score_db"], (stat.st_atime, stat.st_mtime + 10))
+			summary = json.loads(fetch(base + "/api/summary.json")[2])
+			check(summary["generation"] == 1, "date が変わらなければ作り直さない")
+
+			# 新しい date のスコアを足す (Hard 未満の譜面を別の mode で ExHard)
+			con = sqlite3.connect(paths["score_db"])
+			try:
+				row = list(con.execute("SELECT * FROM score WHERE clear < 6 LIMIT 1").fetchone())
+				columns = [x[1] for x in con.execute("PRAGMA table_info(score)")]
+				row[columns.index("mode")] = 1000
+				row[columns.index("clear")] = 7
+				row[columns.index("date")] = con.execute("SELECT MAX(date) FROM score").fetchone()[0] + 86400
+				con.execute(f"INSERT INTO score VALUES ({','.join('?' * len(row))})", row)
+				con.commit()
+			finally:
+				con.close()
+			os.utime(paths["score_db"], (stat.st_atime, stat.st_mtime + 20))
+			summary = json.loads(fetch(base + "/api/summary.json")[2])
+			check(summary["generation"] == 2, "新しい date のスコアが入ったら作り直す")
+			status, headers, _ = fetch(base + "/", {"If-None-Match": etag})
+			check(status == 200, "作り直したら ETag が変わる")
+		finally:
+			server.shutdown()
+			server.server_close()
+	return 1 if failed else 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,84 @@
+"""
+
+main.py の起動時間 (import にかかる時間) を python -X importtime で測る
+予算を超えたり, 起動時に読み込んではいけないモジュールが読み込まれていたら終了コード 1 を返す
+
+  python bench/importtime.py [--budget-ms 150] [--repeat 5]
+
+"""
+import os
+import sys
+import subprocess
+import statistics
+import py_compile
+import argparse
+from typing import List, Dict, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 起動時には読み込まず, 使うときに読み込むモジュール
+DEFERRED_MODULES = ["numpy", "scipy", "tkinter"]
+
+# python -X importtime の出力を (モジュール名, self [us], cumulative [us]) のリストにする
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+	ret = []
+	for line in stderr.splitlines():
+		if not line.startswith("import time:") or "self [us]" in line:
+			continue
+		self_us, cumulative_us, name = line[len("import time:"):].split("|")
+		ret.append((name.strip(), int(self_us), int(cumulative_us)))
+	return ret
+
+# main を 1 回 import して各モジュールの時間を返す
+def measure_once(python: str) -> List[Tuple[str, int, int]]:
+	code = f"import sys; sys.path.insert(0, {ROOT!r}); import main"
+	proc = subprocess.run(
+		[python, "-X", "importtime", "-c", code],
+		capture_output = True,
+		text = True,
+		cwd = ROOT
+	)
+	if proc.returncode != 0:
+		raise RuntimeError(f"import main に失敗しました:\n{proc.stderr}")
+	return parse_importtime(proc.stderr)
+
+def main(argv: List[str]) -> int:
+	parser = argparse.ArgumentParser(description = "main.py の import 時間を測る")
+	parser.add_argument("--budget-ms", type = float, default = 150.0, help = "import main にかけてよい時間 (ミリ秒, 中央値)")
+	parser.add_argument("--repeat", type = int, default = 5, help = "測る回数")
+	parser.add_argument("--top", type = int, default = 10, help = "表示する遅いモジュールの数")
+	parser.add_argument("--python", default = sys.executable, help = "測る python")
+	args = parser.parse_args(argv)
+
+	# バイトコードを作っておかないと 1 回目だけコンパイルの時間が入る
+	py_compile.compile(os.path.join(ROOT, "main.py"), doraise = True)
+
+	totals = []
+	cumulative: Dict[str, List[int]] = dict()
+	for _ in range(args.repeat):
+		records = measure_once(args.python)
+		for name, self_us, cumulative_us in records:
+			cumulative.setdefault(name, []).append(cumulative_us)
+		totals.append(cumulative["main"][-1])
+
+	total_ms = statistics.median(totals) / 1000
+	print(f"import main: {total_ms:.1f} ms (中央値, {args.repeat} 回, 予算 {args.budget_ms:.0f} ms)")
+	print("遅いモジュール (cumulative の中央値):")
+	slowest = sorted(((statistics.median(v), name) for name, v in cumulative.items() if name != "main"), reverse = True)
+	for us, name in slowest[:args.top]:
+		print(f"  {us / 1000:8.1f} ms  {name}")
+
+	failed = False
+	loaded = [name for name in DEFERRED_MODULES if any(x == name or x.startswith(name + ".") for x in cumulative)]
+	if loaded:
+		print(f"NG: 起動時に読み込まれています: {', '.join(loaded)}")
+		failed = True
+	if total_ms > args.budget_ms:
+		print(f"NG: 予算を {total_ms - args.budget_ms:.1f} ms 超えています")
+		failed = True
+	if not failed:
+		print("OK")
+	return 1 if failed else 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,179 @@
+"""
+
+ベンチマーク用の合成データを作る
+  - mocha_sl/st.csv と同じ列の難易度表 (1k〜200k 譜面)
+  - beatoraja と同じスキーマの score.db (数百万行まで, 同じ sha256 の別 mode の行も入れる)
+
+  python bench/synthetic.py --charts 10000 --rows 200000 --out bench_data
+
+"""
+import os
+import sys
+import csv
+import sqlite3
+import argparse
+import numpy as np
+from typing import List, Dict
+
+# beatoraja の score.db と同じスキーマ
+SCORE_DB_SCHEMA = [
+	"CREATE TABLE [info] ([id] TEXT NOT NULL,[name] TEXT NOT NULL,[rank] TEXT,PRIMARY KEY(id))",
+	"CREATE TABLE [player] ([date] INTEGER,[playcount] INTEGER,[clear] INTEGER,[epg] INTEGER,[lpg] INTEGER,[egr] INTEGER,[lgr] INTEGER,[egd] INTEGER,[lgd] INTEGER,[ebd] INTEGER,[lbd] INTEGER,[epr] INTEGER,[lpr] INTEGER,[ems] INTEGER,[lms] INTEGER,[playtime] INTEGER,[maxcombo] INTEGER,PRIMARY KEY(date))",
+	"CREATE TABLE [score] ([sha256] TEXT NOT NULL,[mode] INTEGER,[clear] INTEGER,[epg] INTEGER,[lpg] INTEGER,[egr] INTEGER,[lgr] INTEGER,[egd] INTEGER,[lgd] INTEGER,[ebd] INTEGER,[lbd] INTEGER,[epr] INTEGER,[lpr] INTEGER,[ems] INTEGER,[lms] INTEGER,[notes] INTEGER,[combo] INTEGER,[minbp] INTEGER,[avgjudge] INTEGER NOT NULL DEFAULT 2147483647,[playcount] INTEGER,[clearcount] INTEGER,[trophy] TEXT,[ghost] TEXT,[option] INTEGER,[seed] INTEGER,[random] INTEGER,[date] INTEGER,[state] INTEGER,[scorehash] TEXT,PRIMARY KEY(sha256,mode))",
+]
+
+# 合成データの日付の基準 (2024-01-01 UTC) と期間
+BASE_DATE = 1704067200
+DAY = 86400
+
+# 譜面の sha256 / md5 (乱数から作るので実在の譜面とは重ならない)
+def make_hashes(rng: np.random.Generator, num: int, length: int) -> List[str]:
+	raw = rng.integers(0, 256, size=(num, length // 2), dtype=np.uint8)
+	return [row.tobytes().hex() for row in raw]
+
+# 難易度表を作る (dict のリストで返す. 列は mocha_sl.csv と同じ)
+# レベルが上がるほど beta_easy が大きくなり, beta_hard は beta_easy より必ず大きい
+def make_song_list(num_charts: int, prefix: str = "sl", num_levels: int = 26, seed: int = 0) -> List[dict]:
+	rng = np.random.default_rng(seed)
+	level = np.sort(rng.integers(0, num_levels, size=num_charts))
+	beta_easy = -3.0 + 0.25 * level + rng.normal(0.0, 0.1, size=num_charts)
+	beta_hard = beta_easy + rng.uniform(0.05, 1.5, size=num_charts)
+	alpha = rng.uniform(0.5, 4.0, size=num_charts)
+	sha256 = make_hashes(rng, num_charts, 64)
+	md5 = make_hashes(rng, num_charts, 32)
+	song_list = []
+	for i in range(num_charts):
+		song_list.append({
+			"title": f"Synthetic {prefix}{level[i]} #{i} [ANOTHER]",
+			"display_level": f"{prefix}{level[i]}",
+			"md5": md5[i],
+			"sha256": sha256[i],
+			"beta_easy": f"{beta_easy[i]:.3f}",
+			"beta_hard": f"{beta_hard[i]:.3f}",
+			"alpha": f"{alpha[i]:.3f}",
+			"has_data": "True",
+		})
+	return song_list
+
+def write_mocha_csv(path: str, song_list: List[dict]):
+	fields = ["title", "display_level", "md5", "sha256", "beta_easy", "beta_hard", "alpha", "has_data"]
+	# 本物の CSV と同じく BOM 付き UTF-8
+	with open(path, "w", encoding="utf-8-sig", newline="") as f:
+		writer = csv.DictWriter(f, fieldnames=fields)
+		writer.writeheader()
+		writer.writerows(song_list)
+
+# 実力 theta のプレイヤーのランプを段階反応モデルから引く (Failed: 1〜3, Easy: 4〜5, Hard: 6〜8)
+def sample_clear(rng: np.random.Generator, theta: float, beta_easy, beta_hard, alpha) -> np.ndarray:
+	p_easy = 1.0 / (1.0 + np.exp(- alpha * (theta - beta_easy)))
+	p_hard = 1.0 / (1.0 + np.exp(- alpha * (theta - beta_hard)))
+	u = rng.random(len(alpha))
+	return np.where(
+		u < p_hard, rng.integers(6, 9, size=len(alpha)),
+		np.where(u < p_easy, rng.integers(4, 6, size=len(alpha)), rng.integers(1, 4, size=len(alpha)))
+	)
+
+# score.db を作る
+# num_rows 行のうち duplicate_rate の割合は既にある sha256 の別 mode の行 (同じ譜面を別オプションで遊んだ分)
+# 日付は days 日間に散らばり, player テーブルには 1 日 1 行の累計を入れる
+def make_score_db(
+	path: str,
+	song_list: List[dict],
+	num_rows: int,
+	theta: float = 0.5,
+	duplicate_rate: float = 0.1,
+	days: int = 365,
+	seed: int = 0
+):
+	rng = np.random.default_rng(seed)
+	beta_easy = np.array([float(song["beta_easy"]) for song in song_list])
+	beta_hard = np.array([float(song["beta_hard"]) for song in song_list])
+	alpha = np.array([float(song["alpha"]) for song in song_list])
+	sha256 = [song["sha256"] for song in song_list]
+
+	# 譜面と mode の組 (sha256, mode) は主キーなので重ならないように選ぶ
+	num_unique = min(len(song_list), max(1, int(round(num_rows * (1.0 - duplicate_rate)))))
+	charts = rng.choice(len(song_list), size=num_unique, replace=False)
+	num_duplicate = num_rows - num_unique
+	if num_duplicate > 0:
+		extra = rng.choice(charts, size=num_duplicate, replace=True)
+		charts = np.concatenate([charts, extra])
+	mode = np.zeros(len(charts), dtype=np.int64)
+	order = np.argsort(charts, kind="stable")
+	sorted_charts = charts[order]
+	start = np.r_[0, np.flatnonzero(np.diff(sorted_charts)) + 1]
+	counts = np.diff(np.r_[start, len(sorted_charts)])
+	mode[order] = np.arange(len(charts)) - np.repeat(start, counts)
+
+	n = len(charts)
+	clear = sample_clear(rng, theta, beta_easy[charts], beta_hard[charts], alpha[charts])
+	notes = rng.integers(500, 3000, size=n)
+	pg = (notes * rng.uniform(0.3, 0.9, size=n)).astype(np.int64)
+	gr = ((notes - pg) * rng.uniform(0.0, 1.0, size=n)).astype(np.int64)
+	minbp = rng.integers(0, 200, size=n)
+	date = np.sort(BASE_DATE + rng.integers(0, days * DAY, size=n))
+	rng.shuffle(date)
+
+	con = sqlite3.connect(path)
+	try:
+		for sql in SCORE_DB_SCHEMA:
+			con.execute(sql)
+		con.execute("INSERT INTO info VALUES ('synthetic', 'synthetic', NULL)")
+		rows = (
+			(
+				sha256[charts[i]], int(mode[i]), int(clear[i]),
+				int(pg[i] // 2), int(pg[i] - pg[i] // 2), int(gr[i] // 2), int(gr[i] - gr[i] // 2),
+				0, 0, 0, 0, 0, 0, 0, 0,
+				int(notes[i]), int(notes[i]), int(minbp[i]), 2147483647,
+				1, 1 if clear[i] >= 2 else 0, "", "", 0, 0, 0, int(date[i]), 0, ""
+			)
+			for i in range(n)
+		)
+		con.executemany(f"INSERT INTO score VALUES ({','.join('?' * 29)})", rows)
+
+		# player テーブル: その日までの累計プレイ数
+		day = (np.sort(date) - BASE_DATE) // DAY
+		played_days, per_day = np.unique(day, return_counts=True)
+		total = np.cumsum(per_day)
+		con.executemany(
+			f"INSERT INTO player VALUES ({','.join('?' * 17)})",
+			(
+				(int(BASE_DATE + (d + 1) * DAY), int(t), int(t), 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+				for d, t in zip(played_days.tolist(), total.tolist())
+			)
+		)
+		con.commit()
+	finally:
+		con.close()
+
+# 難易度表と score.db の組を作ってパスを返す
+def make_dataset(output_dir: str, num_charts: int, num_rows: int, duplicate_rate: float = 0.1, seed: int = 0) -> Dict[str, str]:
+	os.makedirs(output_dir, exist_ok=True)
+	# 同じ条件なら作り直さない
+	csv_path = os.path.join(output_dir, f"sl_synthetic_{num_charts}_s{seed}.csv")
+	db_path = os.path.join(output_dir, f"score_{num_charts}_{num_rows}_d{duplicate_rate:g}_s{seed}.db")
+	song_list = make_song_list(num_charts, seed=seed)
+	if not os.path.exists(csv_path):
+		write_mocha_csv(csv_path, song_list)
+	if not os.path.exists(db_path):
+		tmp_path = db_path + ".tmp"
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		make_score_db(tmp_path, song_list, num_rows, duplicate_rate=duplicate_rate, seed=seed)
+		os.replace(tmp_path, db_path)
+	return {"csv": csv_path, "score_db": db_path}
+
+def main(argv: List[str]) -> int:
+	parser = argparse.ArgumentParser(description = "ベンチマーク用の合成データを作る")
+	parser.add_argument("--charts", type = int, default = 10000, help = "譜面数")
+	parser.add_argument("--rows", type = int, default = 100000, help = "score.db の行数")
+	parser.add_argument("--duplicate-rate", type = float, default = 0.1, help = "同じ sha256 の別 mode の行の割合")
+	parser.add_argument("--seed", type = int, default = 0, help = "乱数の種")
+	parser.add_argument("--out", default = "bench_data", help = "出力先ディレクトリ")
+	args = parser.parse_args(argv)
+	paths = make_dataset(args.out, args.charts, args.rows, args.duplicate_rate, args.seed)
+	print(f"{paths['csv']}\n{paths['score_db']}")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -4,16 +4,140 @@ Shobon Stella Recommend v1.1
 by Shobon
 
 """
+from __future__ import annotations
 import os
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
+import sys
 import sqlite3
 import csv
-import numpy as np
 import html
 import json
-from scipy.optimize import minimize_scalar
-from typing import List, Dict, Tuple
+import math
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Callable
+
+# 重いモジュールは最初に属性を使ったときに読み込む (GUI の起動や --help を速くする)
+# 読み込んだらモジュールのグローバル変数を本物に差し替えるので, 2 回目からは普通のモジュールと同じ
+class LazyModule:
+	def __init__(self, name: str, global_name: str):
+		self._name = name
+		self._global_name = global_name
+
+	def __getattr__(self, attr: str):
+		import importlib
+		module = importlib.import_module(self._name)
+		globals()[self._global_name] = module
+		return getattr(module, attr)
+
+np = LazyModule("numpy", "np")
+
+# 段階ごとの時間・メモリと件数の記録
+# 既定は何もしない NullMetrics で, --metrics / --profile や GUI のチェックを付けたときだけ RunMetrics に差し替える
+class NullMetrics:
+	enabled = False
+
+	def stage(self, name: str, table: str = None):
+		return _NULL_STAGE
+
+	def count(self, name: str, n: int = 1):
+		pass
+
+class _NullStage:
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+_NULL_STAGE = _NullStage()
+
+class RunMetrics:
+	enabled = True
+
+	def __init__(self, trace_memory: bool = True):
+		self.trace_memory = trace_memory
+		self.stages: List[dict] = []
+		self.counters: Dict[str, int] = dict()
+		self.started = time.perf_counter()
+		# 入れ子の段階のピークメモリを親にも伝えるためのスタック
+		self._peaks: List[int] = []
+		# 自分で始めた tracemalloc だけ止める
+		self.owns_tracing = False
+		if trace_memory:
+			import tracemalloc
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+				self.owns_tracing = True
+
+	# with metrics.stage("estimate", "sl"): の中の壁時計時間, CPU 時間, ピークメモリを記録する
+	@contextmanager
+	def stage(self, name: str, table: str = None):
+		tracemalloc = None
+		if self.trace_memory:
+			import tracemalloc
+			current, peak = tracemalloc.get_traced_memory()
+			if self._peaks:
+				self._peaks[-1] = max(self._peaks[-1], peak)
+			tracemalloc.reset_peak()
+			self._peaks.append(current)
+		wall = time.perf_counter()
+		cpu = time.process_time()
+		try:
+			yield self
+		finally:
+			record = {
+				"name": name,
+				"table": table,
+				"wall": time.perf_counter() - wall,
+				"cpu": time.process_time() - cpu,
+			}
+			if tracemalloc is not None:
+				start = self._peaks.pop()
+				peak = max(tracemalloc.get_traced_memory()[1], start)
+				if self._peaks:
+					self._peaks[-1] = max(self._peaks[-1], peak)
+				record["peak_memory"] = peak - start
+			self.stages.append(record)
+
+	def count(self, name: str, n: int = 1):
+		self.counters[name] = self.counters.get(name, 0) + int(n)
+
+	def to_dict(self) -> dict:
+		return {
+			"wall": time.perf_counter() - self.started,
+			"stages": self.stages,
+			"counters": self.counters,
+		}
+
+	def save(self, path: str):
+		with open(path, "w", encoding="utf-8") as f:
+			json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+	# GUI のログ用の 1 行ずつの要約
+	def summary_lines(self) -> List[str]:
+		ret = []
+		for record in self.stages:
+			name = record["name"] if record["table"] is None else f"{record['table']} {record['name']}"
+			line = f"{name}: {record['wall'] * 1000:.0f} ms (CPU {record['cpu'] * 1000:.0f} ms)"
+			if "peak_memory" in record:
+				line += f" ピーク {record['peak_memory'] / (1 << 20):.1f} MiB"
+			ret.append(line)
+		ret.extend(f"{name}: {value}" for name, value in self.counters.items())
+		return ret
+
+metrics = NullMetrics()
+
+def enable_metrics(trace_memory: bool = True) -> RunMetrics:
+	global metrics
+	metrics = RunMetrics(trace_memory)
+	return metrics
+
+def disable_metrics():
+	global metrics
+	if metrics.enabled and metrics.owns_tracing:
+		import tracemalloc
+		tracemalloc.stop()
+	metrics = NullMetrics()
 
 # score のデータから必要な情報を取得
 def refine_score_data(score: dict) -> dict:
@@ -22,31 +146,229 @@ def refine_score_data(score: dict) -> dict:
 	ret['clear'] = score['clear']
 	ret['score_rate'] = (score['epg'] * 2 + score['lpg'] * 2 + score['egr'] + score['lgr']) / (2 * score['notes'])
 	ret['minbp'] = score['minbp']
+	if 'date' in score:
+		ret['date'] = score['date']
 	return ret
 
+# スナップショットに写す score の列 (ghost や trophy などの大きい列は写さない)
+SCORE_SNAPSHOT_COLUMNS = ["sha256", "clear", "epg", "lpg", "egr", "lgr", "notes", "minbp", "date"]
+# player テーブル (日ごとの累計) から写す列
+PLAYER_SNAPSHOT_COLUMNS = ["date", "playcount"]
+
+# score.db の読み取り専用のスナップショットをメモリ上に作る
+# beatoraja が書き込んでいても邪魔しないよう mode=ro で開き, 1 つの読み取りトランザクションでコピーしてすぐ切り離す
+# score の必要な列だけを写す (バッチのワーカーごとに DB 全体をメモリに持たないため)
+# ロック中 (SQLITE_BUSY / SQLITE_LOCKED) なら待ち時間を倍にしながら retries 回までやり直す
+# (sqlite3 の backup() はロック中だと際限なく待ち続けてこの上限が効かないので使わない)
+def open_score_snapshot(directory: str, retries: int = 8, delay: float = 0.05) -> sqlite3.Connection:
+	import pathlib
+	if not os.path.exists(directory):
+		raise FileNotFoundError(directory)
+	uri = pathlib.Path(os.path.abspath(directory)).as_uri() + "?mode=ro"
+	for attempt in range(retries + 1):
+		snapshot = sqlite3.connect("file::memory:", uri=True, timeout=0)
+		try:
+			snapshot.execute("ATTACH DATABASE ? AS source", (uri,))
+			try:
+				snapshot.execute("BEGIN")
+				snapshot.execute(f"CREATE TABLE score AS SELECT {', '.join(SCORE_SNAPSHOT_COLUMNS)} FROM source.score")
+				has_player = snapshot.execute("SELECT 1 FROM source.sqlite_master WHERE type = 'table' AND name = 'player'").fetchone()
+				if has_player is not None:
+					snapshot.execute(f"CREATE TABLE player AS SELECT {', '.join(PLAYER_SNAPSHOT_COLUMNS)} FROM source.player")
+				snapshot.execute("COMMIT")
+			finally:
+				if snapshot.in_transaction:
+					snapshot.execute("ROLLBACK")
+				snapshot.execute("DETACH DATABASE source")
+			return snapshot
+		except sqlite3.OperationalError as e:
+			snapshot.close()
+			if not is_busy_error(e) or attempt == retries:
+				raise
+			time.sleep(delay * (2 ** attempt))
+
+def is_busy_error(e: sqlite3.OperationalError) -> bool:
+	if getattr(e, "sqlite_errorname", None) is not None:
+		return e.sqlite_errorname.startswith(("SQLITE_BUSY", "SQLITE_LOCKED"))
+	message = str(e)
+	return "locked" in message or "busy" in message
+
+# score.db のパスならスナップショットを作って終わったら閉じ, スナップショットの接続ならそのまま使う
+# (1 回の更新で何度もクエリするときは呼び出し側でスナップショットを 1 つ作って渡す)
+@contextmanager
+def score_connection(directory):
+	if isinstance(directory, sqlite3.Connection):
+		yield directory
+		return
+	con = open_score_snapshot(directory)
+	try:
+		yield con
+	finally:
+		con.close()
+
 # score.db から情報を取得
 def get_score_list(directory: str) -> List[dict]:
-	with sqlite3.connect(directory) as con:
-		con.row_factory = sqlite3.Row
+	with score_connection(directory) as con:
 		cur = con.cursor()
+		cur.row_factory = sqlite3.Row
 		cur.execute("SELECT * FROM score")
 		score_tables = cur.fetchall()
-		score_list = []
 		score_map = dict()
 		for score_row in score_tables:
-			dat = refine_score_data(dict(score_row))
-			if score_row['sha256'] not in score_map:
-				score_map[score_row['sha256']] = dat
-			else:
-				score_map[score_row['sha256']]['clear']\
-					= str(max(int(score_map[score_row['sha256']]['clear']), int(dat['clear'])))
-				score_map[score_row['sha256']]['minbp']\
-					= str(min(int(score_map[score_row['sha256']]['minbp']), int(dat['minbp'])))
-				score_map[score_row['sha256']]['score_rate']\
-					= str(max(float(score_map[score_row['sha256']]['score_rate']), float(dat['score_rate'])))				
-		for sha256, dat in score_map.items():
-			score_list.append(dat)
-		return score_list
+			merge_score_data(score_map, refine_score_data(dict(score_row)))
+		metrics.count("rows_loaded", len(score_tables))
+		metrics.count("rows_deduped", len(score_map))
+		return list(score_map.values())
+
+# score.db から譜面ごとのベストを取得
+# 重複のまとめと難易度表との結合は SQLite の中で行い, 必要な列だけを読む
+# sha256_list を渡すとその譜面だけに絞る
+def get_best_score_list(directory: str, sha256_list = None) -> List[dict]:
+	with score_connection(directory) as con:
+		join = get_chart_filter(con, sha256_list)
+		cur = con.execute(f"""
+			SELECT
+				score.sha256,
+				MAX(clear),
+				MIN(minbp),
+				MAX(CASE WHEN notes > 0 THEN (epg * 2 + lpg * 2 + egr + lgr) / (2.0 * notes) ELSE 0.0 END)
+			FROM score {join}
+			GROUP BY score.sha256
+		""")
+		ret = [
+			{'sha256': sha256, 'clear': clear, 'minbp': minbp, 'score_rate': score_rate}
+			for sha256, clear, minbp, score_rate in cur.fetchall()
+		]
+		# まとめる前の行数は記録するときだけ数える
+		if metrics.enabled:
+			metrics.count("rows_loaded", con.execute(f"SELECT COUNT(*) FROM score {join}").fetchone()[0])
+			metrics.count("rows_deduped", len(ret))
+		return ret
+
+# sha256_list の譜面だけに絞るための一時テーブルを作り, score に付ける JOIN 句を返す (None なら絞らない)
+def get_chart_filter(con: sqlite3.Connection, sha256_list = None) -> str:
+	if sha256_list is None:
+		return ""
+	con.execute("CREATE TEMP TABLE IF NOT EXISTS chart (sha256 TEXT PRIMARY KEY)")
+	con.execute("DELETE FROM temp.chart")
+	con.executemany("INSERT OR IGNORE INTO temp.chart VALUES (?)", ((sha256,) for sha256 in sha256_list))
+	return "JOIN temp.chart USING (sha256)"
+
+# 実力の推移を作るためのスコアの履歴 (日付順)
+# chart は譜面の並び (sha256_list や ChartFrame の行) の番号, player は player テーブルの (date, playcount)
+class ScoreHistory:
+	def __init__(self, chart, clear, date, player: List[Tuple[int, int]] = None):
+		self.chart = np.asarray(chart, dtype=np.int64)
+		self.clear = np.asarray(clear, dtype=np.int16)
+		self.date = np.asarray(date, dtype=np.int64)
+		self.player = player if player is not None else []
+
+	def __len__(self) -> int:
+		return len(self.chart)
+
+	# sha256_list の並びの番号を, その部分列 (positions[i] 番目が i 行目) の並びの番号に付け替える
+	# 部分列にない譜面の行は落とす (TableRegistry の和集合から各表へ)
+	def take(self, positions: np.ndarray, num_charts: int) -> "ScoreHistory":
+		inverse = np.full(num_charts, -1, dtype=np.int64)
+		inverse[positions] = np.arange(len(positions))
+		chart = inverse[self.chart]
+		keep = chart >= 0
+		return ScoreHistory(chart[keep], self.clear[keep], self.date[keep], self.player)
+
+# score テーブルは譜面と mode ごとに最後に更新した日付しか持たないので, (譜面, clear, date) をその日付に取った記録とみなす
+# 譜面の番号への変換は SQLite の一時テーブルで行い, 数値の列だけを読む
+def get_score_history(directory: str, sha256_list: List[str]) -> ScoreHistory:
+	with score_connection(directory) as con:
+		con.execute("CREATE TEMP TABLE IF NOT EXISTS chart_position (sha256 TEXT PRIMARY KEY, position INTEGER)")
+		con.execute("DELETE FROM temp.chart_position")
+		con.executemany("INSERT OR IGNORE INTO temp.chart_position VALUES (?, ?)", zip(sha256_list, range(len(sha256_list))))
+		rows = con.execute("""
+			SELECT position, clear, date FROM score JOIN temp.chart_position USING (sha256)
+			WHERE date IS NOT NULL AND clear >= 1
+			ORDER BY date
+		""").fetchall()
+		player = []
+		if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player'").fetchone() is not None:
+			player = con.execute("SELECT date, playcount FROM player WHERE date IS NOT NULL ORDER BY date").fetchall()
+		if not rows:
+			return ScoreHistory([], [], [], player)
+		return ScoreHistory(*np.array(rows, dtype=np.int64).T, player)
+
+# 重複した sha256 のスコアをまとめる (clear と score_rate は最大, minbp は最小)
+# まとめた結果が変わったかどうかを返す
+def merge_score_data(score_map: Dict[str, dict], dat: dict) -> bool:
+	sha256 = dat['sha256']
+	if sha256 not in score_map:
+		score_map[sha256] = dat
+		return True
+	old = score_map[sha256]
+	merged = (
+		max(int(old['clear']), int(dat['clear'])),
+		min(int(old['minbp']), int(dat['minbp'])),
+		max(float(old['score_rate']), float(dat['score_rate']))
+	)
+	if merged == (int(old['clear']), int(old['minbp']), float(old['score_rate'])):
+		return False
+	old['clear'], old['minbp'], old['score_rate'] = merged
+	return True
+
+# score.db の最新の date
+def get_max_score_date(directory: str) -> int:
+	with score_connection(directory) as con:
+		row = con.execute("SELECT MAX(date) FROM score").fetchone()
+		return int(row[0]) if row[0] is not None else 0
+
+# date が since_date 以降のスコアだけを取得 (None なら全件)
+def get_score_rows_since(directory: str, since_date: int = None) -> List[dict]:
+	with score_connection(directory) as con:
+		cur = con.cursor()
+		cur.row_factory = sqlite3.Row
+		query = "SELECT sha256, clear, epg, lpg, egr, lgr, notes, minbp, date FROM score"
+		if since_date is None:
+			cur.execute(query)
+		else:
+			cur.execute(query + " WHERE date >= ?", (since_date,))
+		return [refine_score_data(dict(score_row)) for score_row in cur.fetchall()]
+
+# 前回実行時の状態 (最新 date, sha256 ごとのベスト, 表ごとの theta, 書き出した表) を読み込む
+# state_path が None なら空の状態を返す
+def load_score_state(state_path: str = None) -> dict:
+	state = {"version": 1, "max_date": None, "scores": dict(), "theta": None, "registry": None, "tables": []}
+	if state_path is not None and os.path.exists(state_path):
+		with open(state_path, encoding="utf-8") as f:
+			loaded = json.load(f)
+		if loaded.get("version") == 1:
+			state = loaded
+	return state
+
+def save_score_state(state_path: str, state: dict):
+	tmp_path = state_path + ".tmp"
+	with open(tmp_path, "w", encoding="utf-8") as f:
+		json.dump(state, f)
+	os.replace(tmp_path, state_path)
+
+# 前回以降に更新されたスコアだけを読んで状態にマージする
+# 同じ date のスコアが後から書き込まれることもあるので境界は含めて読む (マージは何度やっても同じ結果になる)
+# 状態を変えたスコアの件数を返す
+def update_score_state(directory: str, state: dict) -> Tuple[List[dict], int]:
+	score_map = dict()
+	for sha256, (clear, minbp, score_rate) in state["scores"].items():
+		score_map[sha256] = {'sha256': sha256, 'clear': clear, 'minbp': minbp, 'score_rate': score_rate}
+
+	new_rows = get_score_rows_since(directory, state["max_date"])
+	changed = 0
+	for dat in new_rows:
+		if merge_score_data(score_map, dat):
+			changed += 1
+
+	dates = [row['date'] for row in new_rows if row['date'] is not None]
+	if state["max_date"] is not None:
+		dates.append(state["max_date"])
+	state["max_date"] = max(dates) if dates else 0
+	metrics.count("rows_loaded", len(new_rows))
+	metrics.count("rows_deduped", len(score_map))
+	state["scores"] = {sha256: [int(dat['clear']), int(dat['minbp']), float(dat['score_rate'])] for sha256, dat in score_map.items()}
+	return list(score_map.values()), changed
 
 # mocha_sl/st.csv から情報を取得 
 def get_song_list(directory: str) -> List[dict]:
@@ -66,6 +388,139 @@ def get_song_list(directory: str) -> List[dict]:
 			song_list.append(tmp)
 		return song_list
 
+# コンパイル済み譜面表の 1 行 (タイトルは別ファイルのバイト列に置き, その位置だけを持つ)
+CHART_TABLE_FIELDS = [
+	("sha256", "S64"),
+	("md5", "S32"),
+	("display_level", "S16"),
+	("beta_easy", "f8"),
+	("beta_hard", "f8"),
+	("alpha", "f8"),
+	("title_offset", "i8"),
+	("title_length", "i8"),
+]
+
+# mocha_sl/st.csv をコンパイルした譜面表 (mmap で読み込むので行ごとの Python オブジェクトを作らない)
+class ChartTable:
+	def __init__(self, charts: np.ndarray, titles):
+		self.charts = charts
+		self.titles = titles
+
+	def __len__(self) -> int:
+		return len(self.charts)
+
+	@property
+	def beta_easy(self) -> np.ndarray:
+		return self.charts["beta_easy"]
+
+	@property
+	def beta_hard(self) -> np.ndarray:
+		return self.charts["beta_hard"]
+
+	@property
+	def alpha(self) -> np.ndarray:
+		return self.charts["alpha"]
+
+	def title(self, i: int) -> str:
+		offset = int(self.charts["title_offset"][i])
+		length = int(self.charts["title_length"][i])
+		return bytes(self.titles[offset:offset + length]).decode("utf-8")
+
+	@classmethod
+	def from_song_list(cls, song_list: List[dict]) -> "ChartTable":
+		charts = np.zeros(len(song_list), dtype=CHART_TABLE_FIELDS)
+		title_blob = bytearray()
+		for i, song in enumerate(song_list):
+			title = song["title"].encode("utf-8")
+			charts[i] = (
+				song["sha256"].encode("ascii"),
+				song["md5"].encode("ascii"),
+				song["display_level"].encode("utf-8"),
+				float(song["beta_easy"]),
+				float(song["beta_hard"]),
+				float(song["alpha"]),
+				len(title_blob),
+				len(title),
+			)
+			title_blob += title
+		return cls(charts, bytes(title_blob))
+
+	# get_song_list と同じ形の dict のリストに戻す
+	def to_song_list(self) -> List[dict]:
+		song_list = []
+		sha256_list = self.charts["sha256"].tolist()
+		md5_list = self.charts["md5"].tolist()
+		level_list = self.charts["display_level"].tolist()
+		beta_easy_list = self.charts["beta_easy"].tolist()
+		beta_hard_list = self.charts["beta_hard"].tolist()
+		alpha_list = self.charts["alpha"].tolist()
+		for i in range(len(self.charts)):
+			song_list.append({
+				"title": self.title(i),
+				"display_level": level_list[i].decode("utf-8"),
+				"md5": md5_list[i].decode("ascii"),
+				"sha256": sha256_list[i].decode("ascii"),
+				"beta_easy": beta_easy_list[i],
+				"beta_hard": beta_hard_list[i],
+				"alpha": alpha_list[i],
+				"has_data": "True",
+			})
+		return song_list
+
+# ファイル内容の sha256
+def get_file_hash(directory: str) -> str:
+	import hashlib
+	h = hashlib.sha256()
+	with open(directory, "rb") as file:
+		for chunk in iter(lambda: file.read(1 << 20), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+# コンパイル済み譜面表のキャッシュの置き場所 (CSV と同じフォルダの .cache/ に CSV の内容のハッシュで置く)
+def get_chart_table_cache_paths(directory: str, csv_hash: str) -> Tuple[str, str]:
+	cache_dir = os.path.join(os.path.dirname(os.path.abspath(directory)), ".cache")
+	stem = os.path.splitext(os.path.basename(directory))[0]
+	base = os.path.join(cache_dir, f"{stem}.{csv_hash[:16]}")
+	return base + ".charts.npy", base + ".titles.bin"
+
+# mocha_sl/st.csv をコンパイル済みの譜面表として読み込む
+# CSV の内容が変わっていれば作り直し, キャッシュが書けない場所なら毎回 CSV から作る
+def load_chart_table(directory: str) -> ChartTable:
+	csv_hash = get_file_hash(directory)
+	charts_path, titles_path = get_chart_table_cache_paths(directory, csv_hash)
+	if os.path.exists(charts_path) and os.path.exists(titles_path):
+		try:
+			charts = np.load(charts_path, mmap_mode="r")
+			if charts.dtype == np.dtype(CHART_TABLE_FIELDS):
+				if os.path.getsize(titles_path) > 0:
+					titles = np.memmap(titles_path, dtype=np.uint8, mode="r")
+				else:
+					titles = b""
+				return ChartTable(charts, titles)
+		except (OSError, ValueError):
+			pass
+
+	table = ChartTable.from_song_list(get_song_list(directory))
+	try:
+		cache_dir = os.path.dirname(charts_path)
+		os.makedirs(cache_dir, exist_ok=True)
+		# 同じ CSV の古いキャッシュは消す
+		import re
+		stem = os.path.splitext(os.path.basename(directory))[0]
+		pattern = re.compile(re.escape(stem) + r"\.[0-9a-f]{16}\.(charts\.npy|titles\.bin)")
+		for filename in os.listdir(cache_dir):
+			if pattern.fullmatch(filename):
+				os.remove(os.path.join(cache_dir, filename))
+		with open(charts_path + ".tmp", "wb") as f:
+			np.save(f, table.charts)
+		with open(titles_path + ".tmp", "wb") as f:
+			f.write(table.titles)
+		os.replace(titles_path + ".tmp", titles_path)
+		os.replace(charts_path + ".tmp", charts_path)
+	except OSError:
+		pass
+	return table
+
 # クリア状況によって No Play / Failed / Easy / Hard に分ける
 def get_clear_type(c: int) -> str:
 	if c >= 6:
@@ -108,18 +563,30 @@ def get_next_clear_type(c: int) -> str:
 
 # 各難易度の平均 beta を計算する
 def get_average_list(song_list: List[dict], mode_slst: str) -> List[float]:
+	return get_average_list_from_levels(
+		[song["display_level"] for song in song_list],
+		[float(song["beta_easy"]) for song in song_list],
+		mode_slst
+	)
+
+def get_average_list_from_levels(display_levels: List[str], beta_easy, mode_slst: str) -> List[float]:
 	sum_beta = []
 	nums = []
-	for song in song_list:
-		if song["display_level"][:2] != mode_slst:
+	for display_level, beta in zip(display_levels, beta_easy):
+		if display_level[:2] != mode_slst:
 			continue
-		level = int(song["display_level"][2:])
+		level = int(display_level[2:])
 		while level >= len(nums):
 			nums.append(0)
 			sum_beta.append(0.0)
 		nums[level] += 1
-		sum_beta[level] += float(song["beta_easy"])
+		sum_beta[level] += float(beta)
 	ret = [sum_beta[i] / nums[i] for i in range(len(nums))]
+	# 上のほうのレベルは譜面が少なく平均が逆転することがある (st10〜st12 など) ので,
+	# 1 つ下のレベルとの差で外挿して単調増加にする
+	for i in range(1, len(ret)):
+		if ret[i] <= ret[i-1]:
+			ret[i] = ret[i-1] + (ret[i-1] - ret[i-2] if i >= 2 else 1.0)
 	return ret
 
 # beta の値から sl に変換
@@ -135,6 +602,29 @@ def beta_to_stella(average_list: List[float], c: float) -> float:
 		now_st = len(average_list) - 1
 	return (c - average_list[now_st]) / (average_list[now_st + 1] - average_list[now_st]) + now_st
 
+# beta と sl を相互に変換する (get_average_list から 1 度だけ作る)
+# beta_to_stella と同じく, 最も低いレベル未満と最も高いレベル超は端の区間をそのまま延長する
+class LevelMapper:
+	def __init__(self, average_list: List[float]):
+		self.average = np.asarray(average_list, dtype=np.float64)
+		assert len(self.average) >= 2
+		assert np.all(np.diff(self.average) > 0)
+		self.width = np.diff(self.average)
+
+	# beta (スカラーまたは配列) を sl に変換
+	def to_stella(self, beta):
+		beta = np.asarray(beta, dtype=np.float64)
+		level = np.clip(np.searchsorted(self.average, beta, side='right') - 1, 0, len(self.average) - 2)
+		ret = (beta - self.average[level]) / self.width[level] + level
+		return float(ret) if ret.ndim == 0 else ret
+
+	# sl (スカラーまたは配列) を beta に変換
+	def to_beta(self, stella):
+		stella = np.asarray(stella, dtype=np.float64)
+		level = np.clip(np.floor(stella).astype(np.int64), 0, len(self.average) - 2)
+		ret = self.average[level] + (stella - level) * self.width[level]
+		return float(ret) if ret.ndim == 0 else ret
+
 # クリアできる確率
 def prob_grm(theta: float, beta: float, alpha: float) -> float:
 	return 1.0 / (1.0 + np.exp(- alpha * (theta - beta)))
@@ -170,869 +660,3419 @@ def negative_log_likelihood(theta: float, score_list: List[dict], song_list: Lis
 		log_likelihood += np.log(max(prob, epsilon))
 	return - log_likelihood
 
-# minimize_scalar で最尤推定
-def max_likelihood_estimation(score_list: List[dict], song_list: List[dict]) -> float:
-	result = minimize_scalar(
-		negative_log_likelihood, 
-		bounds = (-20, 10), # この範囲に解があると仮定
-		args = (score_list, song_list),
-		method = 'bounded'
-	)
-	return result
+# クリア状況の符号 (LikelihoodModel の outcome 配列で使う)
+OUTCOME_FAILED = 0
+OUTCOME_EASY = 1
+OUTCOME_HARD = 2
 
-# ppを計算する
-def pp_value(average_list: List[float], beta: float) -> float:
-	return (beta_to_stella(average_list, beta) + 2) * 40
+# log(sigmoid(x)) を数値的に安定に計算
+def log_sigmoid(x):
+	return -np.logaddexp(0.0, -x)
 
-# ppリストを取得
-def get_sorted_pp_data(average_list: List[float], score_list: List[dict], song_list: List[dict], max_num: int) -> List[dict]:
-	ret = []
+# 尤度計算用に score と譜面の結合を配列にまとめたもの
+# 評価のたびに dict を作り直したり float() で文字列を解析したりしない
+class LikelihoodModel:
+	def __init__(self, beta_easy, beta_hard, alpha, outcome):
+		self.beta_easy = np.asarray(beta_easy, dtype=np.float64)
+		self.beta_hard = np.asarray(beta_hard, dtype=np.float64)
+		self.alpha = np.asarray(alpha, dtype=np.float64)
+		self.outcome = np.array(outcome, dtype=np.int8)
 
-	sha256_dict = dict()
-	for song in song_list:
-		sha256_dict[song["sha256"]] = song
-	
-	for score in score_list:
-		clear_result = get_clear_type(int(score["clear"]))
-		if clear_result == "No Play":
-			continue 
-		if score["sha256"] not in sha256_dict:
-			continue
+		gap = self.alpha * (self.beta_hard - self.beta_easy)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			self.easy_gap = np.where(gap > 0, np.log(-np.expm1(-np.maximum(gap, 1e-300))), -np.inf)
+		n = len(self.outcome)
+		self.use_easy = np.empty(n)
+		self.sign_easy = np.empty(n)
+		self.use_hard = np.empty(n)
+		self.sign_hard = np.empty(n)
+		self.easy_const = np.empty(n)
+		self.set_outcome(slice(None), self.outcome)
+		self.log_epsilon = np.log(1e-9)
 
-		song = sha256_dict[score["sha256"]]
-		tmp = dict()
-		tmp["title"] = song["title"]
-		tmp["level"] = song["display_level"]
-		tmp["sha256"] = song["sha256"]
-		tmp["minbp"] = score["minbp"]
-		tmp["score_rate"] = score["score_rate"]
-		tmp["display_level"] = song["display_level"]
-		tmp["alpha"] = float(song["alpha"])
-		tmp["real_clear"] = score["clear"]
+	# index の譜面の結果を outcome に置き換える (その譜面の係数だけ計算し直す)
+	# 負の値は未プレイで, 尤度に何も足さない
+	# log P = use_easy * logσ(sign_easy * x1) + use_hard * logσ(sign_hard * x2) + easy_const
+	#   Failed: 1 - p1        = σ(-x1)
+	#   Easy  : p1 - p2       = σ(x1) σ(-x2) (1 - exp(-alpha (beta_hard - beta_easy)))
+	#   Hard  : p2            = σ(x2)
+	def set_outcome(self, index, outcome):
+		outcome = np.asarray(outcome, dtype=np.int8)
+		self.outcome[index] = outcome
+		failed = outcome == OUTCOME_FAILED
+		easy = outcome == OUTCOME_EASY
+		hard = outcome == OUTCOME_HARD
+		self.use_easy[index] = failed | easy
+		self.sign_easy[index] = np.where(failed, -1.0, 1.0)
+		self.use_hard[index] = easy | hard
+		self.sign_hard[index] = np.where(easy, -1.0, 1.0)
+		self.easy_const[index] = np.where(easy, self.easy_gap[index], 0.0)
 
-		if clear_result == "Failed":
-			continue
-		elif clear_result == "Easy":
-			beta_easy = float(song["beta_easy"])
-			pp = pp_value(average_list, beta_easy)
-			tmp["beta"] = float(song["beta_easy"])
-			tmp["pp"] = pp
-			tmp["clear"] = "Easy"
-		elif clear_result == "Hard":
-			beta_hard = float(song["beta_hard"])
-			pp = pp_value(average_list, beta_hard)
-			tmp["beta"] = float(song["beta_hard"])
-			tmp["pp"] = pp
-			tmp["clear"] = "Hard"
-		else:
-			assert False
-	
-		ret.append(tmp)
-	
-	ret.sort(key = lambda x: -x["pp"])
-	if len(ret) > max_num:
-		ret = ret[:max_num]
-	
-	print(*ret, sep='\n')
-	return ret
+	# 先頭 n 譜面だけのモデル (配列はコピーせずに共有する)
+	def prefix(self, n: int) -> "LikelihoodModel":
+		ret = object.__new__(LikelihoodModel)
+		for name in ("beta_easy", "beta_hard", "alpha", "outcome", "easy_gap", "use_easy", "sign_easy", "use_hard", "sign_hard", "easy_const"):
+			setattr(ret, name, getattr(self, name)[:n])
+		ret.log_epsilon = self.log_epsilon
+		return ret
 
+	@classmethod
+	def from_lists(cls, score_list: List[dict], song_list: List[dict]) -> "LikelihoodModel":
+		sha256_dict = dict()
+		for song in song_list:
+			sha256_dict[song["sha256"]] = song
+		beta_easy = []
+		beta_hard = []
+		alpha = []
+		outcome = []
+		for score in score_list:
+			clear_result = get_clear_type(int(score["clear"]))
+			if clear_result == "No Play":
+				continue
+			if score["sha256"] not in sha256_dict:
+				continue
+			song = sha256_dict[score["sha256"]]
+			beta_easy.append(float(song["beta_easy"]))
+			beta_hard.append(float(song["beta_hard"]))
+			alpha.append(float(song["alpha"]))
+			if clear_result == "Failed":
+				outcome.append(OUTCOME_FAILED)
+			elif clear_result == "Easy":
+				outcome.append(OUTCOME_EASY)
+			elif clear_result == "Hard":
+				outcome.append(OUTCOME_HARD)
+			else:
+				assert False
+		return cls(beta_easy, beta_hard, alpha, outcome)
 
-def generate_html_top100(
-	score_list: List[dict],
-	song_list: List[dict],
-	mode_slst: str,
-	average_list: List[float],
-	estimated_theta: float,
-	filename_top100: str
-):
-	dictLamp = {
-		"FullCombo": 8,
-		"ExHard": 7,
-		"Hard": 6,
-		"Clear": 5,
-		"Easy": 4,
-		"L-Assist": 3,
-		"Assist": 2,
-		"Failed": 1,
-		"No Play": "NaN",
-		"": "NaN"
-	}
+	def __len__(self) -> int:
+		return len(self.outcome)
 
-	lamp_order = ["No Play", "Failed", "Assist", "L-Assist", "Easy", "Clear", "Hard", "ExHard", "FullCombo"]
-	lamp_filter_html = ""
-	
-	for lamp in lamp_order:
-		safe_lamp = html.escape(lamp)
-		lamp_filter_html += f"""
-			<label class="filter-item">
-				<input type="checkbox" class="lamp-checkbox" value="{dictLamp[safe_lamp]}" checked onchange="applyLampFilter()">
-				{safe_lamp}
-			</label>
-		"""
-
-
-	top100_list = get_sorted_pp_data(average_list, score_list, song_list, 100)
-	pp_sum = 0
-	pp_raw_sum = 0
-	for song in top100_list[::-1]:
-		pp_sum *= 0.97
-		pp_sum += song['pp']
-		pp_raw_sum += song['pp']
-
-
-	# Prefix Template
-	html_content = f"""
-	<!DOCTYPE html>
-	<html lang="ja">
-	<head>
-		<meta charset="UTF-8">
-		<title>Shobon Stella Recommend</title>
-		<style>
-			body {{ font-family: sans-serif; background-color: #222; color: #eee; padding: 20px; }}
-			
-			.header-container {{
-				display: flex;
-				justify-content: space-between; /* タイトルは左、ボタンは右に配置 */
-				align_items: center;
-				margin-bottom: 20px;
-				border-bottom: 1px solid #444;
-				padding-bottom: 10px;
-			}}
-			.nav-btn {{
-				background-color: #004488;
-				color: white;
-				padding: 10px 20px;
-				text-decoration: none;
-				border-radius: 5px;
-				font-weight: bold;
-				transition: background-color 0.3s;
-				box-shadow: 0 2px 4px rgba(0,0,0,0.3);
-			}}
-			.nav-btn:hover {{
-				background-color: #003366;
-				transform: translateY(-1px);
-			}}			
-
-			/* --- ランプフィルタエリア --- */
-			.filter-container {{
-				background-color: #333; padding: 10px 15px; border-radius: 5px;
-				margin-bottom: 15px; border: 1px solid #444;
-			}}
-			.filter-label {{ font-weight: bold; margin-right: 10px; font-size: 0.9em; color: #aaa; }}
-			.filter-item {{ 
-				display: inline-block; margin-right: 15px; cursor: pointer; user-select: none; font-weight: bold;
-			}}
-			.filter-buttons {{ margin-top: 5px; }}
-			.filter-buttons button {{
-				font-size: 0.8em; padding: 2px 8px; margin-right: 5px; cursor: pointer;
-				background: #555; color: #fff; border: 1px solid #666; border-radius: 3px;
-			}}
-			.filter-buttons button:hover {{ background: #666; }}
-			
-			/* テーブル装飾 */
-			table {{ width: 100%; border-collapse: collapse; margin-top: 10px; }}
-			th, td {{ padding: 10px; border-bottom: 1px solid #444; text-align: left; }}
-			th {{ background-color: #333; cursor: pointer; user-select: none; }}
-			th:hover {{ background-color: #555; }}
-			th::after {{ content: ' ⇅'; font-size: 0.8em; color: #888; }}
-			
-			/* ランプの色分け */
-			.lamp-fc {{ color: #55ffff; font-weight: bold; text-shadow: 0 0 5px #55ffff; }}
-			.lamp-exh {{ color: #ffff55; font-weight: bold; text-shadow: 0 0 5px #ffff55; }}
-			.lamp-hard {{ color: #ff5555; font-weight: bold; text-shadow: 0 0 5px #ff5555; }}
-			.lamp-clear {{ color: #ffbb55; font-weight: bold; text-shadow: 0 0 5px #ffbb55; }}
-			.lamp-easy {{ color: #55ff55; font-weight: bold; text-shadow: 0 0 5px #55ff55; }}
-			.lamp-assist {{ color: #ff55ff; font-weight: bold; text-shadow: 0 0 5px #ff55ff; }}
-			.lamp-failed {{ color: #cccccc; }}
-			.lamp-noplay {{ color: #666666; }}
-
-			a{{
-				text-decoration: none;
-				color: #eee;
-			}}
-		</style>
-	</head>
-	<body>
-		<h1>Shobon Stella Recommend - Performance Top 100</h1>
-		<a href="result_table.html" class="nav-btn">難易度表 ページへ ➜</a>
-		<h2><font color="#55ffff">{pp_sum:.0f}pp</font> (Raw: {pp_raw_sum:.0f}pp)</h2>
-		<h3></h3>
-
-		<div class="filter-container">
-			<div style="margin-bottom:5px;">
-				<span class="filter-label">Now Lamp:</span>
-				{lamp_filter_html}
-			</div>
-			<div class="filter-buttons">
-				<button onclick="toggleLampAll(true)">全選択</button>
-				<button onclick="toggleLampAll(false)">全解除</button>
-			</div>
-		</div>
-	"""
+	# 各スコアの対数尤度 (epsilon で下限を取るのは negative_log_likelihood と同じ)
+	def log_probabilities(self, theta: float) -> np.ndarray:
+		x1 = self.alpha * (theta - self.beta_easy)
+		x2 = self.alpha * (theta - self.beta_hard)
+		log_prob = self.use_easy * log_sigmoid(self.sign_easy * x1)\
+			+ self.use_hard * log_sigmoid(self.sign_hard * x2) + self.easy_const
+		return np.maximum(log_prob, self.log_epsilon)
 
-	html_content += f"""
-	<div id="tab-content" class="tabcontent">
-		<table id="table">
-			<thead>
-				<tr>
-					<th onclick="sortTable(0, 'number')">順位</th>
-					<th onclick="sortTable(1, 'text')">タイトル</th>
-					<th onclick="sortTable(2, 'smart-number')">表</th>
-					<th onclick="sortTable(3, 'number')">ランプ</th>
-					<th onclick="sortTable(4, 'smart-number')">推定</th>
-					<th onclick="sortTable(5, 'number')">地力度</th>
-					<th onclick="sortTable(6, 'smart-number')">達成確率</th>
-					<th onclick="sortTable(7, 'smart-number')">pp</th>
-				</tr>
-			</thead>
+	def negative_log_likelihood(self, theta: float) -> float:
+		metrics.count("likelihood_evaluations")
+		return - float(np.sum(self.log_probabilities(theta)))
 
-			<tbody>
-	"""
-
-	for ret_num, song in enumerate(top100_list):
-		ret_title = song["title"]
-		if len(ret_title) >= 50:
-			ret_title = ret_title[:47]+'...'
-		ret_title = html.escape(ret_title)
-		ret_sha256 = song["sha256"]
-
-
-		ret_jiriki = f"{float(song['alpha'])/2:.2f}"
-		ret_lamp = get_detailed_clear_type(int(song["real_clear"]))
-		ret_ok_lamp = song["clear"]
-		ret_dislv = song["display_level"]
-		ret_lv = -1
-		ret_pp = f"{song['pp']:.0f}pp"
-		ret_prob = -1
-		
-		if ret_ok_lamp == "Easy":
-			ret_prob = f"{prob_grm(estimated_theta, float(song['beta']), float(song['alpha'])) * 100:.2f} %"
-			ret_lv = f"{mode_slst}{beta_to_stella(average_list, float(song['beta'])):.2f}"
-		elif ret_ok_lamp == "Hard":
-			ret_prob = f"{prob_grm(estimated_theta, float(song['beta']), float(song['alpha'])) * 100:.2f} %"
-			ret_lv = f"{mode_slst}{beta_to_stella(average_list, float(song['beta'])):.2f}"
-		else:
-			assert(False)
-
-		ret_colorclass = ""
-
-		if ret_lamp == "No Play":
-			ret_colorclass = "lamp-noplay"
-		elif ret_lamp == "Failed":
-			ret_colorclass = "lamp-failed"
-		elif ret_lamp == "Assist":
-			ret_colorclass = "lamp-assist"
-		elif ret_lamp == "L-Assist":
-			ret_colorclass = "lamp-assist"
-		elif ret_lamp == "Easy":
-			ret_colorclass = "lamp-easy"
-		elif ret_lamp == "Clear":
-			ret_colorclass = "lamp-clear"
-		elif ret_lamp == "Hard":
-			ret_colorclass = "lamp-hard"
-		elif ret_lamp == "ExHard":
-			ret_colorclass = "lamp-exh"
-		elif ret_lamp == "FullCombo":
-			ret_colorclass = "lamp-fc"
-
-		ret_lampnum = dictLamp[ret_lamp]		
-
-		html_content += f"""
-				<tr class="chart-row">
-					<td data-value="{ret_num + 1}">
-						{ret_num + 1}
-					</td>
-					<td data-value="{ret_title}">
-						<a href="https://mocha-repository.info/song.php?sha256={ret_sha256}">{ret_title}</a>
-					</td>
-					<td data-value="{ret_dislv}">
-						{ret_dislv}
-					</td>
-					<td data-value="{ret_lampnum}" class="{ret_colorclass}">
-						{ret_lamp}
-					</td>
-					<td data-value="{ret_lv}">
-						{ret_lv}
-					</td>
-					<td data-value="{ret_jiriki}">
-						{ret_jiriki}
-					</td>
-					<td data-value="{ret_prob}">
-						{ret_prob}
-					</td>
-					<td data-value="{ret_pp}">
-						{ret_pp}
-					</td>
-				</tr>
-		"""
-		
-	html_content += "</tbody></table></div>"
-
-	# Suffix Template
-	html_content += """
-		<script>
-			function openTab(evt, tabId) {
-				var i, tabcontent, tablinks;
-				tabcontent = document.getElementsByClassName("tabcontent");
-				for (i = 0; i < tabcontent.length; i++) {
-					tabcontent[i].style.display = "none";
-				}
-				tablinks = document.getElementsByClassName("tablinks");
-				for (i = 0; i < tablinks.length; i++) {
-					tablinks[i].className = tablinks[i].className.replace(" active", "");
-				}
-				document.getElementById(tabId).style.display = "block";
-				evt.currentTarget.className += " active";
-			}
-		
-			function applyLampFilter() {
-				const checkboxes = document.querySelectorAll('.lamp-checkbox');
-				const checkedLamps = Array.from(checkboxes)
-										  .filter(cb => cb.checked)
-										  .map(cb => cb.value);
+	# 各スコアの対数尤度の theta による 1 階・2 階微分 (epsilon の下限は無視する)
+	# theta はスカラーでも各スコアに揃えた配列でもよい
+	# 1 - p は p から引くと x が大きいときに桁落ちして 0 になる (勾配が 0 に見えて途中で止まる) ので直接計算する
+	def observation_derivatives(self, theta) -> Tuple[np.ndarray, np.ndarray]:
+		x1 = self.sign_easy * self.alpha * (theta - self.beta_easy)
+		x2 = self.sign_hard * self.alpha * (theta - self.beta_hard)
+		with np.errstate(over='ignore'):
+			p1 = 1.0 / (1.0 + np.exp(- x1))
+			q1 = 1.0 / (1.0 + np.exp(x1))
+			p2 = 1.0 / (1.0 + np.exp(- x2))
+			q2 = 1.0 / (1.0 + np.exp(x2))
+		gradient = self.alpha * (self.use_easy * self.sign_easy * q1 + self.use_hard * self.sign_hard * q2)
+		hessian = - self.alpha ** 2 * (self.use_easy * p1 * q1 + self.use_hard * p2 * q2)
+		return gradient, hessian
 
-				const rows = document.querySelectorAll('tr.chart-row');
-				
-				rows.forEach(row => {
-					const lampCell = row.cells[3]; 
-					const lampValue = lampCell.getAttribute('data-value');
-					if (checkedLamps.includes(lampValue)) {
-						row.style.display = ""; 
-					} else {
-						row.style.display = "none"; 
-					}
-				});
-			}
+	def derivatives(self, theta: float) -> Tuple[float, float]:
+		metrics.count("likelihood_evaluations")
+		gradient, hessian = self.observation_derivatives(theta)
+		return float(np.sum(gradient)), float(np.sum(hessian))
 
-			// 全選択/全解除ボタン
-			function toggleLampAll(checked) {
-				const checkboxes = document.querySelectorAll('.lamp-checkbox');
-				checkboxes.forEach(cb => cb.checked = checked);
-				applyLampFilter();
-			}
+	# 各スコアの Fisher 情報量 (Failed / Easy / Hard の期待値で取る)
+	# 1 - p も直接計算し, d1^2 / (1 - p1) と d2^2 / p2 は約分した形で計算する
+	def observation_fisher_information(self, theta) -> np.ndarray:
+		epsilon = 1e-300
+		x1 = self.alpha * (theta - self.beta_easy)
+		x2 = self.alpha * (theta - self.beta_hard)
+		with np.errstate(over='ignore'):
+			p1 = 1.0 / (1.0 + np.exp(- x1))
+			q1 = 1.0 / (1.0 + np.exp(x1))
+			p2 = 1.0 / (1.0 + np.exp(- x2))
+			q2 = 1.0 / (1.0 + np.exp(x2))
+		d1 = self.alpha * p1 * q1
+		d2 = self.alpha * p2 * q2
+		# p1 - p2 は大きい側では q2 - q1 で計算する
+		easy = np.where(x1 < 0, p1 - p2, q2 - q1)
+		return self.alpha * d1 * p1\
+			+ (d1 - d2) ** 2 / np.maximum(easy, epsilon)\
+			+ self.alpha * d2 * q2
 
-			var sortState = {};
+	def fisher_information(self, theta: float) -> float:
+		return float(np.sum(self.observation_fisher_information(theta)))
 
-			function extractNumber(str) {
-				if (!str) return NaN;
-				var cleaned = str.replace(/[^-0-9.]/g, '');
-				var num = parseFloat(cleaned);
-				return num;
-			}
+	def __call__(self, theta: float) -> float:
+		return self.negative_log_likelihood(theta)
 
-			function sortTable(col, type) {
-				var table = document.getElementById("table");
-				var tbody = table.tBodies[0];
-				var rows = Array.from(tbody.rows);
+# LikelihoodModel が従来の negative_log_likelihood と一致するか確認する
+def check_likelihood_model(score_list: List[dict], song_list: List[dict], thetas = None, tolerance: float = 1e-6) -> float:
+	model = LikelihoodModel.from_lists(score_list, song_list)
+	if thetas is None:
+		thetas = np.linspace(-20, 10, 61)
+	max_error = 0.0
+	for theta in thetas:
+		expected = negative_log_likelihood(theta, score_list, song_list)
+		actual = model.negative_log_likelihood(theta)
+		error = abs(expected - actual) / max(1.0, abs(expected))
+		max_error = max(max_error, error)
+		if error > tolerance:
+			raise AssertionError(f"尤度が一致しません theta={theta}: {expected} != {actual}")
+	return max_error
 
-				var dir = 'asc';
-				if (sortState && sortState.col === col && sortState.dir === 'asc') {
-					dir = 'desc';
-				}
-				sortState = { col: col, dir: dir };
-
-				function getSortValue(row) {
-					var val = row.cells[col].getAttribute("data-value");
-					var isEmpty = (val === null || val === undefined || val.trim() === "");
-					if (type === 'number' || type === 'smart-number') {
-						var num;
-						if (isEmpty) {
-							num = NaN;
-						} else if (type === 'smart-number') {
-							num = extractNumber(val);
-						} else {
-							num = parseFloat(val);
-						}
-						if (isNaN(num)) {
-							return dir === 'asc' ? Number.MAX_VALUE : -Number.MAX_VALUE;
-						}
-						return num;
-					} else {
-						if (isEmpty) return dir === 'asc' ? "\uFFFF" : ""; // 文字列のソートで最後尾に行くような文字
-						return val.toLowerCase();
-					}
-				}
+# 譜面表とスコアを 1 度だけ結合した列指向のデータ
+# 行は song_list の順で, 推定・pp・HTML の作成はすべてここから読む
+class ChartFrame:
+	__slots__ = (
+		"title", "sha256", "display_level", "beta_easy", "beta_hard", "alpha",
+		"has_score", "clear", "minbp", "score_rate", "outcome", "index"
+	)
 
-				// ソート実行
-				rows.sort(function(a, b) {
-					var valA = getSortValue(a);
-					var valB = getSortValue(b);
+	def __init__(self, title, sha256, display_level, beta_easy, beta_hard, alpha, has_score, clear, minbp, score_rate, index: Dict[str, int] = None):
+		self.title = title
+		self.sha256 = sha256
+		self.display_level = display_level
+		self.beta_easy = np.asarray(beta_easy, dtype=np.float64)
+		self.beta_hard = np.asarray(beta_hard, dtype=np.float64)
+		self.alpha = np.asarray(alpha, dtype=np.float64)
+		# スコアがなければ clear = 0, minbp = -1, score_rate = NaN
+		self.has_score = np.asarray(has_score, dtype=bool)
+		self.clear = np.asarray(clear, dtype=np.int16)
+		self.minbp = np.asarray(minbp, dtype=np.int64)
+		self.score_rate = np.asarray(score_rate, dtype=np.float64)
+		self.outcome = get_outcome_codes(self.clear)
+		self.index = {sha256: i for i, sha256 in enumerate(self.sha256)} if index is None else index
 
-					if (valA < valB) return dir === 'asc' ? -1 : 1;
-					if (valA > valB) return dir === 'asc' ? 1 : -1;
-					return 0;
-				});
+	def __len__(self) -> int:
+		return len(self.sha256)
 
-				tbody.append(...rows);
-			}
-		</script>
-	</body>
-	</html>
-	"""
-
-	with open(filename_top100, "w", encoding="utf-8") as f:
-		f.write(html_content)
-	print(f"ファイルを作成しました: {filename_top100}")
-	return
+	@classmethod
+	def from_lists(cls, score_list: List[dict], song_list: List[dict]) -> "ChartFrame":
+		has_score, clear, minbp, score_rate = get_score_columns(score_list, [song["sha256"] for song in song_list])
+		beta_easy, beta_hard, alpha = get_chart_parameters(song_list)
+		return cls(
+			[song["title"] for song in song_list],
+			[song["sha256"] for song in song_list],
+			[song["display_level"] for song in song_list],
+			beta_easy,
+			beta_hard,
+			alpha,
+			has_score,
+			clear,
+			minbp,
+			score_rate
+		)
 
-def generate_html_table(
-	score_list: List[dict],
-	song_list: List[dict],
-	mode_slst: str,
-	average_list: List[float],
-	estimated_theta: float,
-	filename_table: str
-):
-	dictLamp = {
-		"FullCombo": 8,
-		"ExHard": 7,
-		"Hard": 6,
-		"Clear": 5,
-		"Easy": 4,
-		"L-Assist": 3,
-		"Assist": 2,
-		"Failed": 1,
-		"No Play": "NaN",
-		"": "NaN"
-	}
+	# コンパイル済み譜面表と, それに行を揃えたスコアの列から作る
+	@classmethod
+	def from_table(cls, table: ChartTable, labels: "ChartLabels", has_score, clear, minbp, score_rate) -> "ChartFrame":
+		return cls(
+			labels.title,
+			labels.sha256,
+			labels.display_level,
+			table.beta_easy,
+			table.beta_hard,
+			table.alpha,
+			has_score,
+			clear,
+			minbp,
+			score_rate,
+			labels.index
+		)
 
-	level_list = set()
-	for song in song_list:
-		#if song["display_level"][:2] != mode_slst:
-		#	continue
-		level = song["display_level"]
-		level_list.add(level)
+	# スコアのある行 (同じ sha256 が複数あるときは最後の行だけ)
+	@property
+	def played(self) -> np.ndarray:
+		played = self.clear >= 1
+		if len(self.index) != len(self.sha256):
+			unique = np.zeros(len(self.sha256), dtype=bool)
+			unique[list(self.index.values())] = True
+			played &= unique
+		return played
 
-	level_list = list(level_list)
-	level_list.sort(key=lambda x:(x[:2],int(x[2:])))
-	
-	tabs = level_list
-	lamp_order = ["No Play", "Failed", "Assist", "L-Assist", "Easy", "Clear", "Hard", "ExHard", "FullCombo"]
-	lamp_filter_html = ""
-	
-	for lamp in lamp_order:
-		safe_lamp = html.escape(lamp)
-		lamp_filter_html += f"""
-			<label class="filter-item">
-				<input type="checkbox" class="lamp-checkbox" value="{dictLamp[safe_lamp]}" checked onchange="applyLampFilter()">
-				{safe_lamp}
-			</label>
-		"""
-	# Prefix Template
-	html_content = f"""
-	<!DOCTYPE html>
-	<html lang="ja">
-	<head>
-		<meta charset="UTF-8">
-		<title>Shobon Stella Recommend</title>
-		<style>
-			body {{ font-family: sans-serif; background-color: #222; color: #eee; padding: 20px; }}
-			
-			.header-container {{
-				display: flex;
-				justify-content: space-between; /* タイトルは左、ボタンは右に配置 */
-				align_items: center;
-				margin-bottom: 20px;
-				border-bottom: 1px solid #444;
-				padding-bottom: 10px;
-			}}
-			.nav-btn {{
-				background-color: #004488;
-				color: white;
-				padding: 10px 20px;
-				text-decoration: none;
-				border-radius: 5px;
-				font-weight: bold;
-				transition: background-color 0.3s;
-				box-shadow: 0 2px 4px rgba(0,0,0,0.3);
-			}}
-			.nav-btn:hover {{
-				background-color: #003366;
-				transform: translateY(-1px);
-			}}			
-
-			/* --- ランプフィルタエリア --- */
-			.filter-container {{
-				background-color: #333; padding: 10px 15px; border-radius: 5px;
-				margin-bottom: 15px; border: 1px solid #444;
-			}}
-			.filter-label {{ font-weight: bold; margin-right: 10px; font-size: 0.9em; color: #aaa; }}
-			.filter-item {{ 
-				display: inline-block; margin-right: 15px; cursor: pointer; user-select: none; font-weight: bold;
-			}}
-			.filter-buttons {{ margin-top: 5px; }}
-			.filter-buttons button {{
-				font-size: 0.8em; padding: 2px 8px; margin-right: 5px; cursor: pointer;
-				background: #555; color: #fff; border: 1px solid #666; border-radius: 3px;
-			}}
-			.filter-buttons button:hover {{ background: #666; }}
-
-			/* タブ部分 */
-			.tab {{ overflow: hidden; border: 1px solid #444; background-color: #333; border-radius: 5px 5px 0 0; }}
-			.tab button {{
-				background-color: inherit; float: left; border: none; outline: none;
-				cursor: pointer; padding: 14px 16px; transition: 0.3s; color: #ccc; font-weight: bold;
-			}}
-			.tab button:hover {{ background-color: #555; }}
-			.tab button.active {{ background-color: #007bff; color: white; }}
-
-			/* タブコンテンツ */
-			.tabcontent {{
-				display: none; padding: 6px 12px; border: 1px solid #444; border-top: none;
-			}}
-			
-			/* テーブル装飾 */
-			table {{ width: 100%; border-collapse: collapse; margin-top: 10px; }}
-			th, td {{ padding: 10px; border-bottom: 1px solid #444; text-align: left; }}
-			th {{ background-color: #333; cursor: pointer; user-select: none; }}
-			th:hover {{ background-color: #555; }}
-			th::after {{ content: ' ⇅'; font-size: 0.8em; color: #888; }}
-			
-			/* ランプの色分け */
-			.lamp-fc {{ color: #55ffff; font-weight: bold; text-shadow: 0 0 5px #55ffff; }}
-			.lamp-exh {{ color: #ffff55; font-weight: bold; text-shadow: 0 0 5px #ffff55; }}
-			.lamp-hard {{ color: #ff5555; font-weight: bold; text-shadow: 0 0 5px #ff5555; }}
-			.lamp-clear {{ color: #ffbb55; font-weight: bold; text-shadow: 0 0 5px #ffbb55; }}
-			.lamp-easy {{ color: #55ff55; font-weight: bold; text-shadow: 0 0 5px #55ff55; }}
-			.lamp-assist {{ color: #ff55ff; font-weight: bold; text-shadow: 0 0 5px #ff55ff; }}
-			.lamp-failed {{ color: #cccccc; }}
-			.lamp-noplay {{ color: #666666; }}
-
-			a{{
-				text-decoration: none;
-				color: #eee;
-			}}
-		</style>
-	</head>
-	<body>
-		<h1>Shobon Stella Recommend</h1>
-		<a href="result_top100.html" class="nav-btn">TOP100 ページへ ➜</a>
-		<h2>あなたの推定実力: <font color="#55ffff">{mode_slst}{beta_to_stella(average_list, estimated_theta):.2f}</font></h2>
-
-		<div class="filter-container">
-			<div style="margin-bottom:5px;">
-				<span class="filter-label">Now Lamp:</span>
-				{lamp_filter_html}
-			</div>
-			<div class="filter-buttons">
-				<button onclick="toggleLampAll(true)">全選択</button>
-				<button onclick="toggleLampAll(false)">全解除</button>
-			</div>
-		</div>
-		<div class="tab">
-	"""
+	def likelihood_model(self) -> LikelihoodModel:
+		played = self.played
+		return LikelihoodModel(self.beta_easy[played], self.beta_hard[played], self.alpha[played], self.outcome[played])
 
-	sha256_dict = dict()
+# スコアを sha256_list の並びの列にする (スコアがなければ clear = 0, minbp = -1, score_rate = NaN)
+def get_score_columns(score_list: List[dict], sha256_list: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+	num = len(sha256_list)
+	has_score = np.zeros(num, dtype=bool)
+	clear = np.zeros(num, dtype=np.int16)
+	minbp = np.full(num, -1, dtype=np.int64)
+	score_rate = np.full(num, np.nan)
+	index = {sha256: i for i, sha256 in enumerate(sha256_list)}
 	for score in score_list:
-		sha256_dict[score["sha256"]] = score
+		i = index.get(score["sha256"])
+		if i is None:
+			continue
+		has_score[i] = True
+		clear[i] = int(score["clear"])
+		minbp[i] = int(score["minbp"])
+		score_rate[i] = float(score["score_rate"])
+	if metrics.enabled:
+		metrics.count("rows_joined", int(has_score.sum()))
+	return has_score, clear, minbp, score_rate
 
-	for i, level in enumerate(tabs):
-		active_class = " active" if i == 0 else ""
-		html_content += f"""
-			<button class="tablinks{active_class}" onclick="openTab(event, 'tab-content-{i}')">{html.escape(level)}</button>
-		"""
+# 譜面表の文字列の列 (スコアによらないので, 同じ表の ChartFrame で共有する)
+class ChartLabels:
+	__slots__ = ("title", "sha256", "display_level", "index")
 
-	html_content += "</div>"
+	def __init__(self, table: ChartTable):
+		self.title = [table.title(i) for i in range(len(table))]
+		self.sha256 = [x.decode("ascii") for x in table.charts["sha256"].tolist()]
+		self.display_level = [x.decode("utf-8") for x in table.charts["display_level"].tolist()]
+		self.index = {sha256: i for i, sha256 in enumerate(self.sha256)}
 
-	for i, level in enumerate(tabs):
-		if level == "ALL":
-			target_song = song_list
-		else:
-			target_song = [c for c in song_list if c["display_level"] == level]
-		
-		display_style = "display: block;" if i == 0 else ""
-		
-		html_content += f"""
-		<div id="tab-content-{i}" class="tabcontent" style="{display_style}">
-			<table id="table-{i}">
-				<thead>
-					<tr>
-						<th onclick="sortTable({i}, 0, 'text')">タイトル</th>
-						<th onclick="sortTable({i}, 1, 'smart-number')">推定(E)</th>
-						<th onclick="sortTable({i}, 2, 'smart-number')">推定(H)</th>
-						<th onclick="sortTable({i}, 3, 'number')">地力度</th>
-						<th onclick="sortTable({i}, 4, 'number')">ランプ</th>
-						<th onclick="sortTable({i}, 5, 'number')">最小BP</th>
-						<th onclick="sortTable({i}, 6, 'smart-number')">スコア</th>
-						<th onclick="sortTable({i}, 7, 'number')">次の目標</th>
-						<th onclick="sortTable({i}, 8, 'smart-number')">達成確率</th>
-					</tr>
-				</thead>
-
-				<tbody>
-		"""
-
-		for song in target_song:
-			#if song["display_level"][:2] != mode_slst:
-			#	continue
-			#level = int(song["display_level"][2:])
-
-			ret_title = song["title"]
-			if len(ret_title) >= 50:
-				ret_title = ret_title[:47]+'...'
-			ret_title = html.escape(ret_title)
-			ret_sha256 = song["sha256"]
-
-			ret_lvec = f"{mode_slst}{beta_to_stella(average_list, float(song['beta_easy'])):.2f}"
-			ret_lvhc = f"{mode_slst}{beta_to_stella(average_list, float(song['beta_hard'])):.2f}"
-
-			ret_jiriki = f"{float(song['alpha'])/2:.2f}"
-			ret_lamp = "No Play"
-			ret_minbp = ""
-			ret_score = ""
-			ret_nextlamp = "Easy"
-			ret_prob = f"{prob_grm(estimated_theta, float(song['beta_easy']), float(song['alpha'])) * 100:.2f} %"
+# 複数の難易度表 (sl_mocha.csv, st_mocha.csv, ...) をまとめて扱う
+# score.db は全部の表の sha256 の和集合で 1 度だけ読み, スコアとの結合も和集合に対して 1 度だけ行う
+# 各表の ChartFrame は和集合の列から添字で取り出すだけ
+class TableRegistry:
+	def __init__(self, tables: List[Tuple[str, str, ChartTable]]):
+		# (表の名前, 難易度の接頭辞, 譜面表)
+		self.tables = tables
+		sha256 = np.concatenate([table.charts["sha256"] for _, _, table in tables])
+		unique, inverse = np.unique(sha256, return_inverse=True)
+		self.sha256 = [x.decode("ascii") for x in unique.tolist()]
+		self.positions = np.split(inverse, np.cumsum([len(table) for _, _, table in tables])[:-1])
+		self.average_lists = {
+			name: get_average_list_from_levels([x.decode("utf-8") for x in table.charts["display_level"].tolist()], table.beta_easy, mode_slst)
+			for name, mode_slst, table in tables
+		}
+		self._labels = None
+		self._frames = None
 
-			if song["sha256"] in sha256_dict:
-				ret_lamp = get_detailed_clear_type(int(sha256_dict[song["sha256"]]["clear"]))
-				ret_minbp = sha256_dict[song["sha256"]]["minbp"]
-				ret_score = f"{float(sha256_dict[song['sha256']]['score_rate'])*100:.2f} %"
-				ret_nextlamp = get_next_clear_type(int(sha256_dict[song["sha256"]]["clear"]))
-				if ret_nextlamp == "Easy":
-					ret_prob = f"{prob_grm(estimated_theta, float(song['beta_easy']), float(song['alpha'])) * 100:.2f} %"
-				elif ret_nextlamp == "Hard":
-					ret_prob = f"{prob_grm(estimated_theta, float(song['beta_hard']), float(song['alpha'])) * 100:.2f} %"
-				else:
-					ret_prob = ""
+	def __len__(self) -> int:
+		return len(self.tables)
 
-			ret_colorclass = ""
-			ret_nextcolorclass = ""
-
-			if ret_lamp == "No Play":
-				ret_colorclass = "lamp-noplay"
-			elif ret_lamp == "Failed":
-				ret_colorclass = "lamp-failed"
-			elif ret_lamp == "Assist":
-				ret_colorclass = "lamp-assist"
-			elif ret_lamp == "L-Assist":
-				ret_colorclass = "lamp-assist"
-			elif ret_lamp == "Easy":
-				ret_colorclass = "lamp-easy"
-			elif ret_lamp == "Clear":
-				ret_colorclass = "lamp-clear"
-			elif ret_lamp == "Hard":
-				ret_colorclass = "lamp-hard"
-			elif ret_lamp == "ExHard":
-				ret_colorclass = "lamp-exh"
-			elif ret_lamp == "FullCombo":
-				ret_colorclass = "lamp-fc"
-
-			if ret_nextlamp == "Easy":
-				ret_nextcolorclass = "lamp-easy"
-			elif ret_nextlamp == "Hard":
-				ret_nextcolorclass = "lamp-hard"
-
-			ret_lampnum = dictLamp[ret_lamp]		
-			ret_nextlampnum = dictLamp[ret_nextlamp]		
-			
-			html_content += f"""
-					<tr class="chart-row">
-						<td data-value="{ret_title}">
-							<a href="https://mocha-repository.info/song.php?sha256={ret_sha256}">{ret_title}</a>
-						</td>
-						<td data-value="{ret_lvec}">
-							{ret_lvec}
-						</td>
-						<td data-value="{ret_lvhc}">
-							{ret_lvhc}
-						</td>
-						<td data-value="{ret_jiriki}">
-							{ret_jiriki}
-						</td>
-						<td data-value="{ret_lampnum}" class="{ret_colorclass}">
-							{ret_lamp}
-						</td>
-						<td data-value="{ret_minbp}">
-							{ret_minbp}
-						</td>
-						<td data-value="{ret_score}">
-							{ret_score}
-						</td>
-						<td data-value="{ret_nextlampnum}">
-							{ret_nextlamp}
-						</td>
-						<td data-value="{ret_prob}">
-							{ret_prob}
-						</td>
-					</tr>
-			"""
-		html_content += "</tbody></table></div>"
-
-	# Suffix Template
-	html_content += """
-		<script>
-			function openTab(evt, tabId) {
-				var i, tabcontent, tablinks;
-				tabcontent = document.getElementsByClassName("tabcontent");
-				for (i = 0; i < tabcontent.length; i++) {
-					tabcontent[i].style.display = "none";
-				}
-				tablinks = document.getElementsByClassName("tablinks");
-				for (i = 0; i < tablinks.length; i++) {
-					tablinks[i].className = tablinks[i].className.replace(" active", "");
-				}
-				document.getElementById(tabId).style.display = "block";
-				evt.currentTarget.className += " active";
-			}
-		
-			function applyLampFilter() {
-				const checkboxes = document.querySelectorAll('.lamp-checkbox');
-				const checkedLamps = Array.from(checkboxes)
-										  .filter(cb => cb.checked)
-										  .map(cb => cb.value);
+	@property
+	def names(self) -> List[str]:
+		return [name for name, _, _ in self.tables]
 
-				const rows = document.querySelectorAll('tr.chart-row');
-				
-				rows.forEach(row => {
-					const lampCell = row.cells[4]; 
-					const lampValue = lampCell.getAttribute('data-value');
-					if (checkedLamps.includes(lampValue)) {
-						row.style.display = ""; 
-					} else {
-						row.style.display = "none"; 
-					}
-				});
-			}
+	@classmethod
+	def load(cls, csv_dirs: List[str]) -> "TableRegistry":
+		tables = []
+		used = dict()
+		for csv_dir in csv_dirs:
+			table = load_chart_table(csv_dir)
+			mode_slst = get_table_prefix(table)
+			# 同じ接頭辞の表が複数あれば名前に連番を付ける
+			name = mode_slst
+			if name in used:
+				used[name] += 1
+				name = f"{name}_{used[name]}"
+			else:
+				used[name] = 0
+			tables.append((name, mode_slst, table))
+		return cls(tables)
 
-			// 全選択/全解除ボタン
-			function toggleLampAll(checked) {
-				const checkboxes = document.querySelectorAll('.lamp-checkbox');
-				checkboxes.forEach(cb => cb.checked = checked);
-				applyLampFilter();
-			}
+	# 表ごとのタイトル, sha256, 難易度の文字列の列 (最初に使うときに 1 度だけ作る)
+	@property
+	def labels(self) -> List["ChartLabels"]:
+		if self._labels is None:
+			self._labels = [ChartLabels(table) for _, _, table in self.tables]
+		return self._labels
 
-			var sortState = {};
+	# score_list を和集合に 1 度だけ結合し, 表ごとの ChartFrame を作る
+	# 直前と同じ score_list なら作った ChartFrame をそのまま返す
+	def frames(self, score_list: List[dict]) -> List[ChartFrame]:
+		if self._frames is not None and self._frames[0] is score_list:
+			return self._frames[1]
+		columns = get_score_columns(score_list, self.sha256)
+		ret = []
+		for (name, mode_slst, table), labels, positions in zip(self.tables, self.labels, self.positions):
+			ret.append(ChartFrame.from_table(table, labels, *[column[positions] for column in columns]))
+		self._frames = (score_list, ret)
+		return ret
 
-			function extractNumber(str) {
-				if (!str) return NaN;
-				var cleaned = str.replace(/[^-0-9.]/g, '');
-				var num = parseFloat(cleaned);
-				return num;
-			}
+# 譜面表の難易度の接頭辞 (sl, st, ...) を一番多いものに決める
+def get_table_prefix(table: ChartTable) -> str:
+	prefixes, counts = np.unique(np.asarray(table.charts["display_level"]).astype("S2"), return_counts=True)
+	return prefixes[np.argmax(counts)].decode("utf-8")
 
-			function sortTable(tableIndex, col, type) {
-				var table = document.getElementById("table-" + tableIndex);
-				var tbody = table.tBodies[0];
-				var rows = Array.from(tbody.rows);
+# clear の配列を Failed / Easy / Hard の符号にする (未プレイは -1)
+def get_outcome_codes(clear: np.ndarray) -> np.ndarray:
+	outcome = np.full(len(clear), -1, dtype=np.int8)
+	outcome[clear >= 1] = OUTCOME_FAILED
+	outcome[clear >= 4] = OUTCOME_EASY
+	outcome[clear >= 6] = OUTCOME_HARD
+	return outcome
 
-				var dir = 'asc';
-				if (sortState[tableIndex] && sortState[tableIndex].col === col && sortState[tableIndex].dir === 'asc') {
-					dir = 'desc';
-				}
-				sortState[tableIndex] = { col: col, dir: dir };
-
-				function getSortValue(row) {
-					var val = row.cells[col].getAttribute("data-value");
-					var isEmpty = (val === null || val === undefined || val.trim() === "");
-					if (type === 'number' || type === 'smart-number') {
-						var num;
-						if (isEmpty) {
-							num = NaN;
-						} else if (type === 'smart-number') {
-							num = extractNumber(val);
-						} else {
-							num = parseFloat(val);
-						}
-						if (isNaN(num)) {
-							return dir === 'asc' ? Number.MAX_VALUE : -Number.MAX_VALUE;
-						}
-						return num;
-					} else {
-						if (isEmpty) return dir === 'asc' ? "\uFFFF" : ""; // 文字列のソートで最後尾に行くような文字
-						return val.toLowerCase();
-					}
-				}
+# 最尤推定の結果
+class ThetaEstimate:
+	def __init__(self, x: float, se: float, success: bool, message: str, nfev: int, nit: int):
+		self.x = x
+		self.se = se
+		self.success = success
+		self.message = message
+		self.nfev = nfev
+		self.nit = nit
+		# ブートストラップの theta の 5 / 50 / 95 パーセンタイル (求めたときだけ)
+		self.interval = None
+		# 実力の推移 (compute_rating_history の結果, 求めたときだけ)
+		self.history = None
 
-				// ソート実行
-				rows.sort(function(a, b) {
-					var valA = getSortValue(a);
-					var valB = getSortValue(b);
+	def __repr__(self) -> str:
+		return f"ThetaEstimate(x={self.x}, se={self.se}, success={self.success}, nfev={self.nfev}, nit={self.nit})"
 
-					if (valA < valB) return dir === 'asc' ? -1 : 1;
-					if (valA > valB) return dir === 'asc' ? 1 : -1;
-					return 0;
-				});
+# 解析的な微分を使った safeguarded Newton 法で theta を求める
+# 対数尤度は theta について凹なので, 1 階微分の符号で解を挟み込んでから Newton 法 (はみ出したら二分法) を回す
+def solve_theta(
+	model: LikelihoodModel,
+	theta0: float = None,
+	bounds: Tuple[float, float] = (-20, 10),
+	xtol: float = 1e-8,
+	max_iter: int = 100
+) -> ThetaEstimate:
+	lower, upper = bounds
+	# プレイデータがなければ尤度は一定なので, 従来の Brent 法と同じ値 (ほぼ上限) を推定値にする
+	if len(model) == 0:
+		result = minimize_bounded(model.negative_log_likelihood, bounds)
+		result.se = float("inf")
+		result.message = "プレイデータがありません"
+		return result
+	if theta0 is None:
+		theta0 = float(np.mean(model.beta_easy))
+	theta = min(max(float(theta0), lower), upper)
 
-				tbody.append(...rows);
-			}
-		</script>
-	</body>
-	</html>
-	"""
-
-	with open(filename_table, "w", encoding="utf-8") as f:
-		f.write(html_content)
-	print(f"ファイルを作成しました: {filename_table}")
-	return
+	nfev = 0
+	def evaluate(t):
+		nonlocal nfev
+		nfev += 1
+		return model.derivatives(t)
 
+	# 解を挟む区間 [lo, hi] を広げながら探す
+	# 最初の幅は Newton の 1 歩の 2 倍 (最大 1) にして, warm start のときは解のすぐ先で挟めるようにする
+	gradient, hessian = evaluate(theta)
+	lo, hi = theta, theta
+	step = 1.0
+	if hessian < 0:
+		step = min(step, max(2 * abs(gradient / hessian), xtol))
+	if gradient > 0:
+		while gradient > 0 and hi < upper:
+			lo = hi
+			hi = min(hi + step, upper)
+			step *= 2
+			gradient, hessian = evaluate(hi)
+		theta = hi
+		if gradient > 0:
+			return ThetaEstimate(upper, 1.0 / np.sqrt(max(model.fisher_information(upper), 1e-300)), True, "上限に到達しました", nfev, 0)
+	elif gradient < 0:
+		while gradient < 0 and lo > lower:
+			hi = lo
+			lo = max(lo - step, lower)
+			step *= 2
+			gradient, hessian = evaluate(lo)
+		theta = lo
+		if gradient < 0:
+			return ThetaEstimate(lower, 1.0 / np.sqrt(max(model.fisher_information(lower), 1e-300)), True, "下限に到達しました", nfev, 0)
 
-def generate_html(
-	score_list: List[dict],
-	song_list: List[dict],
-	mode_slst: str,
-	filename_table = "result_table.html",
-	filename_top100 = "result_top100.html"
-):
+	success = False
+	nit = 0
+	for nit in range(1, max_iter + 1):
+		if gradient == 0:
+			success = True
+			break
+		if gradient > 0:
+			lo = theta
+		else:
+			hi = theta
+		if hessian < 0:
+			new_theta = theta - gradient / hessian
+		else:
+			new_theta = (lo + hi) / 2
+		# 解のすぐ隣では Newton の 1 歩が丸めで区間の端に重なるので, 二分法に戻す前に収束を確かめる
+		if not (lo < new_theta < hi) and not abs(new_theta - theta) < xtol:
+			new_theta = (lo + hi) / 2
+		if abs(new_theta - theta) < xtol or hi - lo < xtol:
+			theta = new_theta
+			success = True
+			break
+		theta = new_theta
+		gradient, hessian = evaluate(theta)
 
-	average_list = get_average_list(song_list, mode_slst)
+	information = model.fisher_information(theta)
+	se = 1.0 / np.sqrt(information) if information > 0 else float("inf")
+	message = "収束しました" if success else "最大反復回数に到達しました"
+	metrics.count("solver_iterations", nit)
+	return ThetaEstimate(theta, se, success, message, nfev, nit)
 
-	result = max_likelihood_estimation(score_list, song_list)
-	if not result.success:
-		raise RuntimeError(f"最尤推定に失敗しました. {result.message}")
+# ChartFrame から最尤推定
+def estimate_theta(frame: ChartFrame, theta0: float = None) -> ThetaEstimate:
+	return solve_theta(frame.likelihood_model(), theta0)
 
-	estimated_theta = result.x
-	print(f"Estimated: {mode_slst}{beta_to_stella(average_list, estimated_theta):.2f}")
+# 最尤推定 (theta0 があればそこから warm start する)
+def max_likelihood_estimation(score_list: List[dict], song_list: List[dict], theta0: float = None, method: str = "newton") -> ThetaEstimate:
+	model = LikelihoodModel.from_lists(score_list, song_list)
+	if method == "bounded":
+		# 従来の minimize_scalar(method='bounded') と同じ Brent 法による推定
+		result = minimize_bounded(
+			model.negative_log_likelihood,
+			bounds = (-20, 10) # この範囲に解があると仮定
+		)
+		result.se = 1.0 / np.sqrt(max(model.fisher_information(result.x), 1e-300))
+		return result
+	return solve_theta(model, theta0)
 
-	generate_html_table(score_list, song_list, mode_slst, average_list, estimated_theta, filename_table)
-	generate_html_top100(score_list, song_list, mode_slst, average_list, estimated_theta, filename_top100)
+# 有界区間での 1 変数関数の最小化 (黄金分割 + 放物線補間の Brent 法)
+# scipy.optimize.minimize_scalar(method='bounded') と同じ手順なので, 同じ点で評価して同じ解を返す
+# scipy を読み込まずに済むので起動が速く, PyInstaller の exe から scipy を外せる
+def minimize_bounded(func: Callable[[float], float], bounds: Tuple[float, float], xatol: float = 1e-5, max_iter: int = 500) -> ThetaEstimate:
+	a, b = bounds
+	sqrt_eps = math.sqrt(2.2e-16)
+	golden_mean = 0.5 * (3.0 - math.sqrt(5.0))
+	fulc = a + golden_mean * (b - a)
+	nfc, xf = fulc, fulc
+	rat = e = 0.0
+	x = xf
+	fx = func(x)
+	num = 1
+	ffulc = fnfc = fx
+	xm = 0.5 * (a + b)
+	tol1 = sqrt_eps * abs(xf) + xatol / 3.0
+	tol2 = 2.0 * tol1
+	success = True
 
-class BMSApp:
-	def __init__(self, root):
-		self.root = root
-		self.root.title("Shobon Stella Recommend v1.1")
-		self.root.geometry("600x450")
-		self.config_file = "config.json"
+	while abs(xf - xm) > tol2 - 0.5 * (b - a):
+		golden = True
+		# 放物線補間が使えるか調べる
+		if abs(e) > tol1:
+			golden = False
+			r = (xf - nfc) * (fx - ffulc)
+			q = (xf - fulc) * (fx - fnfc)
+			p = (xf - fulc) * q - (xf - nfc) * r
+			q = 2.0 * (q - r)
+			if q > 0.0:
+				p = -p
+			q = abs(q)
+			r = e
+			e = rat
+			if abs(p) < abs(0.5 * q * r) and p > q * (a - xf) and p < q * (b - xf):
+				rat = p / q
+				x = xf + rat
+				if x - a < tol2 or b - x < tol2:
+					rat = tol1 if xm - xf >= 0 else -tol1
+			else:
+				golden = True
+		if golden:
+			e = a - xf if xf >= xm else b - xf
+			rat = golden_mean * e
 
-		# --- DB選択 ---
-		tk.Label(root, text="1. score.db:").pack(anchor="w", padx=10, pady=(10, 0))
-		self.frame_db = tk.Frame(root)
-		self.frame_db.pack(fill="x", padx=10)
-		self.entry_db = tk.Entry(self.frame_db)
-		self.entry_db.pack(side="left", fill="x", expand=True)
-		tk.Button(self.frame_db, text="Browse", command=self.browse_db).pack(side="right", padx=5)
-		
-		# --- CSV選択 ---
-		tk.Label(root, text="2. sl_mocha.csv:").pack(anchor="w", padx=10, pady=(10, 0))
-		tk.Label(root, text="このソフトの data フォルダの中に入っています", font=("", 8), fg="gray").pack(anchor="w", padx=10)
-		self.frame_csv = tk.Frame(root)
-		self.frame_csv.pack(fill="x", padx=10)
-		self.entry_csv = tk.Entry(self.frame_csv)
-		self.entry_csv.pack(side="left", fill="x", expand=True)
-		tk.Button(self.frame_csv, text="Browse", command=self.browse_csv).pack(side="right", padx=5)
+		x = xf + (1.0 if rat >= 0 else -1.0) * max(abs(rat), tol1)
+		fu = func(x)
+		num += 1
 
-		tk.Button(root, text="実行", command=self.run_process, bg="#ddddff", height=2).pack(pady=20, fill="x", padx=50)
-		
-		# --- ログ出力エリア ---
-		tk.Label(root, text="Log:").pack(anchor="w", padx=10)
-		self.log_area = scrolledtext.ScrolledText(root, height=10)
-		self.log_area.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+		if fu <= fx:
+			if x >= xf:
+				a = xf
+			else:
+				b = xf
+			fulc, ffulc = nfc, fnfc
+			nfc, fnfc = xf, fx
+			xf, fx = x, fu
+		else:
+			if x < xf:
+				a = x
+			else:
+				b = x
+			if fu <= fnfc or nfc == xf:
+				fulc, ffulc = nfc, fnfc
+				nfc, fnfc = x, fu
+			elif fu <= ffulc or fulc == xf or fulc == nfc:
+				fulc, ffulc = x, fu
 
-		self.load_config()
+		xm = 0.5 * (a + b)
+		tol1 = sqrt_eps * abs(xf) + xatol / 3.0
+		tol2 = 2.0 * tol1
+		if num >= max_iter:
+			success = False
+			break
 
-	def log(self, message):
-		self.log_area.insert(tk.END, message + "\n")
-		self.log_area.see(tk.END)
-		self.root.update()
+	message = "Solution found." if success else "Maximum number of function calls reached."
+	metrics.count("solver_iterations", num)
+	return ThetaEstimate(float(xf), float("nan"), success, message, num, num)
 
-	def load_config(self):
-		if os.path.exists(self.config_file):
-			try:
-				with open(self.config_file, "r", encoding="utf-8") as f:
-					config = json.load(f)
-					db_path = config.get("db_path", "")
-					csv_path = config.get("csv_path", "")
-					if db_path: self.entry_db.insert(0, db_path)
-					if csv_path: self.entry_csv.insert(0, csv_path)
+# 譜面リストの beta_easy / beta_hard / alpha を song_list と同じ順の配列にする
+def get_chart_parameters(song_list: List[dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+	# ChartTable / LikelihoodModel / (beta_easy, beta_hard, alpha) の組もそのまま受け取る
+	if isinstance(song_list, ChartTable):
+		return np.array(song_list.beta_easy), np.array(song_list.beta_hard), np.array(song_list.alpha)
+	if isinstance(song_list, LikelihoodModel):
+		return song_list.beta_easy, song_list.beta_hard, song_list.alpha
+	if isinstance(song_list, tuple):
+		return song_list
+	beta_easy = np.array([float(song["beta_easy"]) for song in song_list], dtype=np.float64)
+	beta_hard = np.array([float(song["beta_hard"]) for song in song_list], dtype=np.float64)
+	alpha = np.array([float(song["alpha"]) for song in song_list], dtype=np.float64)
+	return beta_easy, beta_hard, alpha
+
+# プレイヤー × 譜面 のクリア状況 (CSR 形式の疎行列, 未プレイの譜面は持たない)
+# 行 i のデータは chart_index[indptr[i]:indptr[i+1]], outcome[indptr[i]:indptr[i+1]]
+class OutcomeMatrix:
+	def __init__(self, indptr, chart_index, outcome, num_charts: int):
+		self.indptr = np.asarray(indptr, dtype=np.int64)
+		self.chart_index = np.asarray(chart_index, dtype=np.int64)
+		self.outcome = np.asarray(outcome, dtype=np.int8)
+		self.num_charts = num_charts
+
+	@property
+	def num_players(self) -> int:
+		return len(self.indptr) - 1
+
+	# 各データが何行目のプレイヤーのものか
+	@property
+	def row_index(self) -> np.ndarray:
+		return np.repeat(np.arange(self.num_players), np.diff(self.indptr))
+
+	# 各プレイヤーの score_list と song_list から作る (列は song_list の順)
+	@classmethod
+	def from_score_lists(cls, score_lists: List[List[dict]], song_list: List[dict]) -> "OutcomeMatrix":
+		index_dict = dict()
+		for i, song in enumerate(song_list):
+			index_dict[song["sha256"]] = i
+		outcome_code = {"Failed": OUTCOME_FAILED, "Easy": OUTCOME_EASY, "Hard": OUTCOME_HARD}
+		indptr = [0]
+		chart_index = []
+		outcome = []
+		for score_list in score_lists:
+			for score in score_list:
+				clear_result = get_clear_type(int(score["clear"]))
+				if clear_result == "No Play":
+					continue
+				if score["sha256"] not in index_dict:
+					continue
+				chart_index.append(index_dict[score["sha256"]])
+				outcome.append(outcome_code[clear_result])
+			indptr.append(len(chart_index))
+		return cls(indptr, chart_index, outcome, len(song_list))
+
+	# 全データを 1 つの LikelihoodModel にまとめる
+	def likelihood_model(self, beta_easy: np.ndarray, beta_hard: np.ndarray, alpha: np.ndarray) -> LikelihoodModel:
+		return LikelihoodModel(
+			beta_easy[self.chart_index],
+			beta_hard[self.chart_index],
+			alpha[self.chart_index],
+			self.outcome
+		)
+
+# 全プレイヤーの theta をまとめて推定する
+# 各行で [下限, 上限] の挟み込みを保ちながら Newton 法 (はみ出したら二分法) を全行同時に回す
+def estimate_theta_matrix(
+	matrix: OutcomeMatrix,
+	song_list: List[dict],
+	theta0 = None,
+	bounds: Tuple[float, float] = (-20, 10),
+	xtol: float = 1e-8,
+	max_iter: int = 100
+) -> ThetaEstimate:
+	lower, upper = bounds
+	num_players = matrix.num_players
+	beta_easy, beta_hard, alpha = get_chart_parameters(song_list)
+	model = matrix.likelihood_model(beta_easy, beta_hard, alpha)
+	row = matrix.row_index
+	counts = np.diff(matrix.indptr)
+	has_data = counts > 0
+
+	if theta0 is None:
+		sum_beta = np.bincount(row, weights=model.beta_easy, minlength=num_players)
+		theta = np.where(has_data, sum_beta / np.maximum(counts, 1), 0.0)
+	else:
+		theta = np.broadcast_to(np.asarray(theta0, dtype=np.float64), (num_players,)).copy()
+	theta = np.clip(theta, lower, upper)
+	lo = np.full(num_players, float(lower))
+	hi = np.full(num_players, float(upper))
+	active = has_data.copy()
+
+	# 全部 Failed や全部 Hard のように区間の中に解がない人は, solve_theta と同じく端の値にする
+	gradient_lower = np.bincount(row, weights=model.observation_derivatives(np.full(len(row), float(lower)))[0], minlength=num_players)
+	gradient_upper = np.bincount(row, weights=model.observation_derivatives(np.full(len(row), float(upper)))[0], minlength=num_players)
+	at_lower = active & (gradient_lower <= 0)
+	at_upper = active & ~at_lower & (gradient_upper >= 0)
+	theta = np.where(at_lower, float(lower), np.where(at_upper, float(upper), theta))
+	active &= ~(at_lower | at_upper)
+
+	nit = 0
+	for nit in range(1, max_iter + 1):
+		if not active.any():
+			break
+		gradient, hessian = model.observation_derivatives(theta[row])
+		gradient = np.bincount(row, weights=gradient, minlength=num_players)
+		hessian = np.bincount(row, weights=hessian, minlength=num_players)
+
+		lo = np.where(active & (gradient > 0), theta, lo)
+		hi = np.where(active & (gradient < 0), theta, hi)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			new_theta = np.where(hessian < 0, theta - gradient / hessian, (lo + hi) / 2)
+		# 解のすぐ隣では Newton の 1 歩が丸めで区間の端に重なるので, 二分法に戻す前に収束を確かめる
+		outside = ~((lo < new_theta) & (new_theta < hi)) & ~(np.abs(new_theta - theta) < xtol)
+		new_theta = np.where(outside, (lo + hi) / 2, new_theta)
+		new_theta = np.where(gradient == 0, theta, new_theta)
+
+		converged = (np.abs(new_theta - theta) < xtol) | (hi - lo < xtol)
+		theta = np.where(active, new_theta, theta)
+		active &= ~converged
+
+	information = np.bincount(row, weights=model.observation_fisher_information(theta[row]), minlength=num_players)
+	with np.errstate(divide='ignore'):
+		se = np.where(information > 0, 1.0 / np.sqrt(information), np.inf)
+	theta = np.where(has_data, theta, np.nan)
+	success = has_data & ~active
+	message = "収束しました" if success.all() else f"{int((~success).sum())} 人の推定に失敗しました"
+	metrics.count("solver_iterations", nit)
+	return ThetaEstimate(theta, se, success, message, nit, nit)
+
+# ブートストラップの設定 (replicates 回の復元抽出を block_size 回ずつまとめて解く)
+class BootstrapOptions:
+	def __init__(self, replicates: int = 1000, seed: int = 0, workers: int = 1, block_size: int = 250):
+		self.replicates = replicates
+		self.seed = seed
+		self.workers = workers
+		self.block_size = block_size
+
+# プレイした譜面を復元抽出したデータ replicates 組の theta をまとめて推定する
+# 各組を OutcomeMatrix の 1 行にして estimate_theta_matrix で全行同時に解く
+def bootstrap_theta_block(model: LikelihoodModel, replicates: int, seed, theta0: float = None) -> np.ndarray:
+	rng = np.random.default_rng(seed)
+	n = len(model)
+	sample = rng.integers(0, n, size=(replicates, n))
+	matrix = OutcomeMatrix(np.arange(0, replicates * n + 1, n), sample.ravel(), model.outcome[sample.ravel()], n)
+	return estimate_theta_matrix(matrix, model, theta0).x
+
+# ブートストラップで theta の分布を求める (replicates 個の theta を返す)
+# ブロックごとの乱数は seed から SeedSequence で分けるので, workers の数によらず同じ結果になる
+# workers > 1 ならブロックをプロセスプールで分けて解く
+def bootstrap_theta(model: LikelihoodModel, options: BootstrapOptions, theta0: float = None) -> np.ndarray:
+	if len(model) == 0 or options.replicates <= 0:
+		return np.empty(0)
+	sizes = [options.block_size] * (options.replicates // options.block_size)
+	if options.replicates % options.block_size:
+		sizes.append(options.replicates % options.block_size)
+	seeds = np.random.SeedSequence(options.seed).spawn(len(sizes))
+	if (options.workers is not None and options.workers <= 1) or len(sizes) == 1:
+		blocks = [bootstrap_theta_block(model, size, seed, theta0) for size, seed in zip(sizes, seeds)]
+	else:
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(max_workers = options.workers) as executor:
+			blocks = list(executor.map(bootstrap_theta_block, [model] * len(sizes), sizes, seeds, [theta0] * len(sizes)))
+	metrics.count("bootstrap_replicates", options.replicates)
+	return np.concatenate(blocks)
+
+# ブートストラップの theta の 5 / 50 / 95 パーセンタイル
+def bootstrap_interval(model: LikelihoodModel, options: BootstrapOptions, theta0: float = None) -> List[float]:
+	thetas = bootstrap_theta(model, options, theta0)
+	if len(thetas) == 0:
+		return None
+	return np.percentile(thetas, [5, 50, 95]).tolist()
+
+# 譜面パラメータの較正の設定
+# 譜面の更新は (beta_easy, log(beta_hard - beta_easy), log alpha) で行うので beta_easy < beta_hard と alpha > 0 は常に保たれる
+# 事前分布は元の表の値を中心にした標準偏差 prior_sd の正規分布 (遊んだ人が少ない譜面を元の値に寄せる)
+class CalibrationOptions:
+	def __init__(
+		self,
+		max_iter: int = 50,
+		tol: float = 1e-3,
+		min_players: int = 5,
+		chart_steps: int = 2,
+		prior_sd: float = 0.5,
+		workers: int = 1,
+		block_size: int = 1000
+	):
+		self.max_iter = max_iter
+		self.tol = tol
+		self.min_players = min_players
+		self.chart_steps = chart_steps
+		self.prior_sd = prior_sd
+		self.workers = workers
+		self.block_size = block_size
+
+# 較正の結果 (譜面のパラメータは元の表と同じ順, theta は OutcomeMatrix の行の順)
+class CalibrationResult:
+	def __init__(self, beta_easy, beta_hard, alpha, theta, num_players, fitted, nit: int, success: bool, history: List[float]):
+		self.beta_easy = beta_easy
+		self.beta_hard = beta_hard
+		self.alpha = alpha
+		self.theta = theta
+		# 譜面ごとの較正に使ったプレイヤー数と, 較正したか (min_players 人未満なら元の値のまま)
+		self.num_players = num_players
+		self.fitted = fitted
+		self.nit = nit
+		self.success = success
+		# 反復ごとの beta の最大変化量
+		self.history = history
+
+	def __repr__(self) -> str:
+		return f"CalibrationResult(fitted={int(self.fitted.sum())}/{len(self.fitted)}, nit={self.nit}, success={self.success})"
+
+# 較正の下限 / 上限 (beta_hard - beta_easy は get_song_list が警告しない 0.01 以上にする)
+CALIBRATION_LOG_GAP_MIN = math.log(0.01)
+CALIBRATION_LOG_ALPHA_RANGE = (math.log(0.1), math.log(50.0))
+
+# (beta_easy, beta_hard, alpha) と較正用の変数 (beta_easy, log(beta_hard - beta_easy), log alpha) の変換
+def to_calibration_params(beta_easy, beta_hard, alpha) -> np.ndarray:
+	gap = np.maximum(np.asarray(beta_hard) - np.asarray(beta_easy), 0.01)
+	return np.column_stack([beta_easy, np.log(gap), np.log(alpha)]).astype(np.float64)
+
+def from_calibration_params(params: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+	return params[:, 0], params[:, 0] + np.exp(params[:, 1]), np.exp(params[:, 2])
+
+# theta を固定して, 譜面ごとに事後最頻値へ Fisher scoring で steps 歩進める
+# 観測は (theta, 譜面の番号 chart, 結果 outcome) で, chart は 0..len(params)-1
+# 1 観測の Fisher 情報量は Failed / Easy / Hard の確率の勾配 g から sum_k g_k g_k^T / P_k で, 譜面ごとに bincount で足し合わせる
+def calibrate_chart_block(theta: np.ndarray, chart: np.ndarray, outcome: np.ndarray, params: np.ndarray, prior_mean: np.ndarray, prior_sd: float, steps: int) -> np.ndarray:
+	epsilon = 1e-300
+	num = len(params)
+	params = params.copy()
+	precision = 1.0 / prior_sd ** 2
+	failed = (outcome == OUTCOME_FAILED).astype(np.float64)
+	easy = (outcome == OUTCOME_EASY).astype(np.float64)
+	hard = (outcome == OUTCOME_HARD).astype(np.float64)
+
+	def total(values):
+		return np.bincount(chart, weights=values, minlength=num)
+
+	for _ in range(steps):
+		beta_easy, beta_hard, alpha = from_calibration_params(params)
+		a = alpha[chart]
+		u1 = theta - beta_easy[chart]
+		u2 = theta - beta_hard[chart]
+		x1 = a * u1
+		x2 = a * u2
+		with np.errstate(over='ignore'):
+			p1 = 1.0 / (1.0 + np.exp(- x1))
+			q1 = 1.0 / (1.0 + np.exp(x1))
+			p2 = 1.0 / (1.0 + np.exp(- x2))
+			q2 = 1.0 / (1.0 + np.exp(x2))
+		w1 = p1 * q1
+		w2 = p2 * q2
+		# p1 - p2 は大きい側では q2 - q1 で計算する
+		p_easy = np.maximum(np.where(x1 < 0, p1 - p2, q2 - q1), epsilon)
+		d_alpha = (u1 * w1 - u2 * w2) / p_easy
+
+		# (beta_easy, beta_hard, alpha) についての対数尤度の勾配
+		gradient = np.stack([
+			total(a * (failed * p1 - easy * w1 / p_easy)),
+			total(a * (easy * w2 / p_easy - hard * q2)),
+			total(easy * d_alpha - failed * u1 * p1 + hard * u2 * q2),
+		], axis=1)
+		information = np.empty((num, 3, 3))
+		information[:, 0, 0] = total(a * a * (w1 * p1 + w1 * w1 / p_easy))
+		information[:, 1, 1] = total(a * a * (w2 * q2 + w2 * w2 / p_easy))
+		information[:, 2, 2] = total(u1 * u1 * w1 * p1 + u2 * u2 * w2 * q2 + d_alpha * (u1 * w1 - u2 * w2))
+		information[:, 0, 1] = information[:, 1, 0] = total(- a * a * w1 * w2 / p_easy)
+		information[:, 0, 2] = information[:, 2, 0] = total(- a * (u1 * w1 * p1 + w1 * d_alpha))
+		information[:, 1, 2] = information[:, 2, 1] = total(a * (w2 * d_alpha - u2 * w2 * q2))
+
+		# 較正用の変数に変換する (J = d(beta_easy, beta_hard, alpha) / d(変数) の転置)
+		jacobian = np.zeros((num, 3, 3))
+		jacobian[:, 0, 0] = 1.0
+		jacobian[:, 0, 1] = 1.0
+		jacobian[:, 1, 1] = beta_hard - beta_easy
+		jacobian[:, 2, 2] = alpha
+		gradient = np.einsum("nij,nj->ni", jacobian, gradient) - precision * (params - prior_mean)
+		information = np.einsum("nij,njk,nlk->nil", jacobian, information, jacobian) + precision * np.eye(3)
+
+		step = np.linalg.solve(information, gradient[:, :, None])[:, :, 0]
+		# 1 歩は各変数 1 まで (theta がまだ粗い最初の反復で飛びすぎないようにする)
+		step /= np.maximum(np.abs(step).max(axis=1, keepdims=True), 1.0)
+		params += step
+		params[:, 1] = np.maximum(params[:, 1], CALIBRATION_LOG_GAP_MIN)
+		params[:, 2] = np.clip(params[:, 2], *CALIBRATION_LOG_ALPHA_RANGE)
+	return params
+
+# 較正のワーカーで共有する観測 (プレイヤー順の CSR と譜面順の CSC)
+# 親プロセスで 1 度だけ渡し, 反復ごとには theta と譜面のパラメータだけを送る
+_calibration_data = None
+
+def _init_calibration_worker(matrix: OutcomeMatrix, chart_indptr: np.ndarray, chart_player: np.ndarray, chart_outcome: np.ndarray):
+	global _calibration_data
+	_calibration_data = (matrix, chart_indptr, chart_player, chart_outcome)
+
+# 譜面 [start, end) のパラメータを更新する (使えるプレイヤーは usable が True の人だけ)
+def _calibrate_chart_range(start: int, end: int, theta: np.ndarray, usable: np.ndarray, params: np.ndarray, prior_mean: np.ndarray, prior_sd: float, steps: int) -> np.ndarray:
+	_, chart_indptr, chart_player, chart_outcome = _calibration_data
+	begin, stop = chart_indptr[start], chart_indptr[end]
+	player = chart_player[begin:stop]
+	chart = np.repeat(np.arange(end - start), np.diff(chart_indptr[start:end + 1]))
+	keep = usable[player]
+	return calibrate_chart_block(theta[player[keep]], chart[keep], chart_outcome[begin:stop][keep], params, prior_mean, prior_sd, steps)
+
+# プレイヤー [start, end) の theta を譜面のパラメータを固定して推定する
+def _estimate_theta_range(start: int, end: int, beta_easy: np.ndarray, beta_hard: np.ndarray, alpha: np.ndarray, theta0: np.ndarray) -> np.ndarray:
+	matrix = _calibration_data[0]
+	indptr = matrix.indptr[start:end + 1]
+	begin, stop = indptr[0], indptr[-1]
+	rows = OutcomeMatrix(indptr - begin, matrix.chart_index[begin:stop], matrix.outcome[begin:stop], matrix.num_charts)
+	return estimate_theta_matrix(rows, (beta_easy, beta_hard, alpha), theta0, xtol = 1e-6).x
+
+# 範囲 [0, num) を size ずつに分ける
+def split_ranges(num: int, size: int) -> List[Tuple[int, int]]:
+	return [(start, min(start + size, num)) for start in range(0, num, size)]
+
+# プレイヤー × 譜面のランプから, プレイヤーの theta と譜面の (beta_easy, beta_hard, alpha) を交互に推定する
+#   1. 譜面を固定して全員の theta を estimate_theta_matrix で解く (前回の theta から warm start)
+#   2. theta を固定して譜面ごとに Fisher scoring で chart_steps 歩進める
+#   3. theta と beta の原点・尺度は決まらないので, 較正した譜面の beta_easy と log alpha の平均を元の表に合わせる
+#      (alpha (theta - beta) は変わらず, 元の表の sl/st の平均値もそのまま使える)
+# 全部 Failed や全部 Hard で theta が区間の端になった人は譜面の更新に使わない
+# workers > 1 なら譜面とプレイヤーのブロックをプロセスプールで分けて解く
+def calibrate_chart_parameters(matrix: OutcomeMatrix, song_list, options: CalibrationOptions = None, bounds: Tuple[float, float] = (-20, 10)) -> CalibrationResult:
+	if options is None:
+		options = CalibrationOptions()
+	lower, upper = bounds
+	beta_easy, beta_hard, alpha = get_chart_parameters(song_list)
+	prior_mean = to_calibration_params(beta_easy, beta_hard, alpha)
+	params = prior_mean.copy()
+	num_charts = matrix.num_charts
+
+	# 譜面順に並べ替えた観測
+	order = np.argsort(matrix.chart_index, kind="stable")
+	chart_player = matrix.row_index[order]
+	chart_outcome = matrix.outcome[order]
+	num_players = np.bincount(matrix.chart_index, minlength=num_charts)
+	chart_indptr = np.concatenate([[0], np.cumsum(num_players)])
+	fitted = num_players >= options.min_players
+	chart_blocks = [(start, end) for start, end in split_ranges(num_charts, options.block_size) if fitted[start:end].any()]
+	player_blocks = split_ranges(matrix.num_players, max(options.block_size, 1))
+	data = (matrix, chart_indptr, chart_player, chart_outcome)
+
+	executor = None
+	if options.workers is not None and options.workers > 1:
+		from concurrent.futures import ProcessPoolExecutor
+		executor = ProcessPoolExecutor(max_workers = options.workers, initializer = _init_calibration_worker, initargs = data)
+		run = executor.map
+	else:
+		_init_calibration_worker(*data)
+		run = map
+
+	theta = None
+	history = []
+	success = False
+	nit = 0
+	try:
+		for nit in range(1, options.max_iter + 1):
+			beta_easy, beta_hard, alpha = from_calibration_params(params)
+			theta0 = [None] * len(player_blocks) if theta is None else [theta[start:end] for start, end in player_blocks]
+			theta = np.concatenate(list(run(
+				_estimate_theta_range,
+				[start for start, _ in player_blocks], [end for _, end in player_blocks],
+				*[[x] * len(player_blocks) for x in (beta_easy, beta_hard, alpha)],
+				theta0
+			)))
+			usable = np.isfinite(theta) & (theta > lower) & (theta < upper)
+
+			new_params = params.copy()
+			blocks = list(run(
+				_calibrate_chart_range,
+				[start for start, _ in chart_blocks], [end for _, end in chart_blocks],
+				[theta] * len(chart_blocks), [usable] * len(chart_blocks),
+				[params[start:end] for start, end in chart_blocks], [prior_mean[start:end] for start, end in chart_blocks],
+				[options.prior_sd] * len(chart_blocks), [options.chart_steps] * len(chart_blocks)
+			))
+			for (start, end), block in zip(chart_blocks, blocks):
+				new_params[start:end] = np.where(fitted[start:end, None], block, params[start:end])
+
+			# 原点と尺度を元の表に合わせる (beta' = scale beta + shift, alpha' = alpha / scale, theta' = scale theta + shift)
+			if fitted.any():
+				spread = float(np.std(new_params[fitted, 0]))
+				scale = float(np.std(prior_mean[fitted, 0])) / spread if spread > 0 else 1.0
+				log_scale = math.log(scale)
+				shift = float(np.mean(prior_mean[fitted, 0]) - scale * np.mean(new_params[fitted, 0]))
+				new_params[fitted, 0] = scale * new_params[fitted, 0] + shift
+				new_params[fitted, 1] += log_scale
+				new_params[fitted, 2] -= log_scale
+				theta = np.where(usable, scale * theta + shift, theta)
+
+			old = from_calibration_params(params)
+			new = from_calibration_params(new_params)
+			change = max([float(np.max(np.abs(x[fitted] - y[fitted]), initial=0.0)) for x, y in zip(old[:2], new[:2])])
+			params = new_params
+			history.append(change)
+			metrics.count("calibration_iterations")
+			if change < options.tol:
+				success = True
+				break
+	finally:
+		if executor is not None:
+			executor.shutdown()
+
+	beta_easy, beta_hard, alpha = from_calibration_params(params)
+	return CalibrationResult(beta_easy, beta_hard, alpha, theta, num_players, fitted, nit, success, history)
+
+# theta の標準誤差を sl 単位に換算する
+def stella_error(average_list: List[float], theta: float, se: float) -> float:
+	return (beta_to_stella(average_list, theta + se) - beta_to_stella(average_list, theta - se)) / 2
+
+# 減衰率 decay で重み付けした上位 n 件の重み (1, decay, decay^2, ...)
+_decay_weights_cache = dict()
+
+def get_decay_weights(n: int, decay: float) -> np.ndarray:
+	key = (n, decay)
+	if key not in _decay_weights_cache:
+		_decay_weights_cache[key] = decay ** np.arange(n, dtype=np.float64)
+	return _decay_weights_cache[key]
+
+# クリア済み譜面の pp を 1 度だけ計算し, 任意の件数・減衰率で上位を取り出す
+class PPRanking:
+	def __init__(self, frame: ChartFrame, level_mapper: LevelMapper):
+		self.frame = frame
+		self.is_hard = frame.outcome == OUTCOME_HARD
+		self.beta = np.where(self.is_hard, frame.beta_hard, frame.beta_easy)
+		# Easy 以上の譜面だけが pp の対象
+		self.candidates = np.flatnonzero(frame.played & (frame.outcome >= OUTCOME_EASY))
+		self.pp = np.full(len(frame), np.nan)
+		self.pp[self.candidates] = (level_mapper.to_stella(self.beta[self.candidates]) + 2) * 40
+
+	# pp の大きい順に上位 n 件の行番号 (同じ pp なら譜面表の順)
+	def top(self, n: int) -> np.ndarray:
+		candidates = self.candidates
+		if n <= 0:
+			return candidates[:0]
+		if n < len(candidates):
+			candidates = candidates[np.argpartition(-self.pp[candidates], n - 1)[:n]]
+		return candidates[np.lexsort((candidates, -self.pp[candidates]))]
+
+	# 上位 n 件の pp を大きい順に
+	def top_pp(self, n: int) -> np.ndarray:
+		return self.pp[self.top(n)]
+
+	# 上位 n 件の重み付き合計と単純合計
+	def total(self, n: int = 100, decay: float = 0.97) -> Tuple[float, float]:
+		pp = self.top_pp(n)
+		return float(pp @ get_decay_weights(len(pp), decay)), float(pp.sum())
+
+	# 各譜面で次のランプ (get_next_clear_type) を取ったときに上位 n 件の重み付き合計がいくら増えるか
+	# 次のランプがない譜面は NaN
+	#
+	# pp の大きい順の列 p に対し, 順位 i の重みを w(i) = decay^i (i < n), 0 (i >= n) として
+	#   S0[j] = Σ_{i<j} w(i) p_i,  Sdown[j] = Σ_{i<j} w(i+1) p_i,  Sup[j] = Σ_{i<j} w(i-1) p_i
+	# を作っておけば, 新しい pp v を挿入する位置 k (v より大きい pp の数) を二分探索するだけで
+	# 挿入後の合計が求まる. Easy → Hard のように元の順位 r の項目を置き換える場合も同様
+	def marginal_gain(self, level_mapper: LevelMapper, n: int = 100, decay: float = 0.97) -> np.ndarray:
+		frame = self.frame
+		order = self.top(len(self.candidates))
+		p = self.pp[order]
+		m = len(p)
+		rank = np.full(len(frame), -1, dtype=np.int64)
+		rank[order] = np.arange(m)
+
+		def w(pos):
+			pos = np.asarray(pos)
+			return np.where(pos < n, decay ** np.minimum(pos, n).astype(np.float64), 0.0)
+
+		positions = np.arange(m)
+		s0 = np.concatenate([[0.0], np.cumsum(w(positions) * p)])
+		sdown = np.concatenate([[0.0], np.cumsum(w(positions + 1) * p)])
+		sup = np.concatenate([[0.0], np.cumsum(w(np.maximum(positions - 1, 0)) * p)])
+		total = s0[m]
+
+		# 次のランプとその pp
+		next_easy = frame.clear < 4
+		next_hard = (frame.clear >= 4) & (frame.clear < 6)
+		next_beta = np.where(next_hard, frame.beta_hard, frame.beta_easy)
+		v = (level_mapper.to_stella(next_beta) + 2) * 40
+		k = np.searchsorted(-p, -v, side='left')
+
+		# 置き換える元の項目がない場合
+		new_total = s0[k] + w(k) * v + (sdown[m] - sdown[k])
+		# 元の項目 (順位 r) を取り除いて挿入する場合
+		r = rank
+		replace = r >= 0
+		rr = np.maximum(r, 0)
+		before = replace & (k <= rr)
+		after = replace & (k > rr)
+		total_before = s0[k] + w(k) * v + (sdown[rr] - sdown[k]) + (s0[m] - s0[np.minimum(rr + 1, m)])
+		total_after = s0[rr] + (sup[k] - sup[np.minimum(rr + 1, m)]) + w(np.maximum(k - 1, 0)) * v + (s0[m] - s0[k])
+		new_total = np.where(before, total_before, new_total)
+		new_total = np.where(after, total_after, new_total)
+
+		gain = new_total - total
+		return np.where(next_easy | next_hard, gain, np.nan)
+
+# 次のランプの達成確率の範囲で譜面を引くための索引
+# 達成確率 σ(alpha (theta - beta)) は logit = alpha (theta - beta) について単調なので,
+# 各譜面の次のランプの logit で 1 度だけ並べておけば, 確率の範囲は並べた配列の連続した区間になる
+# 複数の難易度表をまとめて入れられる (tables は (表の名前, ChartFrame, LevelMapper, theta) のリスト. 名前は TableRegistry の一意な名前)
+class RecommendIndex:
+	def __init__(self, tables: List[Tuple[str, ChartFrame, LevelMapper, float]], n: int = 100, decay: float = 0.97):
+		self.tables = tables
+		table_id = []
+		row = []
+		logit = []
+		gain = []
+		stella = []
+		for t, (name, frame, level_mapper, theta) in enumerate(tables):
+			rows = np.flatnonzero(frame.clear < 6)
+			next_beta = np.where(frame.clear[rows] >= 4, frame.beta_hard[rows], frame.beta_easy[rows])
+			table_id.append(np.full(len(rows), t, dtype=np.int32))
+			row.append(rows)
+			logit.append(frame.alpha[rows] * (theta - next_beta))
+			gain.append(PPRanking(frame, level_mapper).marginal_gain(level_mapper, n, decay)[rows])
+			stella.append(level_mapper.to_stella(next_beta))
+
+		logit = np.concatenate(logit) if logit else np.zeros(0)
+		order = np.argsort(logit, kind='stable')
+		self.logit = logit[order]
+		self.table_id = np.concatenate(table_id)[order] if table_id else np.zeros(0, dtype=np.int32)
+		self.row = np.concatenate(row)[order] if row else np.zeros(0, dtype=np.int64)
+		self.prob = 1.0 / (1.0 + np.exp(- self.logit))
+		self.gain = np.concatenate(gain)[order] if gain else np.zeros(0)
+		self.stella = np.concatenate(stella)[order] if stella else np.zeros(0)
+		# 期待 pp = 達成確率 × 取れたときの pp の増分
+		self.expected = self.prob * self.gain
+
+	def __len__(self) -> int:
+		return len(self.logit)
+
+	# 達成確率が [min_prob, max_prob] の譜面を order_by の大きい順に top 件
+	def query(self, min_prob: float = 0.0, max_prob: float = 1.0, top: int = 30, order_by: str = "expected_pp") -> List[dict]:
+		with np.errstate(divide='ignore'):
+			lo_logit = np.log(min_prob) - np.log1p(- min_prob)
+			hi_logit = np.log(max_prob) - np.log1p(- max_prob)
+		lo = int(np.searchsorted(self.logit, lo_logit, side='left'))
+		hi = int(np.searchsorted(self.logit, hi_logit, side='right'))
+		keys = {"expected_pp": self.expected, "pp_gain": self.gain, "prob": self.prob}[order_by][lo:hi]
+		keys = np.nan_to_num(keys, nan=-np.inf)
+		selected = np.arange(lo, hi)
+		if 0 < top < len(selected):
+			part = np.argpartition(-keys, top - 1)[:top]
+			selected = selected[part]
+			keys = keys[part]
+		elif top <= 0:
+			selected = selected[:0]
+			keys = keys[:0]
+		selected = selected[np.lexsort((selected, -keys))]
+
+		ret = []
+		for k in selected.tolist():
+			name, frame, level_mapper, theta = self.tables[self.table_id[k]]
+			i = int(self.row[k])
+			clear = int(frame.clear[i])
+			ret.append({
+				"table": name,
+				"title": frame.title[i],
+				"display_level": frame.display_level[i],
+				"sha256": frame.sha256[i],
+				"lamp": get_detailed_clear_type(clear),
+				"next_lamp": get_next_clear_type(clear),
+				"stella": float(self.stella[k]),
+				"prob": float(self.prob[k]),
+				"pp_gain": float(self.gain[k]),
+				"expected_pp": float(self.expected[k]),
+			})
+		return ret
+
+# ppリストを取得
+def get_sorted_pp_data(average_list: List[float], frame: ChartFrame, max_num: int, ranking: PPRanking = None) -> List[dict]:
+	if ranking is None:
+		ranking = PPRanking(frame, LevelMapper(average_list))
+	ret = []
+	for i in ranking.top(max_num).tolist():
+		tmp = dict()
+		tmp["title"] = frame.title[i]
+		tmp["level"] = frame.display_level[i]
+		tmp["sha256"] = frame.sha256[i]
+		tmp["minbp"] = int(frame.minbp[i])
+		tmp["score_rate"] = float(frame.score_rate[i])
+		tmp["display_level"] = frame.display_level[i]
+		tmp["alpha"] = float(frame.alpha[i])
+		tmp["real_clear"] = int(frame.clear[i])
+		tmp["beta"] = float(ranking.beta[i])
+		tmp["pp"] = float(ranking.pp[i])
+		tmp["clear"] = "Hard" if ranking.is_hard[i] else "Easy"
+		ret.append(tmp)
+	return ret
+
+
+# 実力の推移を取る間隔 (秒)
+HISTORY_PERIODS = {"day": 86400, "week": 7 * 86400}
+
+# スコアの履歴を日付順に再生し, 区切り (日 / 週) ごとに theta と重み付き pp を求める
+# 譜面を最初にプレイした順に並べておくと, ある時点までにプレイした譜面はいつも先頭の連続した範囲になる
+# なので尤度は LikelihoodModel.prefix で先頭だけを見て, 新しい記録の譜面の係数だけを set_outcome で書き換える
+# theta は前の区切りの値から warm start する
+# history の譜面の番号は frame の行
+def compute_rating_history(
+	frame: ChartFrame,
+	level_mapper: LevelMapper,
+	history: ScoreHistory,
+	period: int = HISTORY_PERIODS["week"],
+	n: int = 100,
+	decay: float = 0.97
+) -> List[dict]:
+	keep = history.clear >= 1
+	chart, clear, date = history.chart[keep], history.clear[keep], history.date[keep]
+	if len(chart) == 0:
+		return []
+	order = np.argsort(date, kind="stable")
+	chart, clear, date = chart[order], clear[order], date[order]
+	player = history.player
+
+	# 最初にプレイした順の番号 (slot) を振る
+	charts, first = np.unique(chart, return_index=True)
+	charts = charts[np.argsort(first, kind="stable")]
+	slot_of_chart = np.empty(len(frame), dtype=np.int64)
+	slot_of_chart[charts] = np.arange(len(charts))
+	slot = slot_of_chart[chart]
+
+	model = LikelihoodModel(frame.beta_easy[charts], frame.beta_hard[charts], frame.alpha[charts], np.full(len(charts), -1))
+	pp_easy = (level_mapper.to_stella(frame.beta_easy[charts]) + 2) * 40
+	pp_hard = (level_mapper.to_stella(frame.beta_hard[charts]) + 2) * 40
+	pp = np.full(len(charts), -np.inf)
+	best = np.zeros(len(charts), dtype=np.int16)
+	weights = get_decay_weights(n, decay)
+	if player:
+		player_date = np.array([x[0] for x in player], dtype=np.int64)
+		player_count = [x[1] for x in player]
+
+	# 区切りの境目 (日付は UTC の日 / 週で切る)
+	bucket = date // period
+	ends = np.r_[np.flatnonzero(np.diff(bucket)) + 1, len(date)]
+	bounds = (-20, 10)
+	ret = []
+	theta = None
+	num_played = 0
+	start = 0
+	for end in ends.tolist():
+		changed = np.unique(slot[start:end])
+		np.maximum.at(best, slot[start:end], clear[start:end])
+		outcome = get_outcome_codes(best[changed])
+		model.set_outcome(changed, outcome)
+		pp[changed] = np.where(outcome == OUTCOME_HARD, pp_hard[changed], np.where(outcome == OUTCOME_EASY, pp_easy[changed], -np.inf))
+		num_played = max(num_played, int(changed[-1]) + 1)
+		start = end
+
+		played = model.prefix(num_played)
+		if theta is None:
+			theta = float(np.mean(played.beta_easy))
+		result = solve_theta(played, theta, bounds)
+		theta = result.x
+		top_pp = pp[:num_played]
+		top_pp = top_pp[top_pp > -np.inf]
+		if len(top_pp) > n:
+			top_pp = top_pp[np.argpartition(-top_pp, n - 1)[:n]]
+		top_pp = -np.sort(-top_pp)
+		record = {
+			"date": int(date[end - 1]),
+			"theta": theta,
+			"stella": float(level_mapper.to_stella(theta)),
+			"pp": float(top_pp @ weights[:len(top_pp)]),
+			"plays": num_played,
+			# 全部 Failed などで推定が探索範囲の端に張り付いたか
+			"bounded": not (bounds[0] < theta < bounds[1]),
+		}
+		if player:
+			k = int(np.searchsorted(player_date, record["date"], side="right"))
+			record["playcount"] = int(player_count[k - 1]) if k > 0 else 0
+		ret.append(record)
+	metrics.count("history_checkpoints", len(ret))
+	return ret
+
+# ランプの並び順と data-value に入れる値
+LAMP_ORDER = ["No Play", "Failed", "Assist", "L-Assist", "Easy", "Clear", "Hard", "ExHard", "FullCombo"]
+DICT_LAMP = {
+	"FullCombo": 8,
+	"ExHard": 7,
+	"Hard": 6,
+	"Clear": 5,
+	"Easy": 4,
+	"L-Assist": 3,
+	"Assist": 2,
+	"Failed": 1,
+	"No Play": "NaN",
+	"": "NaN"
+}
+
+# ランプの色分けに使う class
+LAMP_COLOR_CLASS = {
+	"No Play": "lamp-noplay",
+	"Failed": "lamp-failed",
+	"Assist": "lamp-assist",
+	"L-Assist": "lamp-assist",
+	"Easy": "lamp-easy",
+	"Clear": "lamp-clear",
+	"Hard": "lamp-hard",
+	"ExHard": "lamp-exh",
+	"FullCombo": "lamp-fc",
+	"": ""
+}
+
+# 両ページ共通のスタイル
+HTML_STYLE_COMMON = """
+	body { font-family: sans-serif; background-color: #222; color: #eee; padding: 20px; }
+	
+	.header-container {
+		display: flex;
+		justify-content: space-between; /* タイトルは左、ボタンは右に配置 */
+		align_items: center;
+		margin-bottom: 20px;
+		border-bottom: 1px solid #444;
+		padding-bottom: 10px;
+	}
+	.nav-btn {
+		background-color: #004488;
+		color: white;
+		padding: 10px 20px;
+		text-decoration: none;
+		border-radius: 5px;
+		font-weight: bold;
+		transition: background-color 0.3s;
+		box-shadow: 0 2px 4px rgba(0,0,0,0.3);
+	}
+	.nav-btn:hover {
+		background-color: #003366;
+		transform: translateY(-1px);
+	}			
+
+	/* --- ランプフィルタエリア --- */
+	.filter-container {
+		background-color: #333; padding: 10px 15px; border-radius: 5px;
+		margin-bottom: 15px; border: 1px solid #444;
+	}
+	.filter-label { font-weight: bold; margin-right: 10px; font-size: 0.9em; color: #aaa; }
+	.filter-item { 
+		display: inline-block; margin-right: 15px; cursor: pointer; user-select: none; font-weight: bold;
+	}
+	.filter-buttons { margin-top: 5px; }
+	.filter-buttons button {
+		font-size: 0.8em; padding: 2px 8px; margin-right: 5px; cursor: pointer;
+		background: #555; color: #fff; border: 1px solid #666; border-radius: 3px;
+	}
+	.filter-buttons button:hover { background: #666; }
+"""
+
+# タブのスタイル (難易度表ページのみ)
+HTML_STYLE_TAB = """
+	/* タブ部分 */
+	.tab { overflow: hidden; border: 1px solid #444; background-color: #333; border-radius: 5px 5px 0 0; }
+	.tab button {
+		background-color: inherit; float: left; border: none; outline: none;
+		cursor: pointer; padding: 14px 16px; transition: 0.3s; color: #ccc; font-weight: bold;
+	}
+	.tab button:hover { background-color: #555; }
+	.tab button.active { background-color: #007bff; color: white; }
+
+	/* タブコンテンツ */
+	.tabcontent {
+		display: none; padding: 6px 12px; border: 1px solid #444; border-top: none;
+	}
+	
+"""
+
+# テーブルとランプのスタイル
+HTML_STYLE_TABLE = """
+	/* テーブル装飾 */
+	table { width: 100%; border-collapse: collapse; margin-top: 10px; }
+	th, td { padding: 10px; border-bottom: 1px solid #444; text-align: left; }
+	th { background-color: #333; cursor: pointer; user-select: none; }
+	th:hover { background-color: #555; }
+	th::after { content: ' ⇅'; font-size: 0.8em; color: #888; }
+	
+	/* ランプの色分け */
+	.lamp-fc { color: #55ffff; font-weight: bold; text-shadow: 0 0 5px #55ffff; }
+	.lamp-exh { color: #ffff55; font-weight: bold; text-shadow: 0 0 5px #ffff55; }
+	.lamp-hard { color: #ff5555; font-weight: bold; text-shadow: 0 0 5px #ff5555; }
+	.lamp-clear { color: #ffbb55; font-weight: bold; text-shadow: 0 0 5px #ffbb55; }
+	.lamp-easy { color: #55ff55; font-weight: bold; text-shadow: 0 0 5px #55ff55; }
+	.lamp-assist { color: #ff55ff; font-weight: bold; text-shadow: 0 0 5px #ff55ff; }
+	.lamp-failed { color: #cccccc; }
+	.lamp-noplay { color: #666666; }
+
+	a{
+		text-decoration: none;
+		color: #eee;
+	}
+"""
+
+HTML_HEAD_TEMPLATE = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+	<meta charset="UTF-8">
+	<title>Shobon Stella Recommend</title>
+	<style>{style}</style>
+</head>
+<body>
+"""
+
+HTML_FILTER_TEMPLATE = """
+	<div class="filter-container">
+		<div style="margin-bottom:5px;">
+			<span class="filter-label">Now Lamp:</span>
+			{lamp_filter_html}
+		</div>
+		<div class="filter-buttons">
+			<button onclick="toggleLampAll(true)">全選択</button>
+			<button onclick="toggleLampAll(false)">全解除</button>
+		</div>
+	</div>
+"""
+
+HTML_LAMP_FILTER_ITEM_TEMPLATE = """
+		<label class="filter-item">
+			<input type="checkbox" class="lamp-checkbox" value="{value}" checked onchange="applyLampFilter()">
+			{lamp}
+		</label>"""
+
+# ページ上部のリンク
+HTML_NAV_TEMPLATE = """	<a href="{href}" class="nav-btn">{label}</a>
+"""
+
+# 表ごとに出力するページ (ページの種類, リンクの名前)
+REPORT_PAGES = [("table", "難易度表"), ("top100", "TOP100"), ("recommend", "おすすめ")]
+
+# TOP100 ページの行
+TOP100_ROW_TEMPLATE = (
+	'<tr class="chart-row">'
+	'<td data-value="{rank}">{rank}</td>'
+	'<td data-value="{title}"><a href="https://mocha-repository.info/song.php?sha256={sha256}">{title}</a></td>'
+	'<td data-value="{dislv}">{dislv}</td>'
+	'<td data-value="{lampnum}" class="{colorclass}">{lamp}</td>'
+	'<td data-value="{lv}">{lv}</td>'
+	'<td data-value="{jiriki}">{jiriki}</td>'
+	'<td data-value="{prob}">{prob}</td>'
+	'<td data-value="{pp}">{pp}</td>'
+	'</tr>\n'
+)
+
+# 難易度表ページの行
+TABLE_ROW_TEMPLATE = (
+	'<tr class="chart-row">'
+	'<td data-value="{title}"><a href="https://mocha-repository.info/song.php?sha256={sha256}">{title}</a></td>'
+	'<td data-value="{lvec}">{lvec}</td>'
+	'<td data-value="{lvhc}">{lvhc}</td>'
+	'<td data-value="{jiriki}">{jiriki}</td>'
+	'<td data-value="{lampnum}" class="{colorclass}">{lamp}</td>'
+	'<td data-value="{minbp}">{minbp}</td>'
+	'<td data-value="{score}">{score}</td>'
+	'<td data-value="{nextlampnum}">{nextlamp}</td>'
+	'<td data-value="{prob}">{prob}</td>'
+	'<td data-value="{gain}">{gain}</td>'
+	'</tr>\n'
+)
+
+TOP100_SCRIPT = """
+	<script>
+	function openTab(evt, tabId) {
+		var i, tabcontent, tablinks;
+		tabcontent = document.getElementsByClassName("tabcontent");
+		for (i = 0; i < tabcontent.length; i++) {
+			tabcontent[i].style.display = "none";
+		}
+		tablinks = document.getElementsByClassName("tablinks");
+		for (i = 0; i < tablinks.length; i++) {
+			tablinks[i].className = tablinks[i].className.replace(" active", "");
+		}
+		document.getElementById(tabId).style.display = "block";
+		evt.currentTarget.className += " active";
+	}
+
+	function applyLampFilter() {
+		const checkboxes = document.querySelectorAll('.lamp-checkbox');
+		const checkedLamps = Array.from(checkboxes)
+								  .filter(cb => cb.checked)
+								  .map(cb => cb.value);
+
+		const rows = document.querySelectorAll('tr.chart-row');
+		
+		rows.forEach(row => {
+			const lampCell = row.cells[3]; 
+			const lampValue = lampCell.getAttribute('data-value');
+			if (checkedLamps.includes(lampValue)) {
+				row.style.display = ""; 
+			} else {
+				row.style.display = "none"; 
+			}
+		});
+	}
+
+	// 全選択/全解除ボタン
+	function toggleLampAll(checked) {
+		const checkboxes = document.querySelectorAll('.lamp-checkbox');
+		checkboxes.forEach(cb => cb.checked = checked);
+		applyLampFilter();
+	}
+
+	var sortState = {};
+
+	function extractNumber(str) {
+		if (!str) return NaN;
+		var cleaned = str.replace(/[^-0-9.]/g, '');
+		var num = parseFloat(cleaned);
+		return num;
+	}
+
+	function sortTable(col, type) {
+		var table = document.getElementById("table");
+		var tbody = table.tBodies[0];
+		var rows = Array.from(tbody.rows);
+
+		var dir = 'asc';
+		if (sortState && sortState.col === col && sortState.dir === 'asc') {
+			dir = 'desc';
+		}
+		sortState = { col: col, dir: dir };
+
+		function getSortValue(row) {
+			var val = row.cells[col].getAttribute("data-value");
+			var isEmpty = (val === null || val === undefined || val.trim() === "");
+			if (type === 'number' || type === 'smart-number') {
+				var num;
+				if (isEmpty) {
+					num = NaN;
+				} else if (type === 'smart-number') {
+					num = extractNumber(val);
+				} else {
+					num = parseFloat(val);
+				}
+				if (isNaN(num)) {
+					return dir === 'asc' ? Number.MAX_VALUE : -Number.MAX_VALUE;
+				}
+				return num;
+			} else {
+				if (isEmpty) return dir === 'asc' ? "\uFFFF" : ""; // 文字列のソートで最後尾に行くような文字
+				return val.toLowerCase();
+			}
+		}
+
+		// ソート実行
+		rows.sort(function(a, b) {
+			var valA = getSortValue(a);
+			var valB = getSortValue(b);
+
+			if (valA < valB) return dir === 'asc' ? -1 : 1;
+			if (valA > valB) return dir === 'asc' ? 1 : -1;
+			return 0;
+		});
+
+		tbody.append(...rows);
+	}
+	</script>
+</body>
+</html>
+"""
+
+TABLE_SCRIPT = """
+	<script>
+	function openTab(evt, tabId) {
+		var i, tabcontent, tablinks;
+		tabcontent = document.getElementsByClassName("tabcontent");
+		for (i = 0; i < tabcontent.length; i++) {
+			tabcontent[i].style.display = "none";
+		}
+		tablinks = document.getElementsByClassName("tablinks");
+		for (i = 0; i < tablinks.length; i++) {
+			tablinks[i].className = tablinks[i].className.replace(" active", "");
+		}
+		document.getElementById(tabId).style.display = "block";
+		evt.currentTarget.className += " active";
+	}
+
+	function applyLampFilter() {
+		const checkboxes = document.querySelectorAll('.lamp-checkbox');
+		const checkedLamps = Array.from(checkboxes)
+								  .filter(cb => cb.checked)
+								  .map(cb => cb.value);
+
+		const rows = document.querySelectorAll('tr.chart-row');
+		
+		rows.forEach(row => {
+			const lampCell = row.cells[4]; 
+			const lampValue = lampCell.getAttribute('data-value');
+			if (checkedLamps.includes(lampValue)) {
+				row.style.display = ""; 
+			} else {
+				row.style.display = "none"; 
+			}
+		});
+	}
+
+	// 全選択/全解除ボタン
+	function toggleLampAll(checked) {
+		const checkboxes = document.querySelectorAll('.lamp-checkbox');
+		checkboxes.forEach(cb => cb.checked = checked);
+		applyLampFilter();
+	}
+
+	var sortState = {};
+
+	function extractNumber(str) {
+		if (!str) return NaN;
+		var cleaned = str.replace(/[^-0-9.]/g, '');
+		var num = parseFloat(cleaned);
+		return num;
+	}
+
+	function sortTable(tableIndex, col, type) {
+		var table = document.getElementById("table-" + tableIndex);
+		var tbody = table.tBodies[0];
+		var rows = Array.from(tbody.rows);
+
+		var dir = 'asc';
+		if (sortState[tableIndex] && sortState[tableIndex].col === col && sortState[tableIndex].dir === 'asc') {
+			dir = 'desc';
+		}
+		sortState[tableIndex] = { col: col, dir: dir };
+
+		function getSortValue(row) {
+			var val = row.cells[col].getAttribute("data-value");
+			var isEmpty = (val === null || val === undefined || val.trim() === "");
+			if (type === 'number' || type === 'smart-number') {
+				var num;
+				if (isEmpty) {
+					num = NaN;
+				} else if (type === 'smart-number') {
+					num = extractNumber(val);
+				} else {
+					num = parseFloat(val);
+				}
+				if (isNaN(num)) {
+					return dir === 'asc' ? Number.MAX_VALUE : -Number.MAX_VALUE;
+				}
+				return num;
+			} else {
+				if (isEmpty) return dir === 'asc' ? "\uFFFF" : ""; // 文字列のソートで最後尾に行くような文字
+				return val.toLowerCase();
+			}
+		}
+
+		// ソート実行
+		rows.sort(function(a, b) {
+			var valA = getSortValue(a);
+			var valB = getSortValue(b);
+
+			if (valA < valB) return dir === 'asc' ? -1 : 1;
+			if (valA > valB) return dir === 'asc' ? 1 : -1;
+			return 0;
+		});
+
+		tbody.append(...rows);
+	}
+	</script>
+</body>
+</html>
+"""
+
+# HTML を少しずつファイルに書き出す
+# 文書全体を文字列として持たないので, 譜面数が増えてもメモリ使用量は一定
+# filename にはパスのほか write を持つオブジェクトも渡せる
+class HtmlWriter:
+	def __init__(self, filename, buffer_size: int = 1 << 16, rows_per_chunk: int = 256):
+		self.filename = filename
+		self.buffer_size = buffer_size
+		self.rows_per_chunk = rows_per_chunk
+		self.file = None
+		self.owns_file = False
+
+	def __enter__(self) -> "HtmlWriter":
+		if hasattr(self.filename, "write"):
+			self.file = self.filename
+		else:
+			self.file = open(self.filename, "w", encoding="utf-8", buffering=self.buffer_size)
+			self.owns_file = True
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if self.owns_file:
+			self.file.close()
+			if exc_type is None:
+				print(f"ファイルを作成しました: {self.filename}")
+		return False
+
+	def write(self, chunk: str):
+		self.file.write(chunk)
+
+	# 行を template で整形し, rows_per_chunk 行ずつまとめて書き出す
+	def write_rows(self, template: str, rows):
+		render = template.format_map
+		chunk = []
+		num = 0
+		for row in rows:
+			chunk.append(render(row))
+			if len(chunk) >= self.rows_per_chunk:
+				self.file.write("".join(chunk))
+				num += len(chunk)
+				chunk = []
+		if chunk:
+			self.file.write("".join(chunk))
+			num += len(chunk)
+		metrics.count("rows_rendered", num)
+
+# ランプの絞り込みチェックボックス
+def get_lamp_filter_html() -> str:
+	return "".join(
+		HTML_LAMP_FILTER_ITEM_TEMPLATE.format(value = DICT_LAMP[lamp], lamp = html.escape(lamp))
+		for lamp in LAMP_ORDER
+	)
+
+# 出力する HTML のファイル名 (表が複数あるときは難易度表と TOP100 に表の名前を付け, おすすめは 1 つにまとめる)
+def get_report_filenames(output_dir: str = "", name: str = None) -> Dict[str, str]:
+	suffix = "" if name is None else f"_{name}"
+	return {
+		"table": os.path.join(output_dir, f"result_table{suffix}.html"),
+		"top100": os.path.join(output_dir, f"result_top100{suffix}.html"),
+		"recommend": os.path.join(output_dir, "result_recommend.html"),
+	}
+
+# 同じ表の他のページと, 他の表の難易度表ページへのリンク (ファイル名, リンクの名前)
+def get_report_links(filenames: Dict[str, str], current: str, other_tables: List[Tuple[str, str]] = None) -> List[Tuple[str, str]]:
+	links = [(filenames[page], f"{label} ページへ ➜") for page, label in REPORT_PAGES if page != current]
+	if other_tables is not None:
+		links += [(filename, f"{name} 難易度表 ページへ ➜") for name, filename in other_tables]
+	return links
+
+# 出力先は同じフォルダなのでファイル名だけでリンクする
+def get_nav_html(links: List[Tuple[str, str]]) -> str:
+	return "".join(
+		HTML_NAV_TEMPLATE.format(href = html.escape(os.path.basename(filename)), label = html.escape(label))
+		for filename, label in links
+	)
+
+# 難易度表ページの「あなたの推定実力」の見出し
+# estimated_interval (ブートストラップの theta の 5 / 50 / 95 パーセンタイル) があれば区間も出す
+def get_estimated_html(mode_slst: str, average_list: List[float], estimated_theta: float, estimated_se: float = None, estimated_interval: List[float] = None) -> str:
+	ret_estimated = f"{mode_slst}{beta_to_stella(average_list, estimated_theta):.2f}"
+	if estimated_se is not None:
+		ret_estimated += f" ± {stella_error(average_list, estimated_theta, estimated_se):.2f}"
+	ret = f'''	<h2>あなたの推定実力: <font color="#55ffff">{ret_estimated}</font></h2>\n'''
+	if estimated_interval is not None:
+		low, median, high = [f"{mode_slst}{beta_to_stella(average_list, x):.2f}" for x in estimated_interval]
+		ret += f"\t<h3>90% 区間 (ブートストラップ): {low} 〜 {high} (中央値 {median})</h3>\n"
+	return ret
+
+# 表示用に長いタイトルを切り詰める
+def get_display_title(title: str) -> str:
+	if len(title) >= 50:
+		title = title[:47]+'...'
+	return html.escape(title)
+
+# 実力と重み付き pp の推移の折れ線グラフ (SVG をページに埋め込む, 左の軸が実力, 右の軸が pp)
+# 推定が探索範囲の端に張り付いた区切りは描かない
+def get_history_svg(history: List[dict], mode_slst: str, width: int = 800, height: int = 240) -> str:
+	points = [record for record in history if not record["bounded"]]
+	if len(points) < 2:
+		return ""
+	left, right, top, bottom = 60, 60, 20, 30
+	dates = [record["date"] for record in points]
+	date_min, date_max = dates[0], max(dates[-1], dates[0] + 1)
+
+	def polyline(values: List[float], color: str) -> Tuple[str, float, float]:
+		low, high = min(values), max(values)
+		if high - low < 1e-9:
+			low, high = low - 0.5, high + 0.5
+		xy = []
+		for date, value in zip(dates, values):
+			x = left + (width - left - right) * (date - date_min) / (date_max - date_min)
+			y = top + (height - top - bottom) * (high - value) / (high - low)
+			xy.append(f"{x:.1f},{y:.1f}")
+		return f'''<polyline fill="none" stroke="{color}" stroke-width="2" points="{' '.join(xy)}"/>''', low, high
+
+	stella_line, stella_low, stella_high = polyline([record["stella"] for record in points], "#55ffff")
+	pp_line, pp_low, pp_high = polyline([record["pp"] for record in points], "#ffaa55")
+	day = lambda date: time.strftime("%Y-%m-%d", time.localtime(date))
+	return f'''	<h3>推移 (<font color="#55ffff">推定実力</font> / <font color="#ffaa55">pp</font>)</h3>
+	<svg width="{width}" height="{height}" style="background-color: #333; border: 1px solid #444;">
+		<line x1="{left}" y1="{height - bottom}" x2="{width - right}" y2="{height - bottom}" stroke="#666"/>
+		<text x="{left - 5}" y="{top + 5}" fill="#55ffff" font-size="12" text-anchor="end">{mode_slst}{stella_high:.2f}</text>
+		<text x="{left - 5}" y="{height - bottom}" fill="#55ffff" font-size="12" text-anchor="end">{mode_slst}{stella_low:.2f}</text>
+		<text x="{width - right + 5}" y="{top + 5}" fill="#ffaa55" font-size="12">{pp_high:.0f}pp</text>
+		<text x="{width - right + 5}" y="{height - bottom}" fill="#ffaa55" font-size="12">{pp_low:.0f}pp</text>
+		<text x="{left}" y="{height - 10}" fill="#eee" font-size="12">{day(date_min)}</text>
+		<text x="{width - right}" y="{height - 10}" fill="#eee" font-size="12" text-anchor="end">{day(dates[-1])}</text>
+		{stella_line}
+		{pp_line}
+	</svg>
+'''
+
+def generate_html_top100(
+	frame: ChartFrame,
+	mode_slst: str,
+	average_list: List[float],
+	estimated_theta: float,
+	filename_top100: str,
+	nav_html: str = None,
+	history: List[dict] = None
+):
+	if nav_html is None:
+		nav_html = get_nav_html(get_report_links(get_report_filenames(), "top100"))
+	level_mapper = LevelMapper(average_list)
+	ranking = PPRanking(frame, level_mapper)
+	top100_list = get_sorted_pp_data(average_list, frame, 100, ranking)
+	pp_sum, pp_raw_sum = ranking.total(100, 0.97)
+
+	stella_list = level_mapper.to_stella([float(song['beta']) for song in top100_list]).tolist()
+
+	def rows():
+		for ret_num, song in enumerate(top100_list):
+			ret_lamp = get_detailed_clear_type(int(song["real_clear"]))
+			ret_ok_lamp = song["clear"]
+			if ret_ok_lamp != "Easy" and ret_ok_lamp != "Hard":
+				assert(False)
+			yield {
+				"rank": ret_num + 1,
+				"title": get_display_title(song["title"]),
+				"sha256": song["sha256"],
+				"dislv": song["display_level"],
+				"lampnum": DICT_LAMP[ret_lamp],
+				"colorclass": LAMP_COLOR_CLASS[ret_lamp],
+				"lamp": ret_lamp,
+				"lv": f"{mode_slst}{stella_list[ret_num]:.2f}",
+				"jiriki": f"{float(song['alpha'])/2:.2f}",
+				"prob": f"{prob_grm(estimated_theta, float(song['beta']), float(song['alpha'])) * 100:.2f} %",
+				"pp": f"{song['pp']:.0f}pp",
+			}
+
+	with HtmlWriter(filename_top100) as writer:
+		writer.write(HTML_HEAD_TEMPLATE.format(style = HTML_STYLE_COMMON + HTML_STYLE_TABLE))
+		writer.write(f"""
+	<h1>Shobon Stella Recommend - Performance Top 100</h1>
+{nav_html}	<h2><font color="#55ffff">{pp_sum:.0f}pp</font> (Raw: {pp_raw_sum:.0f}pp)</h2>
+	<h3></h3>
+""")
+		if history:
+			writer.write(get_history_svg(history, mode_slst))
+		writer.write(HTML_FILTER_TEMPLATE.format(lamp_filter_html = get_lamp_filter_html()))
+		writer.write("""
+	<div id="tab-content" class="tabcontent">
+		<table id="table">
+			<thead>
+				<tr>
+					<th onclick="sortTable(0, 'number')">順位</th>
+					<th onclick="sortTable(1, 'text')">タイトル</th>
+					<th onclick="sortTable(2, 'smart-number')">表</th>
+					<th onclick="sortTable(3, 'number')">ランプ</th>
+					<th onclick="sortTable(4, 'smart-number')">推定</th>
+					<th onclick="sortTable(5, 'number')">地力度</th>
+					<th onclick="sortTable(6, 'smart-number')">達成確率</th>
+					<th onclick="sortTable(7, 'smart-number')">pp</th>
+				</tr>
+			</thead>
+			<tbody>
+""")
+		writer.write_rows(TOP100_ROW_TEMPLATE, rows())
+		writer.write("</tbody></table></div>")
+		writer.write(TOP100_SCRIPT)
+	return
+
+def generate_html_table(
+	frame: ChartFrame,
+	mode_slst: str,
+	average_list: List[float],
+	estimated_theta: float,
+	filename_table: str,
+	estimated_se: float = None,
+	nav_html: str = None,
+	estimated_interval: List[float] = None
+):
+	if nav_html is None:
+		nav_html = get_nav_html(get_report_links(get_report_filenames(), "table"))
+	level_list = list(set(frame.display_level))
+	level_list.sort(key=lambda x:(x[:2],int(x[2:])))
+	tabs = level_list
+
+	estimated_html = get_estimated_html(mode_slst, average_list, estimated_theta, estimated_se, estimated_interval)
+
+	level_mapper = LevelMapper(average_list)
+	stella_easy = level_mapper.to_stella(frame.beta_easy).tolist()
+	stella_hard = level_mapper.to_stella(frame.beta_hard).tolist()
+	prob_easy = (prob_grm(estimated_theta, frame.beta_easy, frame.alpha) * 100).tolist()
+	prob_hard = (prob_grm(estimated_theta, frame.beta_hard, frame.alpha) * 100).tolist()
+	gain_list = PPRanking(frame, level_mapper).marginal_gain(level_mapper).tolist()
+	alpha_list = frame.alpha.tolist()
+	has_score_list = frame.has_score.tolist()
+	clear_list = frame.clear.tolist()
+	minbp_list = frame.minbp.tolist()
+	score_rate_list = frame.score_rate.tolist()
+
+	def rows(target_index):
+		for i in target_index:
+			ret_lamp = "No Play"
+			ret_minbp = ""
+			ret_score = ""
+			ret_nextlamp = "Easy"
+			ret_prob = f"{prob_easy[i]:.2f} %"
+
+			if has_score_list[i]:
+				ret_lamp = get_detailed_clear_type(clear_list[i])
+				ret_minbp = minbp_list[i]
+				ret_score = f"{score_rate_list[i]*100:.2f} %"
+				ret_nextlamp = get_next_clear_type(clear_list[i])
+				if ret_nextlamp == "Easy":
+					ret_prob = f"{prob_easy[i]:.2f} %"
+				elif ret_nextlamp == "Hard":
+					ret_prob = f"{prob_hard[i]:.2f} %"
+				else:
+					ret_prob = ""
+
+			yield {
+				"title": get_display_title(frame.title[i]),
+				"sha256": frame.sha256[i],
+				"lvec": f"{mode_slst}{stella_easy[i]:.2f}",
+				"lvhc": f"{mode_slst}{stella_hard[i]:.2f}",
+				"jiriki": f"{alpha_list[i]/2:.2f}",
+				"lampnum": DICT_LAMP[ret_lamp],
+				"colorclass": LAMP_COLOR_CLASS[ret_lamp],
+				"lamp": ret_lamp,
+				"minbp": ret_minbp,
+				"score": ret_score,
+				"nextlampnum": DICT_LAMP[ret_nextlamp],
+				"nextlamp": ret_nextlamp,
+				"prob": ret_prob,
+				"gain": "" if gain_list[i] != gain_list[i] else f"{gain_list[i]:.2f}pp",
+			}
+
+	with HtmlWriter(filename_table) as writer:
+		writer.write(HTML_HEAD_TEMPLATE.format(style = HTML_STYLE_COMMON + HTML_STYLE_TAB + HTML_STYLE_TABLE))
+		writer.write(f"""
+	<h1>Shobon Stella Recommend</h1>
+{nav_html}{estimated_html}""")
+		writer.write(HTML_FILTER_TEMPLATE.format(lamp_filter_html = get_lamp_filter_html()))
+		writer.write('\t<div class="tab">\n')
+		for i, level in enumerate(tabs):
+			active_class = " active" if i == 0 else ""
+			writer.write(f"""		<button class="tablinks{active_class}" onclick="openTab(event, 'tab-content-{i}')">{html.escape(level)}</button>\n""")
+		writer.write("\t</div>\n")
+
+		for i, level in enumerate(tabs):
+			if level == "ALL":
+				target_index = range(len(frame))
+			else:
+				target_index = [j for j, x in enumerate(frame.display_level) if x == level]
+
+			display_style = "display: block;" if i == 0 else ""
+			writer.write(f"""
+	<div id="tab-content-{i}" class="tabcontent" style="{display_style}">
+		<table id="table-{i}">
+			<thead>
+				<tr>
+					<th onclick="sortTable({i}, 0, 'text')">タイトル</th>
+					<th onclick="sortTable({i}, 1, 'smart-number')">推定(E)</th>
+					<th onclick="sortTable({i}, 2, 'smart-number')">推定(H)</th>
+					<th onclick="sortTable({i}, 3, 'number')">地力度</th>
+					<th onclick="sortTable({i}, 4, 'number')">ランプ</th>
+					<th onclick="sortTable({i}, 5, 'number')">最小BP</th>
+					<th onclick="sortTable({i}, 6, 'smart-number')">スコア</th>
+					<th onclick="sortTable({i}, 7, 'number')">次の目標</th>
+					<th onclick="sortTable({i}, 8, 'smart-number')">達成確率</th>
+					<th onclick="sortTable({i}, 9, 'smart-number')">pp gain</th>
+				</tr>
+			</thead>
+			<tbody>
+""")
+			writer.write_rows(TABLE_ROW_TEMPLATE, rows(target_index))
+			writer.write("</tbody></table></div>")
+
+		writer.write(TABLE_SCRIPT)
+	return
+
+
+# データ駆動版の難易度表ページのスタイル (表示中の行だけを描画する)
+HTML_STYLE_VIRTUAL = """
+	.scroller { height: 70vh; overflow-y: auto; border: 1px solid #444; border-top: none; }
+	.scroller table { margin-top: 0; table-layout: fixed; }
+	.scroller thead th { position: sticky; top: 0; z-index: 1; }
+	.scroller td { white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
+	.scroller th:first-child, .scroller td:first-child { width: 30%; }
+	.row-count { color: #aaa; font-size: 0.9em; margin-top: 5px; }
+"""
+
+# データ駆動版の難易度表ページのスクリプト
+# charts の各要素は [タイトル, sha256, レベル番号, 推定(E), 推定(H), 地力度, ランプ, 最小BP, スコア, 次の目標, 達成確率, pp gain]
+JSON_TABLE_SCRIPT = """
+	<script>
+		(function() {
+			var payload = JSON.parse(document.getElementById("chart-data").textContent);
+			var levels = payload.levels;
+			var charts = payload.charts;
+			var prefix = payload.prefix;
+			var LAMP_NAMES = ["No Play", "Failed", "Assist", "L-Assist", "Easy", "Clear", "Hard", "ExHard", "FullCombo"];
+			var LAMP_CLASSES = ["lamp-noplay", "lamp-failed", "lamp-assist", "lamp-assist", "lamp-easy", "lamp-clear", "lamp-hard", "lamp-exh", "lamp-fc"];
+			// 表示列 -> charts の要素番号
+			var COLUMN_FIELDS = [0, 3, 4, 5, 6, 7, 8, 9, 10, 11];
+			var OVERSCAN = 10;
+
+			// レベルごとの譜面番号 (1 回だけ作る)
+			var byLevel = levels.map(function() { return []; });
+			var lampBits = new Uint16Array(charts.length);
+			for (var i = 0; i < charts.length; i++) {
+				byLevel[charts[i][2]].push(i);
+				lampBits[i] = 1 << charts[i][6];
+			}
+
+			// 並べ替えのキーは列ごとに初回だけ作る (数値は欠損を NaN に, 文字列は小文字に)
+			var sortKeys = {};
+			function getSortKeys(col) {
+				if (sortKeys[col]) return sortKeys[col];
+				var field = COLUMN_FIELDS[col];
+				var keys;
+				if (field === 0) {
+					keys = charts.map(function(c) { return c[0].toLowerCase(); });
+				} else {
+					keys = new Float64Array(charts.length);
+					for (var i = 0; i < charts.length; i++) {
+						var v = charts[i][field];
+						keys[i] = (v === null || (field === 6 && v === 0) || (field === 9 && v === 0)) ? NaN : v;
+					}
+				}
+				sortKeys[col] = keys;
+				return keys;
+			}
+
+			var state = { level: 0, col: null, dir: "asc", mask: 0x1ff };
+			var view = [];
+			var rowHeight = 37;
+			var scroller = document.getElementById("scroller");
+			var tbody = document.getElementById("tbody");
+			var rowCount = document.getElementById("row-count");
+
+			function rebuildView() {
+				var source = byLevel[state.level];
+				view = [];
+				for (var i = 0; i < source.length; i++) {
+					if (lampBits[source[i]] & state.mask) view.push(source[i]);
+				}
+				if (state.col !== null) {
+					var keys = getSortKeys(state.col);
+					var sign = state.dir === "asc" ? 1 : -1;
+					var isText = COLUMN_FIELDS[state.col] === 0;
+					view.sort(function(a, b) {
+						var ka = keys[a], kb = keys[b];
+						if (!isText) {
+							// 欠損値は常に最後
+							var na = ka !== ka, nb = kb !== kb;
+							if (na || nb) return na === nb ? a - b : (na ? 1 : -1);
+						}
+						if (ka < kb) return -sign;
+						if (ka > kb) return sign;
+						return a - b;
+					});
+				}
+				rowCount.textContent = view.length + " 譜面";
+				render();
+			}
+
+			function formatPercent(v) {
+				return v === null ? "" : v.toFixed(2) + " %";
+			}
+
+			function makeRow(c) {
+				var tr = document.createElement("tr");
+				tr.className = "chart-row";
+				var title = document.createElement("td");
+				var link = document.createElement("a");
+				link.href = "https://mocha-repository.info/song.php?sha256=" + c[1];
+				link.textContent = c[0];
+				title.appendChild(link);
+				tr.appendChild(title);
+				var cells = [
+					prefix + c[3].toFixed(2),
+					prefix + c[4].toFixed(2),
+					c[5].toFixed(2),
+					LAMP_NAMES[c[6]],
+					c[7] === null ? "" : String(c[7]),
+					formatPercent(c[8]),
+					c[9] === 0 ? "" : LAMP_NAMES[c[9]],
+					formatPercent(c[10]),
+					c[11] === null ? "" : c[11].toFixed(2) + "pp"
+				];
+				for (var i = 0; i < cells.length; i++) {
+					var td = document.createElement("td");
+					td.textContent = cells[i];
+					if (i === 3) td.className = LAMP_CLASSES[c[6]];
+					tr.appendChild(td);
+				}
+				return tr;
+			}
+
+			function spacer(height) {
+				var tr = document.createElement("tr");
+				tr.style.height = height + "px";
+				return tr;
+			}
+
+			function render() {
+				var visible = Math.ceil(scroller.clientHeight / rowHeight) + OVERSCAN * 2;
+				var start = Math.max(0, Math.floor(scroller.scrollTop / rowHeight) - OVERSCAN);
+				var end = Math.min(view.length, start + visible);
+				var fragment = document.createDocumentFragment();
+				fragment.appendChild(spacer(start * rowHeight));
+				for (var i = start; i < end; i++) {
+					fragment.appendChild(makeRow(charts[view[i]]));
+				}
+				fragment.appendChild(spacer((view.length - end) * rowHeight));
+				tbody.replaceChildren(fragment);
+				// 実際の行の高さに合わせる
+				if (end > start) {
+					var measured = tbody.children[1].getBoundingClientRect().height;
+					if (measured > 0 && Math.abs(measured - rowHeight) > 0.5) {
+						rowHeight = measured;
+						render();
+					}
+				}
+			}
+
+			var pending = false;
+			scroller.addEventListener("scroll", function() {
+				if (pending) return;
+				pending = true;
+				requestAnimationFrame(function() {
+					pending = false;
+					render();
+				});
+			});
+
+			var tabs = document.getElementById("tabs");
+			levels.forEach(function(level, i) {
+				var button = document.createElement("button");
+				button.className = "tablinks" + (i === 0 ? " active" : "");
+				button.textContent = level;
+				button.onclick = function() {
+					var buttons = tabs.getElementsByClassName("tablinks");
+					for (var j = 0; j < buttons.length; j++) buttons[j].className = "tablinks";
+					button.className = "tablinks active";
+					state.level = i;
+					scroller.scrollTop = 0;
+					rebuildView();
+				};
+				tabs.appendChild(button);
+			});
+
+			window.applyLampFilter = function() {
+				var mask = 0;
+				document.querySelectorAll(".lamp-checkbox").forEach(function(cb) {
+					if (!cb.checked) return;
+					var lamp = cb.value === "NaN" ? 0 : parseInt(cb.value, 10);
+					mask |= 1 << lamp;
+				});
+				state.mask = mask;
+				rebuildView();
+			};
+
+			window.toggleLampAll = function(checked) {
+				document.querySelectorAll(".lamp-checkbox").forEach(function(cb) { cb.checked = checked; });
+				window.applyLampFilter();
+			};
+
+			window.sortTable = function(col) {
+				state.dir = (state.col === col && state.dir === "asc") ? "desc" : "asc";
+				state.col = col;
+				rebuildView();
+			};
+
+			rebuildView();
+		})();
+	</script>
+</body>
+</html>
+"""
+
+# 難易度表ページのデータ駆動版
+# 譜面ごとの値を計算済みの数値として JSON で埋め込み, 表示中のタブの見えている行だけをブラウザで描画する
+def generate_html_table_json(
+	frame: ChartFrame,
+	mode_slst: str,
+	average_list: List[float],
+	estimated_theta: float,
+	filename_table: str,
+	estimated_se: float = None,
+	nav_html: str = None,
+	estimated_interval: List[float] = None
+):
+	if nav_html is None:
+		nav_html = get_nav_html(get_report_links(get_report_filenames(), "table"))
+	level_list = list(set(frame.display_level))
+	level_list.sort(key=lambda x:(x[:2],int(x[2:])))
+	level_index = {level: i for i, level in enumerate(level_list)}
+
+	estimated_html = get_estimated_html(mode_slst, average_list, estimated_theta, estimated_se, estimated_interval)
+
+	level_mapper = LevelMapper(average_list)
+	# 丸めは静的版の f"{x:.2f}" と揃えるため Python の round を使う
+	def round_list(values: np.ndarray) -> List[float]:
+		return [round(x, 2) for x in values.tolist()]
+
+	stella_easy = round_list(level_mapper.to_stella(frame.beta_easy))
+	stella_hard = round_list(level_mapper.to_stella(frame.beta_hard))
+	jiriki = round_list(frame.alpha / 2)
+	prob_easy = round_list(prob_grm(estimated_theta, frame.beta_easy, frame.alpha) * 100)
+	prob_hard = round_list(prob_grm(estimated_theta, frame.beta_hard, frame.alpha) * 100)
+	score_rate_list = round_list(frame.score_rate * 100)
+	gain_list = round_list(PPRanking(frame, level_mapper).marginal_gain(level_mapper))
+	has_score_list = frame.has_score.tolist()
+	clear_list = frame.clear.tolist()
+	minbp_list = frame.minbp.tolist()
+
+	charts = []
+	for i in range(len(frame)):
+		lamp = clear_list[i]
+		minbp = None
+		score_rate = None
+		next_lamp = DICT_LAMP["Easy"]
+		prob = prob_easy[i]
+		if has_score_list[i]:
+			minbp = minbp_list[i]
+			score_rate = score_rate_list[i]
+			next_clear = get_next_clear_type(lamp)
+			if next_clear == "Easy":
+				prob = prob_easy[i]
+			elif next_clear == "Hard":
+				prob = prob_hard[i]
+			else:
+				prob = None
+			next_lamp = DICT_LAMP[next_clear] if next_clear else 0
+		title = frame.title[i]
+		if len(title) >= 50:
+			title = title[:47]+'...'
+		charts.append([
+			title,
+			frame.sha256[i],
+			level_index[frame.display_level[i]],
+			stella_easy[i],
+			stella_hard[i],
+			jiriki[i],
+			min(lamp, 8),
+			minbp,
+			score_rate,
+			next_lamp,
+			prob,
+			None if gain_list[i] != gain_list[i] else gain_list[i],
+		])
+
+	payload = json.dumps(
+		{"prefix": mode_slst, "levels": level_list, "charts": charts},
+		ensure_ascii=False,
+		separators=(",", ":")
+	).replace("</", "<\\/")
+
+	with HtmlWriter(filename_table) as writer:
+		writer.write(HTML_HEAD_TEMPLATE.format(style = HTML_STYLE_COMMON + HTML_STYLE_TAB + HTML_STYLE_TABLE + HTML_STYLE_VIRTUAL))
+		writer.write(f"""
+	<h1>Shobon Stella Recommend</h1>
+{nav_html}{estimated_html}""")
+		writer.write(HTML_FILTER_TEMPLATE.format(lamp_filter_html = get_lamp_filter_html()))
+		writer.write("""
+	<div class="tab" id="tabs"></div>
+	<div class="scroller" id="scroller">
+		<table id="table">
+			<thead>
+				<tr>
+					<th onclick="sortTable(0)">タイトル</th>
+					<th onclick="sortTable(1)">推定(E)</th>
+					<th onclick="sortTable(2)">推定(H)</th>
+					<th onclick="sortTable(3)">地力度</th>
+					<th onclick="sortTable(4)">ランプ</th>
+					<th onclick="sortTable(5)">最小BP</th>
+					<th onclick="sortTable(6)">スコア</th>
+					<th onclick="sortTable(7)">次の目標</th>
+					<th onclick="sortTable(8)">達成確率</th>
+					<th onclick="sortTable(9)">pp gain</th>
+				</tr>
+			</thead>
+			<tbody id="tbody"></tbody>
+		</table>
+	</div>
+	<div class="row-count" id="row-count"></div>
+	<script type="application/json" id="chart-data">""")
+		writer.write(payload)
+		writer.write("</script>\n")
+		writer.write(JSON_TABLE_SCRIPT)
+	return
+
+# おすすめページの行
+RECOMMEND_ROW_TEMPLATE = (
+	'<tr class="chart-row">'
+	'<td data-value="{title}"><a href="https://mocha-repository.info/song.php?sha256={sha256}">{title}</a></td>'
+	'<td data-value="{dislv}">{dislv}</td>'
+	'<td data-value="{lv}">{lv}</td>'
+	'<td data-value="{nextlampnum}">{nextlamp}</td>'
+	'<td data-value="{lampnum}" class="{colorclass}">{lamp}</td>'
+	'<td data-value="{prob}">{prob}</td>'
+	'<td data-value="{gain}">{gain}</td>'
+	'<td data-value="{expected}">{expected}</td>'
+	'</tr>\n'
+)
+
+# おすすめページのタブ (名前, 達成確率の下限, 上限)
+RECOMMEND_BANDS = [
+	("安定 (70%〜)", 0.7, 1.0),
+	("適正 (40〜70%)", 0.4, 0.7),
+	("挑戦 (10〜40%)", 0.1, 0.4),
+]
+
+# おすすめページ: 達成確率の帯ごとに期待 pp の大きい譜面を並べる
+def generate_html_recommend(
+	index: RecommendIndex,
+	filename_recommend: str,
+	top: int = 30,
+	bands: List[Tuple[str, float, float]] = RECOMMEND_BANDS,
+	nav_html: str = None
+):
+	if nav_html is None:
+		nav_html = get_nav_html(get_report_links(get_report_filenames(), "recommend"))
+
+	def rows(records):
+		for record in records:
+			prefix = record["display_level"][:2]
+			yield {
+				"title": get_display_title(record["title"]),
+				"sha256": record["sha256"],
+				"dislv": record["display_level"],
+				"lv": f"{prefix}{record['stella']:.2f}",
+				"nextlampnum": DICT_LAMP[record["next_lamp"]],
+				"nextlamp": record["next_lamp"],
+				"lampnum": DICT_LAMP[record["lamp"]],
+				"colorclass": LAMP_COLOR_CLASS[record["lamp"]],
+				"lamp": record["lamp"],
+				"prob": f"{record['prob'] * 100:.2f} %",
+				"gain": f"{record['pp_gain']:.2f}pp",
+				"expected": f"{record['expected_pp']:.2f}pp",
+			}
+
+	with HtmlWriter(filename_recommend) as writer:
+		writer.write(HTML_HEAD_TEMPLATE.format(style = HTML_STYLE_COMMON + HTML_STYLE_TAB + HTML_STYLE_TABLE))
+		writer.write(f"""
+	<h1>Shobon Stella Recommend - おすすめ</h1>
+{nav_html}	<h3>次のランプの達成確率ごとに, 期待 pp (達成確率 × pp gain) の大きい譜面を並べています</h3>
+""")
+		writer.write(HTML_FILTER_TEMPLATE.format(lamp_filter_html = get_lamp_filter_html()))
+		writer.write('\t<div class="tab">\n')
+		for i, (name, min_prob, max_prob) in enumerate(bands):
+			active_class = " active" if i == 0 else ""
+			writer.write(f"""		<button class="tablinks{active_class}" onclick="openTab(event, 'tab-content-{i}')">{html.escape(name)}</button>\n""")
+		writer.write("\t</div>\n")
+
+		for i, (name, min_prob, max_prob) in enumerate(bands):
+			display_style = "display: block;" if i == 0 else ""
+			writer.write(f"""
+	<div id="tab-content-{i}" class="tabcontent" style="{display_style}">
+		<table id="table-{i}">
+			<thead>
+				<tr>
+					<th onclick="sortTable({i}, 0, 'text')">タイトル</th>
+					<th onclick="sortTable({i}, 1, 'smart-number')">表</th>
+					<th onclick="sortTable({i}, 2, 'smart-number')">推定</th>
+					<th onclick="sortTable({i}, 3, 'number')">次の目標</th>
+					<th onclick="sortTable({i}, 4, 'number')">ランプ</th>
+					<th onclick="sortTable({i}, 5, 'smart-number')">達成確率</th>
+					<th onclick="sortTable({i}, 6, 'smart-number')">pp gain</th>
+					<th onclick="sortTable({i}, 7, 'smart-number')">期待 pp</th>
+				</tr>
+			</thead>
+			<tbody>
+""")
+			writer.write_rows(RECOMMEND_ROW_TEMPLATE, rows(index.query(min_prob, max_prob, top)))
+			writer.write("</tbody></table></div>")
+
+		writer.write(TABLE_SCRIPT)
+	return
+
+def generate_html(
+	score_list: List[dict],
+	song_list: List[dict],
+	mode_slst: str,
+	filename_table = "result_table.html",
+	filename_top100 = "result_top100.html",
+	theta0: float = None,
+	report_mode: str = "static",
+	filename_recommend = "result_recommend.html"
+):
+
+	average_list = get_average_list(song_list, mode_slst)
+	frame = ChartFrame.from_lists(score_list, song_list)
+	filenames = {"table": filename_table, "top100": filename_top100, "recommend": filename_recommend}
+
+	result = generate_table_reports(frame, mode_slst, average_list, filenames, theta0, report_mode)
+	index = RecommendIndex([(mode_slst, frame, LevelMapper(average_list), result.x)])
+	generate_html_recommend(index, filename_recommend, nav_html = get_nav_html(get_report_links(filenames, "recommend")))
+	return result
+
+# 1 つの表の theta を推定して難易度表ページと TOP100 ページを作る
+def generate_table_reports(
+	frame: ChartFrame,
+	mode_slst: str,
+	average_list: List[float],
+	filenames: Dict[str, str],
+	theta0: float = None,
+	report_mode: str = "static",
+	other_tables: List[Tuple[str, str]] = None,
+	progress: Callable[[str], None] = None,
+	check_cancel: Callable[[], None] = None,
+	bootstrap: BootstrapOptions = None,
+	history: ScoreHistory = None,
+	history_period: int = HISTORY_PERIODS["week"],
+	open_page: Callable[[str], object] = None
+) -> ThetaEstimate:
+	if open_page is None:
+		open_page = lambda filename: filename
+	if check_cancel is not None:
+		check_cancel()
+	with metrics.stage("estimate", mode_slst):
+		result = estimate_theta(frame, theta0)
+	if not result.success:
+		raise RuntimeError(f"最尤推定に失敗しました. {result.message}")
+	if bootstrap is not None:
+		with metrics.stage("bootstrap", mode_slst):
+			result.interval = bootstrap_interval(frame.likelihood_model(), bootstrap, result.x)
+	if progress is not None:
+		progress("estimate")
+
+	estimated_theta = result.x
+	estimated_se = result.se
+	print(f"Estimated: {mode_slst}{beta_to_stella(average_list, estimated_theta):.2f} ± {stella_error(average_list, estimated_theta, estimated_se):.2f}")
+	if result.interval is not None:
+		low, median, high = [beta_to_stella(average_list, x) for x in result.interval]
+		print(f"Bootstrap: 5% {mode_slst}{low:.2f} / 50% {mode_slst}{median:.2f} / 95% {mode_slst}{high:.2f}")
+
+	if check_cancel is not None:
+		check_cancel()
+	nav_html = get_nav_html(get_report_links(filenames, "table", other_tables))
+	with metrics.stage("table", mode_slst):
+		if report_mode == "json":
+			generate_html_table_json(frame, mode_slst, average_list, estimated_theta, open_page(filenames["table"]), estimated_se, nav_html, result.interval)
+		else:
+			generate_html_table(frame, mode_slst, average_list, estimated_theta, open_page(filenames["table"]), estimated_se, nav_html, result.interval)
+	if progress is not None:
+		progress("table")
+	if check_cancel is not None:
+		check_cancel()
+	rating_history = None
+	if history is not None:
+		with metrics.stage("history", mode_slst):
+			rating_history = compute_rating_history(frame, LevelMapper(average_list), history, history_period)
+		result.history = rating_history
+	nav_html = get_nav_html(get_report_links(filenames, "top100", other_tables))
+	with metrics.stage("top100", mode_slst):
+		generate_html_top100(frame, mode_slst, average_list, estimated_theta, open_page(filenames["top100"]), nav_html, rating_history)
+	if progress is not None:
+		progress("top100")
+	return result
+
+# 複数の難易度表のページを 1 回でまとめて作る (score.db は呼び出し側で 1 度だけ読んでおく)
+# 表が 1 つなら今までと同じファイル名, 複数なら result_table_<表の名前>.html のようにする
+# おすすめページは全部の表をまとめた 1 ページ
+# progress(段階, 終わった表の数, 表の数) は段階が終わるたびに呼ばれる (GUI の進捗表示)
+# check_cancel() は段階を始める前に呼ばれ, 例外を投げればそこで止まる (GUI の中止)
+# bootstrap を渡すと推定の 90% 区間も求めて難易度表ページに出す
+# history (registry.sha256 の並びのスコアの履歴) を渡すと実力の推移を求めて TOP100 ページに出す
+# outputs (dict) を渡すとファイルには書かず, outputs[ファイル名] の io.StringIO に書く (サーバーモード)
+def generate_html_tables(
+	score_list: List[dict],
+	registry: TableRegistry,
+	output_dir: str = "",
+	theta0: Dict[str, float] = None,
+	report_mode: str = "static",
+	progress: Callable[[str, int, int], None] = None,
+	check_cancel: Callable[[], None] = None,
+	bootstrap: BootstrapOptions = None,
+	history: ScoreHistory = None,
+	history_period: int = HISTORY_PERIODS["week"],
+	outputs: Dict[str, object] = None
+) -> Dict[str, ThetaEstimate]:
+	if theta0 is None:
+		theta0 = dict()
+
+	def open_page(filename: str):
+		if outputs is None:
+			return filename
+		import io
+		outputs[filename] = io.StringIO()
+		return outputs[filename]
+
+	# 1 譜面もプレイしていない表は飛ばす (全部の表がそうなら従来どおり全部の表を作る)
+	all_tables = list(zip(registry.names, [mode_slst for _, mode_slst, _ in registry.tables], registry.frames(score_list), registry.positions))
+	tables = [entry for entry in all_tables if entry[2].played.any()]
+	if tables:
+		for name, _, frame, _ in all_tables:
+			if not frame.played.any():
+				print(f"{name}: プレイデータがないので飛ばします")
+	else:
+		tables = all_tables
+	names = [name for name, _, _, _ in tables]
+	single = len(registry) == 1
+	filenames = {name: get_report_filenames(output_dir, None if single else name) for name in names}
+
+	results = dict()
+	recommend_tables = []
+	for k, (name, mode_slst, frame, positions) in enumerate(tables):
+		average_list = registry.average_lists[name]
+		other_tables = [(other, filenames[other]["table"]) for other in names if other != name]
+		table_progress = None
+		if progress is not None:
+			table_progress = lambda stage, done = k + 1: progress(stage, done, len(tables))
+		table_history = None
+		if history is not None:
+			table_history = history.take(positions, len(registry.sha256))
+		result = generate_table_reports(frame, mode_slst, average_list, filenames[name], theta0.get(name), report_mode, other_tables, table_progress, check_cancel, bootstrap, table_history, history_period, open_page)
+		results[name] = result
+		recommend_tables.append((name, frame, LevelMapper(average_list), result.x))
+
+	if single:
+		links = get_report_links(filenames[names[0]], "recommend")
+	else:
+		links = []
+		for name in names:
+			links.append((filenames[name]["table"], f"{name} 難易度表 ページへ ➜"))
+			links.append((filenames[name]["top100"], f"{name} TOP100 ページへ ➜"))
+	filename_recommend = get_report_filenames(output_dir)["recommend"]
+	if check_cancel is not None:
+		check_cancel()
+	with metrics.stage("recommend"):
+		generate_html_recommend(RecommendIndex(recommend_tables), open_page(filename_recommend), nav_html = get_nav_html(links))
+	if progress is not None:
+		progress("recommend", 1, 1)
+	return results
+
+# 結果キャッシュの既定の置き場所と大きさの上限 (超えたら最後に使ったのが古いものから消す)
+RESULT_CACHE_PATH = os.path.join(".cache", "results.db")
+RESULT_CACHE_MAX_BYTES = 256 << 20
+# 推定や HTML の作り方を変えたら上げる (main.py の内容のハッシュか, main.exe の大きさと更新時刻も鍵に入れる)
+RESULT_CACHE_VERSION = 2
+
+# score.db の内容の指紋 (score の行数・最新の date・clear / minbp / 判定数の合計, player の行数・最新の date・playcount)
+# スナップショットは作らず mode=ro で集計だけ読む. ロック中なら open_score_snapshot と同じくやり直す
+def get_score_db_fingerprint(directory: str, retries: int = 8, delay: float = 0.05) -> list:
+	import pathlib
+	if not os.path.exists(directory):
+		raise FileNotFoundError(directory)
+	uri = pathlib.Path(os.path.abspath(directory)).as_uri() + "?mode=ro"
+	for attempt in range(retries + 1):
+		try:
+			con = sqlite3.connect(uri, uri=True, timeout=0)
+			try:
+				con.execute("BEGIN")
+				ret = list(con.execute("SELECT COUNT(*), MAX(date), TOTAL(clear), TOTAL(minbp), TOTAL(epg + lpg + egr + lgr) FROM score").fetchone())
+				if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player'").fetchone() is not None:
+					ret += list(con.execute("SELECT COUNT(*), MAX(date), MAX(playcount) FROM player").fetchone())
+				return ret
+			finally:
+				con.close()
+		except sqlite3.OperationalError as e:
+			if not is_busy_error(e) or attempt == retries:
+				raise
+			time.sleep(delay * (2 ** attempt))
+
+# コードの版 (RESULT_CACHE_VERSION と実行中の main.py / main.exe のハッシュ)
+_code_version = None
+
+def get_code_version() -> str:
+	global _code_version
+	if _code_version is None:
+		try:
+			if getattr(sys, "frozen", False):
+				# main.exe は大きいので中身は読まず, 大きさと更新時刻を版にする
+				stat = os.stat(sys.executable)
+				code_hash = f"{stat.st_size}:{stat.st_mtime_ns}"
+			else:
+				code_hash = get_file_hash(os.path.abspath(__file__))
+		except OSError:
+			code_hash = ""
+		_code_version = f"{RESULT_CACHE_VERSION}:{code_hash}"
+	return _code_version
+
+# 結果キャッシュの鍵 (score.db の指紋・CSV の内容のハッシュ・出力の設定・コードの版のハッシュ)
+def get_result_cache_key(score_dir: str, csv_dirs: List[str], report_mode: str, bootstrap: BootstrapOptions, history_period: int) -> str:
+	import hashlib
+	parts = {
+		"version": get_code_version(),
+		"score_db": get_score_db_fingerprint(score_dir),
+		"csv": [get_file_hash(csv_dir) for csv_dir in csv_dirs],
+		"report_mode": report_mode,
+		"bootstrap": None if bootstrap is None else [bootstrap.replicates, bootstrap.seed],
+		"history_period": history_period,
+	}
+	return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+# キャッシュに入れる譜面ごとの列 ("<表の名前>/<列>": 結合したスコアと, 推定した theta での Easy / Hard 以上の確率)
+def get_result_columns(registry: TableRegistry, score_list: List[dict], results: Dict[str, ThetaEstimate]) -> Dict[str, np.ndarray]:
+	columns = dict()
+	for name, frame in zip(registry.names, registry.frames(score_list)):
+		if name not in results:
+			continue
+		theta = results[name].x
+		columns[f"{name}/clear"] = frame.clear
+		columns[f"{name}/minbp"] = frame.minbp
+		columns[f"{name}/score_rate"] = frame.score_rate
+		columns[f"{name}/prob_easy"] = 1.0 / (1.0 + np.exp(- frame.alpha * (theta - frame.beta_easy)))
+		columns[f"{name}/prob_hard"] = 1.0 / (1.0 + np.exp(- frame.alpha * (theta - frame.beta_hard)))
+	return columns
+
+# 1 回分の結果 (表ごとの推定, summary, ページの HTML, 譜面ごとの列)
+# pages はファイル名 (出力先からの相対パス) → 書き出した HTML のバイト列で, キャッシュに入れるときだけ持つ (write で出力先に書き出す)
+# キャッシュから読んだ列は使うときに初めて展開する
+class ReportResult:
+	def __init__(self, results: Dict[str, ThetaEstimate], summary: Dict[str, dict], pages: Dict[str, bytes], columns, entry: str, scores: int, cached: bool = False):
+		self.results = results
+		self.summary = summary
+		self.pages = pages
+		self._columns = columns
+		# 最初に開くページ (最初の表の難易度表ページ) と, 読み込んだスコアの数
+		self.entry = entry
+		self.scores = scores
+		self.cached = cached
+
+	@property
+	def columns(self) -> Dict[str, np.ndarray]:
+		if isinstance(self._columns, bytes):
+			import io
+			with np.load(io.BytesIO(self._columns)) as npz:
+				self._columns = {name: npz[name] for name in npz.files}
+		return self._columns
+
+	# 書き出したときのバイト列のまま書く (文字列に戻さない)
+	def write(self, output_dir: str = ""):
+		if output_dir:
+			os.makedirs(output_dir, exist_ok=True)
+		for filename, data in self.pages.items():
+			path = os.path.join(output_dir, filename)
+			with open(path, "wb") as f:
+				f.write(data)
+			print(f"ファイルを作成しました: {path}")
+
+	# キャッシュに入れる形 (結果の JSON, 圧縮した列)
+	def encode(self) -> Tuple[str, bytes]:
+		results = {
+			name: {
+				"x": float(result.x), "se": float(result.se), "success": bool(result.success), "message": result.message,
+				"nfev": int(result.nfev), "nit": int(result.nit), "interval": result.interval, "history": result.history,
+			}
+			for name, result in self.results.items()
+		}
+		text = json.dumps({"results": results, "summary": self.summary, "entry": self.entry, "scores": self.scores}, ensure_ascii=False)
+		columns = self._columns
+		if not isinstance(columns, bytes):
+			import io
+			buffer = io.BytesIO()
+			np.savez_compressed(buffer, **columns)
+			columns = buffer.getvalue()
+		return text, columns
+
+	@classmethod
+	def decode(cls, text: str, columns: bytes, pages: Dict[str, bytes]) -> "ReportResult":
+		data = json.loads(text)
+		results = dict()
+		for name, value in data["results"].items():
+			result = ThetaEstimate(value["x"], value["se"], value["success"], value["message"], value["nfev"], value["nit"])
+			result.interval = value["interval"]
+			result.history = value["history"]
+			results[name] = result
+		return cls(results, data["summary"], pages, columns, data["entry"], data["scores"], cached = True)
+
+# 結果を鍵ごとに保存する SQLite のキャッシュ
+# ページは圧縮せずに 1 ページ 1 行で持ち, 当たったときは読んでそのまま書き出すだけにする
+# 使うたびに accessed を更新し, 合計が max_bytes を超えたら accessed の古いものから消す (LRU)
+# キャッシュが読めない・書けないときは何もしない (毎回作り直すだけ)
+class ResultCache:
+	def __init__(self, path: str = RESULT_CACHE_PATH, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+		self.path = path
+		self.max_bytes = max_bytes
+
+	def connect(self) -> sqlite3.Connection:
+		directory = os.path.dirname(os.path.abspath(self.path))
+		os.makedirs(directory, exist_ok=True)
+		con = sqlite3.connect(self.path, timeout=30)
+		con.execute("""
+			CREATE TABLE IF NOT EXISTS result (
+				key TEXT PRIMARY KEY,
+				accessed REAL NOT NULL,
+				size INTEGER NOT NULL,
+				results TEXT NOT NULL,
+				columns BLOB NOT NULL
+			)
+		""")
+		con.execute("""
+			CREATE TABLE IF NOT EXISTS page (
+				key TEXT NOT NULL,
+				filename TEXT NOT NULL,
+				content BLOB NOT NULL,
+				PRIMARY KEY(key, filename)
+			)
+		""")
+		return con
+
+	def get(self, key: str) -> ReportResult:
+		try:
+			con = self.connect()
+			try:
+				row = con.execute("SELECT results, columns FROM result WHERE key = ?", (key,)).fetchone()
+				if row is None:
+					return None
+				pages = dict(con.execute("SELECT filename, content FROM page WHERE key = ? ORDER BY rowid", (key,)).fetchall())
+				with con:
+					con.execute("UPDATE result SET accessed = ? WHERE key = ?", (time.time(), key))
+			finally:
+				con.close()
+			return ReportResult.decode(row[0], row[1], pages)
+		except (sqlite3.Error, OSError, ValueError, KeyError):
+			return None
+
+	def put(self, key: str, report: ReportResult):
+		text, columns = report.encode()
+		size = len(text.encode("utf-8")) + len(columns) + sum(len(data) for data in report.pages.values())
+		try:
+			con = self.connect()
+			try:
+				with con:
+					self.delete(con, key)
+					con.execute("INSERT INTO result VALUES (?, ?, ?, ?, ?)", (key, time.time(), size, text, columns))
+					con.executemany("INSERT INTO page VALUES (?, ?, ?)", [(key, filename, data) for filename, data in report.pages.items()])
+					self.evict(con)
+			finally:
+				con.close()
+		except (sqlite3.Error, OSError):
+			pass
+
+	@staticmethod
+	def delete(con: sqlite3.Connection, key: str):
+		con.execute("DELETE FROM result WHERE key = ?", (key,))
+		con.execute("DELETE FROM page WHERE key = ?", (key,))
+
+	def evict(self, con: sqlite3.Connection):
+		total = con.execute("SELECT TOTAL(size) FROM result").fetchone()[0]
+		if total <= self.max_bytes:
+			return
+		for key, size in con.execute("SELECT key, size FROM result ORDER BY accessed").fetchall():
+			self.delete(con, key)
+			total -= size
+			if total <= self.max_bytes:
+				break
+
+# CSV と score.db を読んで全部の表のページを作り, output_dir に書き出す
+# cache を渡すと, 鍵 (score.db の指紋・CSV のハッシュ・設定・コードの版) が同じなら
+# CSV も score.db も読まずにキャッシュのページを書き出すだけにし, 違えば作り直してキャッシュに入れる
+# log を渡すと読み込みの進み具合を知らせる (GUI のログ)
+def build_reports(
+	score_dir: str,
+	csv_dirs: List[str],
+	output_dir: str = "",
+	cache: ResultCache = None,
+	report_mode: str = "static",
+	bootstrap: BootstrapOptions = None,
+	history_period: int = HISTORY_PERIODS["week"],
+	registry: TableRegistry = None,
+	progress: Callable[[str, int, int], None] = None,
+	check_cancel: Callable[[], None] = None,
+	log: Callable[[str], None] = None
+) -> ReportResult:
+	if log is None:
+		log = lambda message: None
+	key = None
+	if cache is not None:
+		with metrics.stage("cache"):
+			key = get_result_cache_key(score_dir, csv_dirs, report_mode, bootstrap, history_period)
+			report = cache.get(key)
+			if report is not None:
+				log("前回と同じデータなので保存しておいた結果を使います")
+				report.write(output_dir)
+				if progress is not None:
+					for stage, _ in PIPELINE_STAGES:
+						progress(stage, 1, 1)
+				return report
+
+	if check_cancel is not None:
+		check_cancel()
+	if registry is None:
+		log("CSVを解析しています...")
+		with metrics.stage("csv"):
+			registry = TableRegistry.load(csv_dirs)
+		for name, mode_slst, table in registry.tables:
+			log(f"CSV解析完了: {name} 全 {len(table)} 曲")
+	if progress is not None:
+		progress("csv", 1, 1)
+
+	if check_cancel is not None:
+		check_cancel()
+	log("DBを読み込んでいます...")
+	history = None
+	with metrics.stage("db"), score_connection(score_dir) as con:
+		score_list = get_best_score_list(con, registry.sha256)
+		if history_period is not None:
+			history = get_score_history(con, registry.sha256)
+	log(f"DB読み込み完了: {len(score_list)} 件のスコアデータ")
+	if progress is not None:
+		progress("db", 1, 1)
+
+	# ページはファイルへ直接書き出し, キャッシュに入れるときだけ書いたファイルを読み戻す
+	if output_dir:
+		os.makedirs(output_dir, exist_ok=True)
+	results = generate_html_tables(
+		score_list, registry, output_dir, report_mode = report_mode, progress = progress, check_cancel = check_cancel,
+		bootstrap = bootstrap, history = history, history_period = history_period
+	)
+	single = len(registry) == 1
+	entry = get_report_filenames("", None if single else next(iter(results)))["table"]
+	report = ReportResult(results, get_table_summary(registry, results), dict(), get_result_columns(registry, score_list, results), entry, len(score_list))
+	if cache is not None:
+		with metrics.stage("cache"):
+			paths = {get_report_filenames(output_dir)["recommend"]}
+			for name in results:
+				filenames = get_report_filenames(output_dir, None if single else name)
+				paths.update([filenames["table"], filenames["top100"]])
+			for path in sorted(paths):
+				with open(path, "rb") as f:
+					report.pages[os.path.basename(path)] = f.read()
+			cache.put(key, report)
+	return report
+
+# バッチ処理のワーカーで共有する難易度表
+# 親プロセスが作ったコンパイル済み譜面表をワーカーごとに 1 度だけ mmap で読み込む
+_batch_registry = None
+_batch_csv_dirs = None
+
+def _init_batch_worker(csv_dirs: List[str]):
+	global _batch_registry, _batch_csv_dirs
+	_batch_registry = TableRegistry.load(csv_dirs)
+	_batch_csv_dirs = csv_dirs
+
+# 推定結果を表ごとに sl/st の値にまとめる (summary.json と表示用)
+def get_table_summary(registry: TableRegistry, results: Dict[str, ThetaEstimate]) -> Dict[str, dict]:
+	ret = dict()
+	for name, mode_slst, table in registry.tables:
+		if name not in results:
+			continue
+		average_list = registry.average_lists[name]
+		ret[name] = {
+			"theta": results[name].x,
+			"se": results[name].se,
+			"stella": beta_to_stella(average_list, results[name].x),
+			"label": f"{mode_slst}{beta_to_stella(average_list, results[name].x):.2f}",
+		}
+		if results[name].interval is not None:
+			ret[name]["stella_interval"] = [beta_to_stella(average_list, x) for x in results[name].interval]
+	return ret
+
+# 1 人分の score.db を処理して output_dir に HTML を書き出す
+# collect_metrics なら 1 人分の段階ごとの時間と件数も返す (ワーカーごとに記録し直す)
+# history_period (秒) を渡すと実力の推移も TOP100 ページに出す
+def process_player(
+	name: str,
+	score_dir: str,
+	output_dir: str,
+	report_mode: str = "static",
+	collect_metrics: bool = False,
+	bootstrap: BootstrapOptions = None,
+	history_period: int = None,
+	cache: ResultCache = None
+) -> dict:
+	if collect_metrics:
+		enable_metrics(trace_memory = False)
+	try:
+		report = build_reports(score_dir, _batch_csv_dirs, output_dir, cache, report_mode, bootstrap, history_period, _batch_registry)
+		ret = {
+			"name": name,
+			"score_db": score_dir,
+			"output_dir": output_dir,
+			"scores": report.scores,
+			"cached": report.cached,
+			"tables": report.summary,
+		}
+		if collect_metrics:
+			ret["metrics"] = metrics.to_dict()
+		return ret
+	finally:
+		if collect_metrics:
+			disable_metrics()
+
+# ディレクトリ以下の score.db (名前は親フォルダ名) かマニフェスト (1 行に "名前,パス" または "パス") から score.db の一覧を作る
+# beatoraja のフォルダにある scorelog.db や songdata.db などは拾わない
+def find_score_dbs(path: str) -> List[Tuple[str, str]]:
+	entries = []
+	if os.path.isdir(path):
+		for dirpath, dirnames, filenames in os.walk(path):
+			dirnames.sort()
+			if "score.db" in filenames:
+				entries.append((os.path.basename(os.path.abspath(dirpath)), os.path.join(dirpath, "score.db")))
+	else:
+		base_dir = os.path.dirname(os.path.abspath(path))
+		with open(path, encoding="utf-8") as file:
+			for line in file:
+				line = line.strip()
+				if not line or line.startswith("#"):
+					continue
+				if "," in line:
+					name, score_dir = [x.strip() for x in line.split(",", 1)]
+				else:
+					score_dir = line
+					name = os.path.basename(os.path.dirname(os.path.abspath(os.path.join(base_dir, score_dir))))
+				entries.append((name, os.path.join(base_dir, score_dir)))
+
+	# 名前が重複したら連番を付ける
+	ret = []
+	used = dict()
+	for name, score_dir in entries:
+		if name in used:
+			used[name] += 1
+			name = f"{name}_{used[name]}"
+		else:
+			used[name] = 0
+		ret.append((name, score_dir))
+	return ret
+
+# 複数の score.db をプロセスプールで並列に処理する
+# バッチでは人ごとにワーカーへ分けるので, ブートストラップは各ワーカーの中で 1 プロセスで回す
+# cache を渡すと前回と同じ score.db の人はキャッシュのページを書き出すだけにする
+def run_batch(
+	source: str,
+	csv_dirs: List[str],
+	output_root: str,
+	workers: int = None,
+	report_mode: str = "static",
+	bootstrap: BootstrapOptions = None,
+	history_period: int = None,
+	cache: ResultCache = None
+) -> List[dict]:
+	from concurrent.futures import ProcessPoolExecutor, as_completed
+
+	if bootstrap is not None:
+		bootstrap = BootstrapOptions(bootstrap.replicates, bootstrap.seed, 1, bootstrap.block_size)
+	players = find_score_dbs(source)
+	print(f"{len(players)} 人分の score.db が見つかりました")
+	with metrics.stage("csv"):
+		TableRegistry.load(csv_dirs)
+	os.makedirs(output_root, exist_ok=True)
+
+	results = []
+	with ProcessPoolExecutor(max_workers = workers, initializer = _init_batch_worker, initargs = (csv_dirs,)) as executor:
+		futures = dict()
+		for name, score_dir in players:
+			output_dir = os.path.join(output_root, name)
+			future = executor.submit(process_player, name, score_dir, output_dir, report_mode, metrics.enabled, bootstrap, history_period, cache)
+			futures[future] = (name, score_dir)
+		for future in as_completed(futures):
+			name, score_dir = futures[future]
+			try:
+				ret = future.result()
+				ret["error"] = None
+				print(f"[OK] {name}: {' '.join(table['label'] for table in ret['tables'].values())}{' (キャッシュ)' if ret['cached'] else ''}")
+			except Exception as e:
+				# 1 人分の失敗でバッチ全体は止めない
+				ret = {"name": name, "score_db": score_dir, "error": f"{type(e).__name__}: {e}"}
+				print(f"[NG] {name}: {ret['error']}")
+			results.append(ret)
+
+	results.sort(key = lambda x: x["name"])
+	with open(os.path.join(output_root, "summary.json"), "w", encoding="utf-8") as f:
+		json.dump(results, f, ensure_ascii=False, indent=2)
+	return results
+
+# 1 人分の score.db から表ごとに (ランプのある譜面の番号, 結果) を読む (較正用)
+def read_outcome_rows(score_dir: str) -> List[Tuple[np.ndarray, np.ndarray]]:
+	with score_connection(score_dir) as con:
+		score_list = get_best_score_list(con, _batch_registry.sha256)
+	_, clear, _, _ = get_score_columns(score_list, _batch_registry.sha256)
+	outcome = get_outcome_codes(clear)
+	ret = []
+	for positions in _batch_registry.positions:
+		index = np.flatnonzero(outcome[positions] >= 0)
+		ret.append((index, outcome[positions][index]))
+	return ret
+
+# 複数の score.db から表ごとの OutcomeMatrix を作る (行は players の順, 読めなかった score.db は飛ばす)
+def load_outcome_matrices(players: List[Tuple[str, str]], csv_dirs: List[str], workers: int = None) -> Tuple[List[OutcomeMatrix], List[str]]:
+	registry = TableRegistry.load(csv_dirs)
+	if workers is not None and workers <= 1:
+		_init_batch_worker(csv_dirs)
+		futures = None
+	else:
+		from concurrent.futures import ProcessPoolExecutor
+		executor = ProcessPoolExecutor(max_workers = workers, initializer = _init_batch_worker, initargs = (csv_dirs,))
+		futures = [executor.submit(read_outcome_rows, score_dir) for _, score_dir in players]
+
+	names = []
+	rows = [[] for _ in range(len(registry))]
+	try:
+		for i, (name, score_dir) in enumerate(players):
+			try:
+				ret = read_outcome_rows(score_dir) if futures is None else futures[i].result()
+			except Exception as e:
+				# 1 人分の失敗で較正全体は止めない
+				print(f"[NG] {name}: {type(e).__name__}: {e}")
+				continue
+			names.append(name)
+			for table_rows, row in zip(rows, ret):
+				table_rows.append(row)
+	finally:
+		if futures is not None:
+			executor.shutdown()
+
+	matrices = []
+	for (_, _, table), table_rows in zip(registry.tables, rows):
+		indptr = np.concatenate([[0], np.cumsum([len(index) for index, _ in table_rows], dtype=np.int64)])
+		chart_index = np.concatenate([index for index, _ in table_rows]) if table_rows else np.empty(0, dtype=np.int64)
+		outcome = np.concatenate([outcome for _, outcome in table_rows]) if table_rows else np.empty(0, dtype=np.int8)
+		matrices.append(OutcomeMatrix(indptr, chart_index, outcome, len(table)))
+	metrics.count("rows_loaded", int(sum(len(matrix.outcome) for matrix in matrices)))
+	return matrices, names
+
+# 難易度表を mocha の CSV と同じ形式 (BOM 付き UTF-8, パラメータは小数 3 桁) で書き出す
+def write_song_list(path: str, song_list: List[dict]):
+	fields = ["title", "display_level", "md5", "sha256", "beta_easy", "beta_hard", "alpha", "has_data"]
+	with open(path, "w", encoding="utf-8-sig", newline="") as f:
+		writer = csv.writer(f, lineterminator="\n")
+		writer.writerow(fields)
+		for song in song_list:
+			writer.writerow([song[field] for field in fields])
+
+# 較正した譜面のパラメータで song_list を作る (較正しなかった譜面は元の値のまま)
+# 小数 3 桁に丸めても beta_hard - beta_easy が 0.01 以上残るようにする
+def get_calibrated_song_list(table: ChartTable, result: CalibrationResult) -> List[dict]:
+	beta_easy = np.round(result.beta_easy, 3)
+	beta_hard = np.maximum(np.round(result.beta_hard, 3), beta_easy + 0.01)
+	alpha = np.round(result.alpha, 3)
+	song_list = table.to_song_list()
+	for i in np.flatnonzero(result.fitted).tolist():
+		song_list[i]["beta_easy"] = f"{beta_easy[i]:.3f}"
+		song_list[i]["beta_hard"] = f"{beta_hard[i]:.3f}"
+		song_list[i]["alpha"] = f"{alpha[i]:.3f}"
+	for song in song_list:
+		for field in ("beta_easy", "beta_hard", "alpha"):
+			if not isinstance(song[field], str):
+				song[field] = f"{song[field]:.3f}"
+	return song_list
+
+# 多人数の score.db から譜面のパラメータを推定し直し, 表ごとに output_dir/<CSV の名前> に書き出す
+def run_calibration(source: str, csv_dirs: List[str], output_dir: str, options: CalibrationOptions = None, workers: int = None) -> List[CalibrationResult]:
+	if options is None:
+		options = CalibrationOptions()
+	players = find_score_dbs(source)
+	print(f"{len(players)} 人分の score.db が見つかりました")
+	with metrics.stage("db"):
+		matrices, names = load_outcome_matrices(players, csv_dirs, workers)
+	os.makedirs(output_dir, exist_ok=True)
+
+	results = []
+	for csv_dir, matrix in zip(csv_dirs, matrices):
+		table = load_chart_table(csv_dir)
+		with metrics.stage("calibrate", os.path.basename(csv_dir)):
+			result = calibrate_chart_parameters(matrix, table, options)
+		output_path = os.path.join(output_dir, os.path.basename(csv_dir))
+		write_song_list(output_path, get_calibrated_song_list(table, result))
+		status = "収束しました" if result.success else "最大反復回数に到達しました"
+		print(f"{os.path.basename(csv_dir)}: {len(names)} 人 / {len(matrix.outcome)} 件のランプで {int(result.fitted.sum())} / {len(table)} 譜面を較正しました (反復 {result.nit} 回, {status})")
+		print(f"ファイルを作成しました: {output_path}")
+		results.append(result)
+	return results
+
+# 前回からの差分だけ読み込んで再推定し, HTML を作り直す
+# 新しいスコアがなく出力も残っていれば何もしない
+def run_incremental(
+	score_dir: str,
+	csv_dirs: List[str],
+	state_path: str,
+	output_dir: str = "",
+	registry: TableRegistry = None,
+	report_mode: str = "static",
+	bootstrap: BootstrapOptions = None,
+	history_period: int = None
+) -> bool:
+	with score_connection(score_dir) as con:
+		return run_incremental_snapshot(con, csv_dirs, state_path, output_dir, registry, report_mode, bootstrap, history_period)
+
+# run_incremental の本体 (差分の読み込みと推移の読み込みに同じスナップショットを使う)
+def run_incremental_snapshot(
+	con: sqlite3.Connection,
+	csv_dirs: List[str],
+	state_path: str,
+	output_dir: str,
+	registry: TableRegistry,
+	report_mode: str,
+	bootstrap: BootstrapOptions,
+	history_period: int
+) -> bool:
+	state = load_score_state(state_path)
+	is_first = state["max_date"] is None
+	with metrics.stage("db"):
+		score_list, new_rows = update_score_state(con, state)
+	if registry is None:
+		with metrics.stage("csv"):
+			registry = TableRegistry.load(csv_dirs)
+	# プレイのない表は書き出されないので, 前回実際に書いた表のファイルを確かめる
+	outputs_exist = state.get("registry") == registry.names and bool(state.get("tables"))
+	for name in state.get("tables", []):
+		filenames = get_report_filenames(output_dir, None if len(registry) == 1 else name)
+		outputs_exist = outputs_exist and all(os.path.exists(filename) for filename in filenames.values())
+	if not is_first and new_rows == 0 and outputs_exist:
+		print("新しいスコアはありません")
+		return False
+
+	print(f"{new_rows} 件の更新されたスコアを読み込みました")
+	if output_dir:
+		os.makedirs(output_dir, exist_ok=True)
+	# 以前の状態ファイルは theta を 1 つだけ持っている
+	theta0 = state["theta"] if isinstance(state["theta"], dict) else None
+	history = None
+	if history_period is not None:
+		with metrics.stage("db"):
+			history = get_score_history(con, registry.sha256)
+	results = generate_html_tables(score_list, registry, output_dir, theta0, report_mode, bootstrap = bootstrap, history = history, history_period = history_period)
+	state["theta"] = {name: float(result.x) for name, result in results.items()}
+	state["registry"] = registry.names
+	state["tables"] = list(results.keys())
+	save_score_state(state_path, state)
+	return True
+
+# score.db の更新時刻 (WAL ファイルも含む)
+def get_score_db_mtime(score_dir: str) -> float:
+	mtime = os.path.getmtime(score_dir)
+	if os.path.exists(score_dir + "-wal"):
+		mtime = max(mtime, os.path.getmtime(score_dir + "-wal"))
+	return mtime
+
+# score.db を監視して新しいスコアが入ったときだけ作り直す
+def watch_score_db(
+	score_dir: str,
+	csv_dirs: List[str],
+	state_path: str,
+	interval: float = 5.0,
+	output_dir: str = "",
+	report_mode: str = "static",
+	bootstrap: BootstrapOptions = None,
+	history_period: int = None
+):
+	registry = TableRegistry.load(csv_dirs)
+	run_incremental(score_dir, csv_dirs, state_path, output_dir, registry, report_mode, bootstrap, history_period)
+	last_mtime = get_score_db_mtime(score_dir)
+	last_date = load_score_state(state_path)["max_date"]
+	print(f"score.db を監視しています ({interval} 秒間隔, Ctrl+C で終了)")
+	try:
+		while True:
+			time.sleep(interval)
+			mtime = get_score_db_mtime(score_dir)
+			if mtime == last_mtime:
+				continue
+			last_mtime = mtime
+			# 1 回の確認につきスナップショットを 1 つだけ作り, 最新の date の確認と差分の読み込みに使い回す
+			with score_connection(score_dir) as snapshot:
+				# 更新時刻が変わっても score が増えていなければ何もしない
+				max_date = get_max_score_date(snapshot)
+				if last_date is not None and max_date <= last_date:
+					continue
+				run_incremental(snapshot, csv_dirs, state_path, output_dir, registry, report_mode, bootstrap, history_period)
+			last_date = max_date
+	except KeyboardInterrupt:
+		pass
+
+# JSON にない Infinity / NaN を null にする (dict / list の中も)
+def to_json_value(value):
+	if isinstance(value, dict):
+		return {key: to_json_value(x) for key, x in value.items()}
+	if isinstance(value, (list, tuple)):
+		return [to_json_value(x) for x in value]
+	if isinstance(value, (float, np.floating)):
+		return float(value) if math.isfinite(value) else None
+	return value
+
+# ローカルのレポートサーバーが持つ結果
+# 難易度表, まとめたスコア, 表ごとの theta をメモリに持ち, score.db の更新時刻か最新の date が変わったときだけ作り直す
+# ページと JSON は (本体, gzip した本体, ETag, Content-Type) で持つ
+class ReportCache:
+	def __init__(
+		self,
+		score_dir: str,
+		registry: TableRegistry,
+		report_mode: str = "static",
+		bootstrap: BootstrapOptions = None,
+		history_period: int = HISTORY_PERIODS["week"]
+	):
+		import threading
+		self.score_dir = score_dir
+		self.registry = registry
+		self.report_mode = report_mode
+		self.bootstrap = bootstrap
+		self.history_period = history_period
+		self.state = load_score_state()
+		self.mtime = None
+		self.pages: Dict[str, Tuple[bytes, bytes, str, str]] = dict()
+		self.generation = 0
+		self.lock = threading.Lock()
+
+	# score.db が変わっていれば作り直す. 作り直したかどうかを返す
+	def refresh(self) -> bool:
+		with self.lock:
+			mtime = get_score_db_mtime(self.score_dir)
+			if self.pages and mtime == self.mtime:
+				return False
+			with score_connection(self.score_dir) as con:
+				max_date = get_max_score_date(con)
+				self.mtime = mtime
+				if self.pages and max_date == self.state["max_date"]:
+					return False
+				# date が戻ったら別の score.db に差し替わったとみなして読み直す
+				if self.state["max_date"] is not None and max_date < self.state["max_date"]:
+					self.state = load_score_state()
+				with metrics.stage("db"):
+					score_list, new_rows = update_score_state(con, self.state)
+					history = None
+					if self.history_period is not None:
+						history = get_score_history(con, self.registry.sha256)
+			self.rebuild(score_list, history)
+			return True
+
+	def rebuild(self, score_list: List[dict], history: ScoreHistory):
+		outputs = dict()
+		theta0 = self.state["theta"] if isinstance(self.state["theta"], dict) else None
+		results = generate_html_tables(
+			score_list, self.registry, "", theta0, self.report_mode,
+			bootstrap = self.bootstrap, history = history, history_period = self.history_period, outputs = outputs
+		)
+		self.state["theta"] = {name: float(result.x) for name, result in results.items()}
+
+		pages = dict()
+		for filename, buffer in outputs.items():
+			pages["/" + filename] = self.encode(buffer.getvalue(), "text/html; charset=utf-8")
+		summary = get_table_summary(self.registry, results)
+		for name, result in results.items():
+			if result.history is not None:
+				summary[name]["history"] = result.history
+		frames = dict(zip(self.registry.names, self.registry.frames(score_list)))
+		for name in results:
+			top100 = get_sorted_pp_data(self.registry.average_lists[name], frames[name], 100)
+			pages[f"/api/{name}/top100.json"] = self.encode(json.dumps(to_json_value(top100), ensure_ascii=False, allow_nan=False), "application/json; charset=utf-8")
+		self.generation += 1
+		summary = {"max_date": self.state["max_date"], "generation": self.generation, "tables": summary}
+		pages["/api/summary.json"] = self.encode(json.dumps(to_json_value(summary), ensure_ascii=False, allow_nan=False), "application/json; charset=utf-8")
+		pages["/"] = pages["/" + get_report_filenames("", None if len(self.registry) == 1 else next(iter(results)))["table"]]
+		self.pages = pages
+
+	@staticmethod
+	def encode(text: str, content_type: str) -> Tuple[bytes, bytes, str, str]:
+		import gzip
+		import hashlib
+		body = text.encode("utf-8")
+		etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+		return body, gzip.compress(body, 6), etag, content_type
+
+	# 作り直しに失敗しても (beatoraja の書き込み中など) 前の結果があればそれを返す
+	def get(self, path: str) -> Tuple[bytes, bytes, str, str]:
+		try:
+			self.refresh()
+		except Exception as e:
+			if not self.pages:
+				raise
+			print(f"作り直しに失敗したので前の結果を返します: {type(e).__name__}: {e}")
+		return self.pages.get(path)
+
+# ReportCache の内容を返すだけのハンドラ (ETag が一致すれば 304, gzip を受け付けるなら圧縮して返す)
+def make_report_handler():
+	from http.server import BaseHTTPRequestHandler
+	from urllib.parse import urlsplit
+
+	class ReportHandler(BaseHTTPRequestHandler):
+		def do_GET(self):
+			self.send_page(True)
+
+		def do_HEAD(self):
+			self.send_page(False)
+
+		def send_page(self, send_body: bool):
+			try:
+				page = self.server.report.get(urlsplit(self.path).path)
+			except Exception as e:
+				self.send_error(500, f"{type(e).__name__}: {e}")
+				return
+			if page is None:
+				self.send_error(404)
+				return
+			body, gzip_body, etag, content_type = page
+			if etag in [x.strip() for x in self.headers.get("If-None-Match", "").split(",")]:
+				self.send_response(304)
+				self.send_header("ETag", etag)
+				self.end_headers()
+				return
+			use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+			if use_gzip:
+				body = gzip_body
+			self.send_response(200)
+			self.send_header("Content-Type", content_type)
+			self.send_header("Content-Length", str(len(body)))
+			self.send_header("ETag", etag)
+			self.send_header("Cache-Control", "no-cache")
+			self.send_header("Vary", "Accept-Encoding")
+			if use_gzip:
+				self.send_header("Content-Encoding", "gzip")
+			self.end_headers()
+			if send_body:
+				self.wfile.write(body)
+
+		def log_message(self, format, *args):
+			pass
+
+	return ReportHandler
+
+# ローカルのレポートサーバーを作る (port = 0 なら空いているポート, 動かすのは呼び出し側で serve_forever)
+def make_report_server(
+	score_dir: str,
+	csv_dirs: List[str],
+	host: str = "127.0.0.1",
+	port: int = 8765,
+	report_mode: str = "static",
+	bootstrap: BootstrapOptions = None,
+	history_period: int = HISTORY_PERIODS["week"]
+):
+	from http.server import ThreadingHTTPServer
+	report = ReportCache(score_dir, TableRegistry.load(csv_dirs), report_mode, bootstrap, history_period)
+	report.refresh()
+	server = ThreadingHTTPServer((host, port), make_report_handler())
+	server.daemon_threads = True
+	server.report = report
+	return server
+
+def run_server(
+	score_dir: str,
+	csv_dirs: List[str],
+	host: str = "127.0.0.1",
+	port: int = 8765,
+	report_mode: str = "static",
+	bootstrap: BootstrapOptions = None,
+	history_period: int = HISTORY_PERIODS["week"],
+	open_browser: bool = False
+):
+	server = make_report_server(score_dir, csv_dirs, host, port, report_mode, bootstrap, history_period)
+	url = f"http://{server.server_address[0]}:{server.server_address[1]}/"
+	print(f"{url} で公開しています (Ctrl+C で終了)")
+	if open_browser:
+		import webbrowser
+		webbrowser.open(url)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+# score.db を 1 度だけ読み, 複数の難易度表をまとめた索引からおすすめ譜面を表示する
+def run_recommend(
+	score_dir: str,
+	csv_dirs: List[str],
+	min_prob: float,
+	max_prob: float,
+	top: int,
+	order_by: str = "expected_pp"
+) -> List[dict]:
+	with metrics.stage("csv"):
+		registry = TableRegistry.load(csv_dirs)
+	with metrics.stage("db"):
+		score_list = get_best_score_list(score_dir, registry.sha256)
+
+	tables = []
+	for (name, mode_slst, table), frame in zip(registry.tables, registry.frames(score_list)):
+		if not frame.played.any():
+			continue
+		average_list = registry.average_lists[name]
+		with metrics.stage("estimate", mode_slst):
+			result = estimate_theta(frame)
+		tables.append((name, frame, LevelMapper(average_list), result.x))
+	with metrics.stage("recommend"):
+		index = RecommendIndex(tables)
+		records = index.query(min_prob, max_prob, top, order_by)
+
+	for rank, record in enumerate(records):
+		prefix = record["display_level"][:2]
+		print(
+			f"{rank + 1:3d}. [{record['display_level']}] {record['title']}"
+			f" {record['lamp']} -> {record['next_lamp']} ({prefix}{record['stella']:.2f})"
+			f" 達成確率 {record['prob'] * 100:.1f}%"
+			f" pp gain {record['pp_gain']:.2f}"
+			f" 期待 pp {record['expected_pp']:.2f}"
+		)
+	return records
+
+# tkinter は GUI を使うときだけ読み込む
+def import_tkinter():
+	global tk, ttk, filedialog, messagebox, scrolledtext
+	import tkinter as tk
+	from tkinter import ttk, filedialog, messagebox, scrolledtext
+
+# GUI で中止ボタンが押されたときに処理中のスレッドから投げる
+class PipelineCancelled(Exception):
+	pass
+
+# GUI の進捗表示の段階 (段階, 表示名)
+PIPELINE_STAGES = [
+	("csv", "CSV"),
+	("db", "DB"),
+	("estimate", "推定"),
+	("table", "難易度表"),
+	("top100", "TOP100"),
+	("recommend", "おすすめ"),
+]
+
+class BMSApp:
+	def __init__(self, root):
+		self.root = root
+		self.root.title("Shobon Stella Recommend v1.1")
+		self.root.geometry("600x600")
+		self.config_file = "config.json"
+		# 処理はワーカースレッドで行い, ログと進捗はキューで受け取ってメインスレッドで表示する
+		self.queue = None
+		self.worker = None
+		self.cancel_event = None
+		self.closing = False
+
+		# --- DB選択 ---
+		tk.Label(root, text="1. score.db:").pack(anchor="w", padx=10, pady=(10, 0))
+		self.frame_db = tk.Frame(root)
+		self.frame_db.pack(fill="x", padx=10)
+		self.entry_db = tk.Entry(self.frame_db)
+		self.entry_db.pack(side="left", fill="x", expand=True)
+		tk.Button(self.frame_db, text="Browse", command=self.browse_db).pack(side="right", padx=5)
+		
+		# --- CSV選択 ---
+		tk.Label(root, text="2. sl_mocha.csv / st_mocha.csv:").pack(anchor="w", padx=10, pady=(10, 0))
+		tk.Label(root, text="このソフトの data フォルダの中に入っています (複数選ぶと ; 区切りで全部の表を作ります)", font=("", 8), fg="gray").pack(anchor="w", padx=10)
+		self.frame_csv = tk.Frame(root)
+		self.frame_csv.pack(fill="x", padx=10)
+		self.entry_csv = tk.Entry(self.frame_csv)
+		self.entry_csv.pack(side="left", fill="x", expand=True)
+		tk.Button(self.frame_csv, text="Browse", command=self.browse_csv).pack(side="right", padx=5)
+
+		self.frame_run = tk.Frame(root)
+		self.frame_run.pack(pady=20, fill="x", padx=50)
+		self.button_run = tk.Button(self.frame_run, text="実行", command=self.run_process, bg="#ddddff", height=2)
+		self.button_run.pack(side="left", fill="x", expand=True)
+		self.button_cancel = tk.Button(self.frame_run, text="中止", command=self.cancel_process, height=2, state="disabled")
+		self.button_cancel.pack(side="right", padx=(5, 0))
+		self.use_bootstrap = tk.BooleanVar(value=False)
+		tk.Checkbutton(root, text="推定の 90% 区間を出す (ブートストラップ 1000 回, 遊んだ譜面が多いと時間がかかります)", variable=self.use_bootstrap).pack(anchor="w", padx=10)
+		self.show_metrics = tk.BooleanVar(value=False)
+		tk.Checkbutton(root, text="処理時間とメモリをログに表示する (metrics.json にも保存)", variable=self.show_metrics).pack(anchor="w", padx=10)
+		self.use_cache = tk.BooleanVar(value=True)
+		tk.Checkbutton(root, text="前回と同じデータなら保存しておいた結果を使う (外すと毎回作り直します)", variable=self.use_cache).pack(anchor="w", padx=10)
+
+		# --- 進捗 ---
+		self.frame_progress = tk.Frame(root)
+		self.frame_progress.pack(fill="x", padx=10, pady=(0, 10))
+		self.progress_bars = dict()
+		for row, (stage, label) in enumerate(PIPELINE_STAGES):
+			tk.Label(self.frame_progress, text=label, width=10, anchor="w").grid(row=row, column=0, sticky="w")
+			bar = ttk.Progressbar(self.frame_progress, mode="determinate", maximum=1)
+			bar.grid(row=row, column=1, sticky="ew")
+			self.progress_bars[stage] = bar
+		self.frame_progress.columnconfigure(1, weight=1)
+		
+		# --- ログ出力エリア ---
+		tk.Label(root, text="Log:").pack(anchor="w", padx=10)
+		self.log_area = scrolledtext.ScrolledText(root, height=10)
+		self.log_area.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+		self.load_config()
+		self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+	# メインスレッドからだけ呼ぶ (再描画は Tk のイベントループに任せる)
+	def log(self, message):
+		self.log_area.insert(tk.END, message + "\n")
+		self.log_area.see(tk.END)
+
+	def load_config(self):
+		if os.path.exists(self.config_file):
+			try:
+				with open(self.config_file, "r", encoding="utf-8") as f:
+					config = json.load(f)
+					db_path = config.get("db_path", "")
+					csv_path = config.get("csv_path", "")
+					if db_path: self.entry_db.insert(0, db_path)
+					if csv_path: self.entry_csv.insert(0, csv_path)
+					self.use_bootstrap.set(bool(config.get("use_bootstrap", False)))
+					self.show_metrics.set(bool(config.get("show_metrics", False)))
+					self.use_cache.set(bool(config.get("use_cache", True)))
 					self.log("設定ファイルを読み込みました。")
 			except:
 				self.log("設定ファイルの読み込みに失敗しました。")
@@ -1040,7 +4080,10 @@ class BMSApp:
 	def save_config(self):
 		config = {
 			"db_path": self.entry_db.get(),
-			"csv_path": self.entry_csv.get()
+			"csv_path": self.entry_csv.get(),
+			"use_bootstrap": self.use_bootstrap.get(),
+			"show_metrics": self.show_metrics.get(),
+			"use_cache": self.use_cache.get()
 		}
 		try:
 			with open(self.config_file, "w", encoding="utf-8") as f:
@@ -1056,49 +4099,253 @@ class BMSApp:
 				self.entry_db.insert(0, filename)
 				
 	def browse_csv(self):
-		filename = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv"), ("All Files", "*.*")])
-		if filename:
+		filenames = filedialog.askopenfilenames(filetypes=[("CSV Files", "*.csv"), ("All Files", "*.*")])
+		if filenames:
 			self.entry_csv.delete(0, tk.END)
-			self.entry_csv.insert(0, filename)
+			self.entry_csv.insert(0, ";".join(filenames))
 	
 	def run_process(self):
-		mode_slst = 'sl'
+		if self.worker is not None:
+			return
 		score_dir = self.entry_db.get()
-		song_dir = self.entry_csv.get()
+		song_dirs = [x.strip() for x in self.entry_csv.get().split(";") if x.strip()]
 
-		if not os.path.exists(score_dir) or not os.path.exists(song_dir):
+		if not os.path.exists(score_dir) or not song_dirs or not all(os.path.exists(song_dir) for song_dir in song_dirs):
 			messagebox.showerror("Error", "ファイルが見つかりません。パスを確認してください。")
 			return
 		
 		self.save_config()
-		
-		try:
-			self.log("--- 処理開始 ---")
 
-			self.log("DBを読み込んでいます...")
-			score_list = get_score_list(score_dir)
-			self.log(f"DB読み込み完了: {len(score_list)} 件のスコアデータ")
+		import queue
+		import threading
+		for bar in self.progress_bars.values():
+			bar.configure(maximum=1, value=0)
+		self.queue = queue.Queue()
+		self.cancel_event = threading.Event()
+		self.worker = threading.Thread(target=self.run_pipeline, args=(score_dir, song_dirs, self.show_metrics.get(), self.use_bootstrap.get(), self.use_cache.get()), daemon=True)
+		self.button_run.configure(state="disabled")
+		self.button_cancel.configure(state="normal")
+		self.log("--- 処理開始 ---")
+		self.worker.start()
+		self.root.after(50, self.poll_queue)
 
-			self.log("CSVを解析しています...")
-			song_list = get_song_list(song_dir)
-			self.log(f"CSV解析完了: 全 {len(song_list)} 曲")
+	# ワーカースレッドで動く. ウィジェットには触らずキューに送るだけ
+	def run_pipeline(self, score_dir: str, song_dirs: List[str], show_metrics: bool = False, use_bootstrap: bool = False, use_cache: bool = True):
+		post = self.queue.put
 
-			generate_html(score_list, song_list, mode_slst)
-			
+		def progress(stage: str, done: int, total: int):
+			post(("progress", stage, done, total))
+
+		# 段階を始める前にだけ確かめる (最後のページを書き終えた後の中止で完了した結果を捨てない)
+		def check_cancel():
+			if self.cancel_event.is_set():
+				raise PipelineCancelled()
+
+		if show_metrics:
+			enable_metrics()
+		try:
+			bootstrap = BootstrapOptions() if use_bootstrap else None
+			report = build_reports(
+				score_dir, song_dirs, cache = ResultCache() if use_cache else None, bootstrap = bootstrap,
+				progress = progress, check_cancel = check_cancel, log = lambda message: post(("log", message))
+			)
+			for name, table in report.summary.items():
+				post(("log", f"{name}: {table['label']}"))
+				if "stella_interval" in table:
+					low, median, high = table["stella_interval"]
+					post(("log", f"{name}: 90% 区間 {low:.2f} 〜 {high:.2f} (中央値 {median:.2f})"))
+			if metrics.enabled:
+				for line in metrics.summary_lines():
+					post(("log", line))
+				metrics.save("metrics.json")
+			post(("done", report.entry))
+		except PipelineCancelled:
+			post(("cancelled",))
+		except Exception as e:
+			import traceback
+			post(("error", traceback.format_exc(), str(e)))
+		finally:
+			disable_metrics()
+
+	# キューに溜まったメッセージをまとめて表示し, 終わっていなければまた呼ぶ
+	def poll_queue(self):
+		import queue
+		finished = None
+		while True:
+			try:
+				message = self.queue.get_nowait()
+			except queue.Empty:
+				break
+			if message[0] == "log":
+				self.log(message[1])
+			elif message[0] == "progress":
+				stage, done, total = message[1:]
+				self.progress_bars[stage].configure(maximum=total, value=done)
+			else:
+				finished = message
+		if finished is None:
+			self.root.after(50, self.poll_queue)
+			return
+		self.worker.join()
+		self.worker = None
+		self.button_run.configure(state="normal")
+		self.button_cancel.configure(state="disabled")
+		if self.closing:
+			self.root.destroy()
+			return
+
+		if finished[0] == "done":
 			self.log(f"完了！")
 			messagebox.showinfo("Success", f"HTMLを作成しました！")
 			
 			import webbrowser
-			webbrowser.open("result_table.html")
+			webbrowser.open(finished[1])
 
 			self.root.destroy()
+		elif finished[0] == "cancelled":
+			self.log("中止しました")
+		else:
+			self.log("エラーが発生しました:\n" + finished[1])
+			messagebox.showerror("Error", f"エラーが発生しました:\n{finished[2]}")
 
-		except Exception as e:
-			import traceback
-			err_msg = traceback.format_exc()
-			self.log("エラーが発生しました:\n" + err_msg)
-			messagebox.showerror("Error", f"エラーが発生しました:\n{e}")
-if __name__ == "__main__":
+	# 中止は次の段階を始める前に効く (書きかけの HTML は残さない)
+	def cancel_process(self):
+		if self.worker is not None:
+			self.cancel_event.set()
+			self.button_cancel.configure(state="disabled")
+			self.log("中止しています...")
+
+	# 処理中に閉じられたらワーカーを止めてから閉じる
+	def on_close(self):
+		if self.worker is None:
+			self.root.destroy()
+			return
+		self.closing = True
+		self.cancel_process()
+
+def run_gui():
+	import_tkinter()
 	root = tk.Tk()
 	app = BMSApp(root)
-	root.mainloop()
\ No newline at end of file
+	root.mainloop()
+
+def main(argv: List[str]) -> int:
+	if not argv:
+		run_gui()
+		return 0
+
+	import argparse
+	parser = argparse.ArgumentParser(description = "Shobon Stella Recommend")
+	parser.add_argument("--metrics", default = None, help = "段階ごとの時間・CPU 時間・ピークメモリと件数を書き出す JSON のパス")
+	parser.add_argument("--profile", default = None, help = "cProfile の結果を書き出すパス (python -m pstats で読める)")
+	subparsers = parser.add_subparsers(dest = "command", required = True)
+
+	parser_batch = subparsers.add_parser("batch", help = "複数の score.db をまとめて処理する (GUI なし)")
+	parser_batch.add_argument("source", help = "score.db を含むディレクトリ, またはマニフェストファイル")
+	parser_batch.add_argument("--csv", action = "append", default = None, help = "難易度表の CSV のパス (複数指定可, 既定: data/sl_mocha.csv)")
+	parser_batch.add_argument("--out", default = "results", help = "出力先ディレクトリ (プレイヤーごとにサブディレクトリを作る)")
+	parser_batch.add_argument("--workers", type = int, default = None, help = "ワーカープロセス数 (既定: CPU コア数)")
+	parser_batch.add_argument("--report", choices = ["static", "json"], default = "static", help = "難易度表ページの形式 (json: データ埋め込み + 表示中の行だけ描画)")
+	parser_batch.add_argument("--bootstrap", type = int, default = 0, help = "ブートストラップの回数 (0 なら区間を求めない)")
+	parser_batch.add_argument("--seed", type = int, default = 0, help = "ブートストラップの乱数の種")
+	parser_batch.add_argument("--history", choices = ["week", "day", "none"], default = "week", help = "TOP100 ページに出す実力の推移の区切り (none: 出さない)")
+	parser_batch.add_argument("--no-cache", action = "store_true", help = "結果キャッシュ (.cache/results.db) を使わずに毎回作り直す")
+
+	parser_update = subparsers.add_parser("update", help = "前回からの差分だけ読み込んで HTML を作り直す (GUI なし)")
+	parser_update.add_argument("score_db", help = "score.db のパス")
+	parser_update.add_argument("--csv", action = "append", default = None, help = "難易度表の CSV のパス (複数指定可, 既定: data/sl_mocha.csv)")
+	parser_update.add_argument("--state", default = "score_state.json", help = "前回の状態を保存するファイル")
+	parser_update.add_argument("--out", default = "", help = "HTML の出力先ディレクトリ")
+	parser_update.add_argument("--watch", action = "store_true", help = "score.db を監視して更新があるたびに作り直す")
+	parser_update.add_argument("--interval", type = float, default = 5.0, help = "監視の間隔 (秒)")
+	parser_update.add_argument("--report", choices = ["static", "json"], default = "static", help = "難易度表ページの形式 (json: データ埋め込み + 表示中の行だけ描画)")
+	parser_update.add_argument("--bootstrap", type = int, default = 0, help = "ブートストラップの回数 (0 なら区間を求めない)")
+	parser_update.add_argument("--seed", type = int, default = 0, help = "ブートストラップの乱数の種")
+	parser_update.add_argument("--bootstrap-workers", type = int, default = 1, help = "ブートストラップのワーカープロセス数")
+	parser_update.add_argument("--history", choices = ["week", "day", "none"], default = "week", help = "TOP100 ページに出す実力の推移の区切り (none: 出さない)")
+
+	parser_serve = subparsers.add_parser("serve", help = "結果をメモリに持ってローカルの HTTP サーバーで見せる (score.db が更新されたら作り直す)")
+	parser_serve.add_argument("score_db", help = "score.db のパス")
+	parser_serve.add_argument("--csv", action = "append", default = None, help = "難易度表の CSV のパス (複数指定可, 既定: data/sl_mocha.csv)")
+	parser_serve.add_argument("--host", default = "127.0.0.1", help = "待ち受けるアドレス")
+	parser_serve.add_argument("--port", type = int, default = 8765, help = "待ち受けるポート (0 なら空いているポート)")
+	parser_serve.add_argument("--report", choices = ["static", "json"], default = "static", help = "難易度表ページの形式 (json: データ埋め込み + 表示中の行だけ描画)")
+	parser_serve.add_argument("--bootstrap", type = int, default = 0, help = "ブートストラップの回数 (0 なら区間を求めない)")
+	parser_serve.add_argument("--seed", type = int, default = 0, help = "ブートストラップの乱数の種")
+	parser_serve.add_argument("--history", choices = ["week", "day", "none"], default = "week", help = "TOP100 ページに出す実力の推移の区切り (none: 出さない)")
+	parser_serve.add_argument("--open", action = "store_true", help = "ブラウザで開く")
+
+	parser_calibrate = subparsers.add_parser("calibrate", help = "多人数の score.db から難易度表の beta_easy / beta_hard / alpha を推定し直す (GUI なし)")
+	parser_calibrate.add_argument("source", help = "score.db を含むディレクトリ, またはマニフェストファイル")
+	parser_calibrate.add_argument("--csv", action = "append", default = None, help = "元にする難易度表の CSV のパス (複数指定可, 既定: data/sl_mocha.csv)")
+	parser_calibrate.add_argument("--out", default = "calibrated", help = "較正した CSV の出力先ディレクトリ (元の CSV と同じ名前で書く)")
+	parser_calibrate.add_argument("--workers", type = int, default = None, help = "ワーカープロセス数 (既定: CPU コア数)")
+	parser_calibrate.add_argument("--iterations", type = int, default = 50, help = "theta と譜面を交互に推定する最大回数")
+	parser_calibrate.add_argument("--tol", type = float, default = 1e-3, help = "beta の変化がこれより小さくなったら止める")
+	parser_calibrate.add_argument("--min-players", type = int, default = 5, help = "これより少ない人数しか遊んでいない譜面は元の値のままにする")
+	parser_calibrate.add_argument("--prior-sd", type = float, default = 0.5, help = "元の表の値を中心にした事前分布の標準偏差")
+
+	parser_recommend = subparsers.add_parser("recommend", help = "次のランプの達成確率の範囲でおすすめ譜面を表示する (GUI なし)")
+	parser_recommend.add_argument("score_db", help = "score.db のパス")
+	parser_recommend.add_argument("--csv", action = "append", default = None, help = "難易度表の CSV のパス (複数指定可)")
+	parser_recommend.add_argument("--min", type = float, default = 0.4, help = "達成確率の下限 (0〜1)")
+	parser_recommend.add_argument("--max", type = float, default = 0.7, help = "達成確率の上限 (0〜1)")
+	parser_recommend.add_argument("--top", type = int, default = 30, help = "表示する件数")
+	parser_recommend.add_argument("--order", choices = ["expected_pp", "pp_gain", "prob"], default = "expected_pp", help = "並べ替えの基準")
+
+	args = parser.parse_args(argv)
+	if args.metrics:
+		enable_metrics()
+	profiler = None
+	if args.profile:
+		import cProfile
+		profiler = cProfile.Profile()
+		profiler.enable()
+	try:
+		return run_command(args)
+	finally:
+		if profiler is not None:
+			profiler.disable()
+			profiler.dump_stats(args.profile)
+			print(f"プロファイルを保存しました: {args.profile}")
+		if args.metrics:
+			metrics.save(args.metrics)
+			print(f"メトリクスを保存しました: {args.metrics}")
+			disable_metrics()
+
+# サブコマンドを実行して終了コードを返す
+def run_command(args) -> int:
+	csv_dirs = args.csv if args.csv else [os.path.join("data", "sl_mocha.csv")]
+	bootstrap = None
+	if getattr(args, "bootstrap", 0) > 0:
+		bootstrap = BootstrapOptions(args.bootstrap, args.seed, getattr(args, "bootstrap_workers", 1))
+	history_period = HISTORY_PERIODS.get(getattr(args, "history", "none"))
+	if args.command == "batch":
+		cache = None if args.no_cache else ResultCache()
+		results = run_batch(args.source, csv_dirs, args.out, args.workers, args.report, bootstrap, history_period, cache)
+		failed = [r for r in results if r["error"] is not None]
+		print(f"完了: 成功 {len(results) - len(failed)} 件 / 失敗 {len(failed)} 件")
+		return 1 if failed else 0
+	if args.command == "serve":
+		run_server(args.score_db, csv_dirs, args.host, args.port, args.report, bootstrap, history_period, args.open)
+		return 0
+	if args.command == "calibrate":
+		workers = args.workers if args.workers is not None else (os.cpu_count() or 1)
+		options = CalibrationOptions(args.iterations, args.tol, args.min_players, prior_sd = args.prior_sd, workers = workers)
+		run_calibration(args.source, csv_dirs, args.out, options, workers)
+		return 0
+	if args.command == "recommend":
+		run_recommend(args.score_db, csv_dirs, args.min, args.max, args.top, args.order)
+		return 0
+	if args.command == "update":
+		if args.watch:
+			watch_score_db(args.score_db, csv_dirs, args.state, args.interval, args.out, args.report, bootstrap, history_period)
+		else:
+			run_incremental(args.score_db, csv_dirs, args.state, args.out, report_mode = args.report, bootstrap = bootstrap, history_period = history_period)
+		return 0
+	return 0
+
+if __name__ == "__main__":
+	import multiprocessing
+	multiprocessing.freeze_support()
+	sys.exit(main(sys.argv[1:]))
@@ -6,11 +6,13 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # numpy は main.py が使うときに importlib で読み込むので静的解析では見つからない
+    hiddenimports=['numpy'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # 1 変数の最適化は main.py の minimize_bounded で行うので scipy は要らない
+    excludes=['scipy'],
     noarchive=False,
     optimize=0,
 )